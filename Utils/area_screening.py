@@ -0,0 +1,134 @@
+import os
+import warnings
+
+import pandas as pd
+import numpy as np
+
+from Utils.season_week_pivot import pivot_season_weeks
+from Utils.pipeline_cache import LRUCache
+
+# Classes whose mean NDVI curves are screened
+SCREENED_CLASSES = ["Green", "Yellow"]
+# Width (in weeks) of the centered window smoothing the weekly z-scores
+ROLLING_WEEKS = 3
+# Blocks whose smoothed z-score falls below -Z_ALERT are counted as drifting that week
+Z_ALERT = 2.0
+SCREENING_COLUMNS = ["Primary_Key", "Orchard_Name", "Supply_Area_Name", "Year", "Weeks_Compared"] + \
+                    [f"{name}_Deviation" for name in SCREENED_CLASSES] + \
+                    [f"{name}_Z" for name in SCREENED_CLASSES] + ["Weeks_Below", "Score"]
+
+_screenings = LRUCache(int(os.environ.get("ZESPRI_SCREENING_CACHE_MB", 64)) << 20)
+
+
+def _area_sums(tensor: np.ndarray, area_codes: np.ndarray, n_areas: int) -> np.ndarray:
+    # Sum a (block, season, week) tensor over the blocks of each area, NaN counting as zero
+    sums = np.zeros((n_areas,) + tensor.shape[1:])
+    np.add.at(sums, area_codes, np.nan_to_num(tensor))
+    return sums
+
+
+def _rolling_nanmean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Centered moving average along the last axis, ignoring NaN (NaN where the window holds no value).
+    """
+    valid = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(window // 2, window - 1 - window // 2)]
+    sums = np.cumsum(np.pad(np.where(valid, values, 0.0), pad), axis=-1)
+    counts = np.cumsum(np.pad(valid.astype(np.int64), pad), axis=-1)
+    sums = np.concatenate([sums[..., window - 1:window], sums[..., window:] - sums[..., :-window]], axis=-1)
+    counts = np.concatenate([counts[..., window - 1:window], counts[..., window:] - counts[..., :-window]], axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def screen_blocks(dataset: pd.DataFrame, block_areas: dict, rolling_weeks: int = ROLLING_WEEKS) -> pd.DataFrame:
+    """
+    Score every block and season by how far its weekly mean NDVI curves drift from its area baseline.
+
+    For each class, week and block the baseline is the pixel-count-weighted mean of the other blocks of the
+    same area (as `compute_weighted_average` without the block), and the spread is the standard deviation
+    of their weekly means. The z-score (block mean - baseline) / spread is smoothed over `rolling_weeks`
+    weeks. All blocks are computed at once on (block, season, week) tensors.
+
+    Args:
+        dataset (pd.DataFrame): Output of `resample_and_average_weekly`.
+        block_areas (dict): Supply_Area_Name of each Primary_Key (see `SelectionIndex.block_areas`).
+        rolling_weeks (int): Width of the smoothing window, in weeks.
+
+    Returns:
+        pd.DataFrame: One row per block and season with data, with the mean deviation and smoothed z-score
+        of each screened class, the number of weeks compared and below -Z_ALERT, and the overall score
+        (mean absolute smoothed z-score, higher means more anomalous).
+    """
+    primary_keys = [primary_key for primary_key in pd.unique(dataset["Primary_Key"].to_numpy())
+                    if primary_key in block_areas]
+    pivot = pivot_season_weeks(dataset, primary_keys=primary_keys)
+    area_codes, areas = pd.factorize(pd.Series([block_areas[primary_key] for primary_key in primary_keys]))
+    n_areas = len(areas)
+
+    z_scores, deviations = {}, {}
+    for name in SCREENED_CLASSES:
+        means, counts = pivot[f"Mean_{name}_Pixels"], pivot[f"{name}_NDVI_Pixels_Number"]
+        has_mean = ~np.isnan(means)
+        weighted = np.where(has_mean, means * np.nan_to_num(counts), 0.0)
+        # Leave-one-out sums: area totals minus the block's own contribution
+        other_weighted = _area_sums(weighted, area_codes, n_areas)[area_codes] - weighted
+        other_counts = _area_sums(np.where(has_mean, counts, 0.0), area_codes, n_areas)[area_codes] - \
+            np.where(has_mean, np.nan_to_num(counts), 0.0)
+        other_n = _area_sums(has_mean.astype(float), area_codes, n_areas)[area_codes] - has_mean
+        other_sum = _area_sums(means, area_codes, n_areas)[area_codes] - np.nan_to_num(means)
+        other_sum_squares = _area_sums(means * means, area_codes, n_areas)[area_codes] - np.nan_to_num(means * means)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            baseline = np.where(other_counts > 0, other_weighted / other_counts, np.nan)
+            other_mean = other_sum / other_n
+            spread = np.sqrt(np.maximum(other_sum_squares / other_n - other_mean * other_mean, 0.0))
+            # At least two other blocks are needed for a spread
+            spread = np.where((other_n >= 2) & (spread > 0), spread, np.nan)
+            deviation = means - baseline
+            z_scores[name] = _rolling_nanmean(deviation / spread, rolling_weeks)
+        deviations[name] = deviation
+
+    stacked_z = np.stack([z_scores[name] for name in SCREENED_CLASSES])
+    with warnings.catch_warnings():
+        # Blocks without any comparable week give all-NaN slices
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        screening = {
+            "Weeks_Compared": (~np.isnan(stacked_z)).any(axis=0).sum(axis=-1),
+            **{f"{name}_Deviation": np.nanmean(deviations[name], axis=-1) for name in SCREENED_CLASSES},
+            **{f"{name}_Z": np.nanmean(z_scores[name], axis=-1) for name in SCREENED_CLASSES},
+            "Weeks_Below": (np.nan_to_num(stacked_z, nan=0.0) < -Z_ALERT).any(axis=0).sum(axis=-1),
+            "Score": np.nanmean(np.abs(stacked_z), axis=(0, -1)),
+        }
+
+    # One row per (block, season) with data
+    block_index, season_index = np.nonzero(pivot.present)
+    orchards = dataset.dropna(subset=["Orchard_Name"]).groupby("Primary_Key", observed=True)["Orchard_Name"].first()
+    result = pd.DataFrame({
+        "Primary_Key": np.asarray(primary_keys, dtype=object)[block_index],
+        "Orchard_Name": orchards.reindex(np.asarray(primary_keys, dtype=object)[block_index]).to_numpy(),
+        "Supply_Area_Name": np.asarray(areas, dtype=object)[area_codes[block_index]],
+        "Year": np.asarray(pivot.seasons)[season_index],
+        **{column: values[block_index, season_index] for column, values in screening.items()},
+    })
+    return result[SCREENING_COLUMNS].sort_values("Score", ascending=False, na_position="last", ignore_index=True)
+
+
+def get_area_screening(processed_dataset) -> pd.DataFrame:
+    """
+    `screen_blocks` of a processed dataset, cached per processed dataset (data fingerprint and thresholds).
+    """
+    return _screenings.get_or_compute(
+        processed_dataset.cache_key,
+        lambda: screen_blocks(processed_dataset.weekly, processed_dataset.selection_index.block_areas))
+
+
+if __name__ == "__main__":
+    # Example usage:
+    import time
+    from Utils.pipeline_cache import get_processed_dataset
+    processed = get_processed_dataset("../Satellite_NDVI_data_construction_2.csv", 0.3, 0.55)
+    start = time.perf_counter()
+    screening = get_area_screening(processed)
+    print(f"Screened {len(screening)} blocks and seasons in {time.perf_counter() - start:.3f}s")
+    print(screening.head(10))
@@ -1,10 +1,139 @@
+from dataclasses import dataclass
+
 import pandas as pd
 import numpy as np
 
-from Utils.load_dataset import load_dataset
-from Utils.threshold_dataset import threshold_ndvi_data
-from Utils.compute_statistics import compute_ndvi_statistics
-from Utils.mean_weekly_resampling import resample_and_average_weekly
+from Utils.mean_weekly_resampling import NDVI_CLASSES
+
+AREA_KEYS = ["Supply_Area_Name", "Year", "Week"]
+BLOCK_KEYS = ["Primary_Key", "Year", "Week"]
+
+# Pixel counts below this value are treated as zero after subtracting a block from its area
+# (pixel counts are means of integers, their differences are not always exact in floating point)
+ZERO_PIXELS_TOLERANCE = 1e-6
+
+
+@dataclass
+class AreaStatistics:
+    """
+    Additive sufficient statistics of the weekly dataset, used to derive leave-one-out area aggregations.
+
+    `totals` holds, per (Supply_Area_Name, Year, Week), the number of rows, the pixel count sums and
+    the count-weighted mean sums of each NDVI class. `contributions` holds the same statistics per
+    (Primary_Key, Year, Week), with the Supply_Area_Name of each block.
+    """
+    totals: pd.DataFrame
+    contributions: pd.DataFrame
+
+
+def build_area_statistics(dataset: pd.DataFrame) -> AreaStatistics:
+    """
+    Precompute the additive statistics of every area, season and week of the weekly dataset.
+
+    Args:
+        dataset (pd.DataFrame): Output of `resample_and_average_weekly`.
+
+    Returns:
+        AreaStatistics: Per-area totals and per-block contributions.
+    """
+    # Weeks without data (no Supply_Area_Name after resampling) do not contribute to any area
+    contributions = dataset.loc[dataset["Supply_Area_Name"].notna(), BLOCK_KEYS + ["Supply_Area_Name"]].copy()
+    contributions["Rows"] = 1
+    for name in NDVI_CLASSES:
+        count = dataset[f"{name}_NDVI_Pixels_Number"]
+        contributions[f"{name}_NDVI_Pixels_Number"] = count
+        # Missing means are skipped in the sum, as in `compute_weighted_average`
+        contributions[f"{name}_Weighted_Sum"] = (dataset[f"Mean_{name}_Pixels"] * count).fillna(0.0)
+    contributions[[f"{name}_NDVI_Pixels_Number" for name in NDVI_CLASSES]] = \
+        contributions[[f"{name}_NDVI_Pixels_Number" for name in NDVI_CLASSES]].fillna(0.0)
+
+    totals = contributions.drop(columns="Primary_Key").groupby(AREA_KEYS).sum()
+    contributions = contributions.set_index(BLOCK_KEYS).sort_index()
+
+    return AreaStatistics(totals=totals, contributions=contributions)
+
+
+def update_area_statistics(area_statistics: AreaStatistics, weekly_rows: pd.DataFrame,
+                           seasons: pd.MultiIndex) -> AreaStatistics:
+    """
+    Replace the weekly rows of some blocks and seasons, recomputing only the area totals they contribute to.
+
+    Args:
+        area_statistics (AreaStatistics): Output of `build_area_statistics`.
+        weekly_rows (pd.DataFrame): New weekly rows of the replaced blocks and seasons.
+        seasons (pd.MultiIndex): (Primary_Key, Year) pairs replaced (blocks and seasons may be new).
+
+    Returns:
+        AreaStatistics: Same output as `build_area_statistics` on the updated weekly dataset.
+    """
+    new_statistics = build_area_statistics(weekly_rows)
+    contributions = area_statistics.contributions
+    replaced = contributions.index.droplevel("Week").isin(seasons)
+
+    # Totals of the area weeks the replaced and the new rows contribute to are summed again
+    affected = pd.MultiIndex.from_frame(contributions[replaced].reset_index()[AREA_KEYS]).union(
+        new_statistics.totals.index)
+    contributions = _with_dtypes_of(pd.concat([contributions[~replaced], new_statistics.contributions]),
+                                    new_statistics.contributions)
+    contributing = pd.MultiIndex.from_frame(contributions.reset_index()[AREA_KEYS]).isin(affected)
+    totals = contributions[contributing].reset_index(level="Primary_Key", drop=True).reset_index().groupby(
+        AREA_KEYS).sum()
+    totals = _with_dtypes_of(pd.concat([area_statistics.totals[~area_statistics.totals.index.isin(affected)],
+                                        totals]), new_statistics.totals)
+
+    return AreaStatistics(totals=totals, contributions=contributions)
+
+
+def _with_dtypes_of(statistics: pd.DataFrame, template: pd.DataFrame) -> pd.DataFrame:
+    # Concatenated categoricals with different categories fall back to strings, restore the (widest)
+    # categories of the template, sorting the rows on its index
+    index_names = list(template.index.names)
+    statistics = statistics.reset_index().astype(dict(template.index.dtypes)).astype(dict(template.dtypes))
+    return statistics.set_index(index_names).sort_index()
+
+
+def compute_weighted_average_excluding(area_statistics: AreaStatistics, area: str, season: int,
+                                       excluded_primary_key: str) -> pd.DataFrame:
+    """
+    Equivalent of `compute_weighted_average` over the blocks of an area and season, excluding one block,
+    derived by subtracting the block contribution from the precomputed area totals.
+
+    Args:
+        area_statistics (AreaStatistics): Output of `build_area_statistics`.
+        area (str): Supply_Area_Name of the comparison group.
+        season (int): Year of the comparison group.
+        excluded_primary_key (str): Primary_Key of the block to leave out.
+
+    Returns:
+        pd.DataFrame: Same layout as `compute_weighted_average` (empty if no other block has data).
+    """
+    try:
+        weekly = area_statistics.totals.xs((area, season), level=["Supply_Area_Name", "Year"])
+    except KeyError:
+        return _finalize_weighted_average(pd.DataFrame(columns=_WEIGHTED_AVERAGE_COLUMNS))
+
+    # Subtract the contribution of the excluded block, if it belongs to this area and season
+    try:
+        block = area_statistics.contributions.xs((excluded_primary_key, season), level=["Primary_Key", "Year"])
+    except KeyError:
+        block = None
+    if block is not None:
+        block = block[block["Supply_Area_Name"] == area].drop(columns="Supply_Area_Name")
+        weekly = weekly.sub(block.reindex(weekly.index, fill_value=0))
+    weekly = weekly[weekly["Rows"] > 0]
+
+    weighted_avg_dataset = pd.DataFrame({"Year": np.full(len(weekly), season), "Week": weekly.index})
+    for name in NDVI_CLASSES:
+        count = weekly[f"{name}_NDVI_Pixels_Number"].to_numpy()
+        weighted_avg_dataset[f"{name}_NDVI_Pixels_Number"] = np.where(count > ZERO_PIXELS_TOLERANCE, count, 0.0)
+    for name in NDVI_CLASSES:
+        count = weighted_avg_dataset[f"{name}_NDVI_Pixels_Number"].to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weighted_avg_dataset[f"Mean_{name}_Pixels"] = np.where(
+                count > 0, weekly[f"{name}_Weighted_Sum"].to_numpy() / count, np.nan)
+
+    return _finalize_weighted_average(weighted_avg_dataset)
+
 
 def compute_weighted_average(dataset):
     # Group by Year, Month, and Day
@@ -30,6 +159,15 @@ def compute_weighted_average(dataset):
         )
     }).reset_index()
 
+    return _finalize_weighted_average(weighted_avg_dataset)
+
+
+# Columns of the grouped weighted average, before the metadata columns are added
+_WEIGHTED_AVERAGE_COLUMNS = ["Year", "Week"] + [f"{name}_NDVI_Pixels_Number" for name in NDVI_CLASSES] + \
+                            [f"Mean_{name}_Pixels" for name in NDVI_CLASSES]
+
+
+def _finalize_weighted_average(weighted_avg_dataset):
     #
     weighted_avg_dataset["Year_Week"] = pd.to_datetime(
         weighted_avg_dataset["Year"].astype(str) + "-" + weighted_avg_dataset["Week"].astype(str) + "-1", format="%Y-%W-%w")
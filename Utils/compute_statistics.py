@@ -2,34 +2,38 @@ import pandas as pd
 import numpy as np
 from Utils.load_dataset import load_dataset
 from Utils.threshold_dataset import threshold_ndvi_data
+from Utils.ndvi_store import flatten_ragged
+from Utils.threshold_statistics import segment_statistics, ROBUST_STATISTICS
 
 
 def compute_ndvi_statistics(dataset: pd.DataFrame):
     """
-    Computes the mean and standard deviation for NDVI pixel categories.
+    Computes the mean, standard deviation, median, 10th and 90th percentiles and interquartile range for NDVI
+    pixel categories.
+
+    The pixel lists of each category are flattened into one buffer and all their statistics are computed in a
+    single vectorized pass over it (see `Utils.threshold_statistics.segment_statistics`). Statistics of empty
+    pixel lists are NaN.
 
     Args:
         dataset (pd.DataFrame): Pandas DataFrame containing Green, Yellow, and Red NDVI pixel lists.
 
     Returns:
-        pd.DataFrame: Dataset with computed mean and standard deviation for each NDVI pixel category.
+        pd.DataFrame: Dataset with computed statistics for each NDVI pixel category.
     """
+    statistics = {}
+    for name in ("Green", "Yellow", "Red"):
+        values, offsets = flatten_ragged(dataset[f"{name}_NDVI_Pixels"], dtype=np.float64)
+        n_rows = offsets.size - 1
+        row_ids = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(offsets))
+        # Population standard deviation; lists holding only zeros are not empty
+        _, means, stds, robust = segment_statistics(values, row_ids, n_rows)
+        statistics[name] = {"Mean": means, "Std": stds, **robust}
 
-    def array_mean(arr):
-        return np.mean(arr) if arr.any() else None
-
-    def array_std(arr):
-        return np.std(arr, ddof=0) if arr.any() else None  # Using population standard deviation
-
-    # Compute mean
-    dataset["Mean_Green_Pixels"] = dataset["Green_NDVI_Pixels"].apply(array_mean)
-    dataset["Mean_Yellow_Pixels"] = dataset["Yellow_NDVI_Pixels"].apply(array_mean)
-    dataset["Mean_Red_Pixels"] = dataset["Red_NDVI_Pixels"].apply(array_mean)
-
-    # Compute standard deviation
-    dataset["Std_Green_Pixels"] = dataset["Green_NDVI_Pixels"].apply(array_std)
-    dataset["Std_Yellow_Pixels"] = dataset["Yellow_NDVI_Pixels"].apply(array_std)
-    dataset["Std_Red_Pixels"] = dataset["Red_NDVI_Pixels"].apply(array_std)
+    # Means, then standard deviations, then robust statistics, each for Green, Yellow and Red
+    for statistic in ["Mean", "Std"] + ROBUST_STATISTICS:
+        for name in ("Green", "Yellow", "Red"):
+            dataset[f"{statistic}_{name}_Pixels"] = statistics[name][statistic]
 
     return dataset
 
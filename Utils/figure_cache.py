@@ -0,0 +1,54 @@
+import io
+import os
+
+import matplotlib.pyplot as plt
+
+from Utils.pipeline_cache import LRUCache
+
+# Byte budget of the rendered-figure cache, can be overridden with the ZESPRI_FIGURE_CACHE_MB variable
+DEFAULT_FIGURE_CACHE_MB = 64
+# Same rendering options as `st.pyplot`, so cached images look the same as the figures they replace
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200, "format": "png"}
+
+_rendered_figures = LRUCache(int(os.environ.get("ZESPRI_FIGURE_CACHE_MB", DEFAULT_FIGURE_CACHE_MB)) << 20)
+
+
+def figure_to_png(fig) -> bytes:
+    """
+    Encode a figure as PNG bytes and close it, releasing its matplotlib memory.
+    """
+    try:
+        image = io.BytesIO()
+        fig.savefig(image, **SAVEFIG_OPTIONS)
+        return image.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def cached_figure_png(key: tuple, build_figure) -> bytes:
+    """
+    PNG bytes of a figure, built and encoded only if `key` is not in the rendered-figure cache.
+
+    Args:
+        key (tuple): Everything the figure depends on, e.g. (page, Primary_Key, area, seasons, processed
+            dataset key), the latter covering the data fingerprint and the thresholds.
+        build_figure (callable): Builds the figure on a cache miss (the figure is closed after encoding).
+
+    Returns:
+        bytes: PNG image, to be shown with `st.image`.
+    """
+    return _rendered_figures.get_or_compute(key, lambda: figure_to_png(build_figure()))
+
+
+def configure_figure_cache(max_bytes: int):
+    """
+    Change the byte budget of the rendered-figure cache (evicting entries if needed).
+    """
+    _rendered_figures.resize(max_bytes)
+
+
+def figure_cache_stats() -> dict:
+    """
+    Entries, bytes, hits, misses and evictions of the rendered-figure cache.
+    """
+    return _rendered_figures.stats()
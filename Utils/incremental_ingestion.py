@@ -0,0 +1,231 @@
+import os
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+from Utils.load_dataset import load_dataset, APP_COLUMNS
+from Utils.mean_weekly_resampling import weekly_sufficient_statistics, combine_weekly_statistics, \
+    static_attributes, finalize_weekly_statistics
+from Utils.schema import append_normalized
+
+# Identity of an acquisition: a block is observed at most once per date
+ACQUISITION_KEYS = ["Primary_Key", "Acquisition_Date"]
+# Seconds between two polls of the dataset file, can be overridden with the ZESPRI_WATCH_INTERVAL variable
+# (0 disables the watcher)
+DEFAULT_POLL_INTERVAL = 30.0
+
+
+@dataclass
+class WeeklyUpdate:
+    """
+    Weekly dataset after folding in new acquisitions, with the sufficient statistics it is finalized from.
+
+    `seasons` holds the (Primary_Key, Year) pairs whose weekly rows were rebuilt and `season_rows` those
+    rows, as stored in `weekly`.
+    """
+    weekly: pd.DataFrame
+    statistics: pd.DataFrame
+    attributes: pd.DataFrame
+    seasons: pd.MultiIndex
+    season_rows: pd.DataFrame
+
+
+def acquisition_keys(dataset: pd.DataFrame) -> pd.MultiIndex:
+    """
+    (Primary_Key, Acquisition_Date) of every row of a dataset (loaded or raw CSV columns).
+    """
+    return pd.MultiIndex.from_arrays([dataset["Primary_Key"].astype(str).to_numpy(),
+                                      pd.to_datetime(dataset["Acquisition_Date"], format="%Y-%m-%d").to_numpy()],
+                                     names=ACQUISITION_KEYS)
+
+
+def read_new_acquisitions(file_path: str, processed_keys: pd.MultiIndex, columns=APP_COLUMNS,
+                          quality_filter=None):
+    """
+    Load the acquisitions of a CSV file that are not processed yet, parsing the pixel columns of those rows only.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        processed_keys (pd.MultiIndex): `acquisition_keys` of the rows already processed.
+        columns (list): Columns to load.
+        quality_filter (QualityFilter): Acquisitions to keep (all if None).
+
+    Returns:
+        pd.DataFrame: New rows as returned by `load_dataset` (possibly empty), or None if a processed
+        acquisition is no longer in the file: the file was rewritten rather than appended to and needs a
+        full reload.
+    """
+    file_keys = acquisition_keys(pd.read_csv(file_path, usecols=ACQUISITION_KEYS))
+    if not processed_keys.isin(file_keys).all():
+        return None
+
+    return load_dataset(file_path, columns=columns, quality_filter=quality_filter,
+                        row_filter=lambda scalars: ~acquisition_keys(scalars).isin(processed_keys))
+
+
+def update_weekly_dataset(weekly: pd.DataFrame, statistics: pd.DataFrame, attributes: pd.DataFrame,
+                          new_rows: pd.DataFrame, primary_keys: pd.Index) -> WeeklyUpdate:
+    """
+    Fold new acquisitions into the weekly sufficient statistics and rebuild only the seasons they fall in.
+
+    Only the (Primary_Key, Year, Week) statistics of the new acquisitions are combined again, and only the
+    weekly rows of their (Primary_Key, Year) seasons are finalized and resampled; the other rows are kept.
+
+    Args:
+        weekly (pd.DataFrame): Weekly dataset in the compact schema, finalized from `statistics`.
+        statistics (pd.DataFrame): Output of `weekly_sufficient_statistics` for the processed acquisitions.
+        attributes (pd.DataFrame): Output of `static_attributes` for the processed acquisitions.
+        new_rows (pd.DataFrame): New acquisitions with their pixel counts and mean NDVI values.
+        primary_keys (pd.Index): Primary_Key lookup table of the updated weekly dataset.
+
+    Returns:
+        WeeklyUpdate: Same weekly dataset, statistics and attributes as computing them on all acquisitions.
+    """
+    new_statistics = weekly_sufficient_statistics(new_rows)
+    updated = statistics.index.isin(new_statistics.index)
+    statistics = pd.concat([statistics[~updated],
+                            combine_weekly_statistics([statistics[updated], new_statistics])]).sort_index()
+    attributes = pd.concat([attributes, static_attributes(new_rows)]).groupby(level="Primary_Key").first()
+
+    # Rebuild the seasons of the new acquisitions (their padded weeks are resampled again)
+    seasons = new_statistics.index.droplevel("Week").unique()
+    season_statistics = statistics[statistics.index.droplevel("Week").isin(seasons)]
+    kept = ~pd.MultiIndex.from_frame(weekly[["Primary_Key", "Year"]].astype({"Primary_Key": str})).isin(seasons)
+    weekly = append_normalized(weekly[kept], finalize_weekly_statistics(season_statistics, attributes),
+                               primary_keys)
+    season_rows = weekly.iloc[kept.sum():]
+
+    # Same row order as `resample_and_average_weekly`: by block, then week
+    order = np.lexsort([weekly["Year_Week"].to_numpy(), weekly["Primary_Key"].cat.codes.to_numpy()])
+    weekly = weekly.iloc[order].reset_index(drop=True)
+
+    return WeeklyUpdate(weekly, statistics, attributes, seasons, season_rows)
+
+
+class DatasetWatcher(threading.Thread):
+    """
+    Background thread polling a dataset file in its data directory and ingesting the rows appended to it.
+
+    A change is picked up once the file has not changed for a whole poll interval, so that a file being
+    written is not read half-way. The shared dataset and the cached processed datasets are then brought up to
+    date by `Utils.pipeline_cache.refresh_dataset_shared` (incrementally if rows were only appended), before
+    the next page load asks for them.
+
+    For a partitioned dataset the source exports are watched instead: once they have settled they are merged
+    with `Utils.partitioned_dataset.ensure_partitioned_dataset`, then the shared datasets are refreshed.
+
+    The dataset (and its exports) as found when the watcher is created are taken as up to date: the caller
+    loads or merges them first, and only later changes trigger a refresh.
+    """
+
+    def __init__(self, file_path: str, poll_interval: float = DEFAULT_POLL_INTERVAL, source_paths=None):
+        super().__init__(name=f"DatasetWatcher({os.path.basename(file_path)})", daemon=True)
+        self.file_path = file_path
+        self.poll_interval = poll_interval
+        self.source_paths = source_paths
+        self.refreshes = 0
+        self.last_error = None
+        # Nothing to refresh until the files change
+        self._changed = self._refreshed = self._fingerprint()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as error:
+                # Keep watching, the next change may be readable
+                self.last_error = error
+
+    def poll(self) -> bool:
+        """
+        Check the dataset file once, refreshing the shared dataset if it changed and has settled.
+
+        Returns:
+            bool: Whether a refresh was run.
+        """
+        from Utils.pipeline_cache import refresh_dataset_shared
+        from Utils.partitioned_dataset import ensure_partitioned_dataset
+        fingerprint = self._fingerprint()
+        if fingerprint is None:
+            return False
+        if fingerprint != self._changed:
+            self._changed = fingerprint
+            return False
+        if fingerprint == self._refreshed:
+            return False
+
+        if self.source_paths is not None:
+            ensure_partitioned_dataset(self.file_path, self.source_paths)
+        refresh_dataset_shared(self.file_path)
+        # Merging the exports changed the dataset itself, which is up to date
+        self._refreshed = self._changed = self._fingerprint()
+        self.refreshes += 1
+        return True
+
+    def _fingerprint(self):
+        # Fingerprint of the dataset and of its source exports, None while any of them is missing
+        from Utils.pipeline_cache import dataset_fingerprint
+        paths = [self.file_path] + list(self.source_paths or ())
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return tuple(dataset_fingerprint(path) for path in paths)
+
+    def stop(self):
+        self._stopped.set()
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def start_dataset_watcher(file_path: str, poll_interval: float = None, source_paths=None):
+    """
+    Start (once per process and file) the background watcher of a dataset.
+
+    Args:
+        file_path (str): Path to the CSV file (or NDVI store or partitioned dataset directory) containing the
+            dataset.
+        poll_interval (float): Seconds between two polls (ZESPRI_WATCH_INTERVAL or DEFAULT_POLL_INTERVAL if None).
+        source_paths (list): CSV exports a partitioned dataset is merged from, in increasing order of precedence
+            (see `Utils.partitioned_dataset.ensure_partitioned_dataset`).
+
+    Returns:
+        DatasetWatcher: The running watcher, or None if watching is disabled (interval of 0).
+    """
+    if poll_interval is None:
+        poll_interval = float(os.environ.get("ZESPRI_WATCH_INTERVAL", DEFAULT_POLL_INTERVAL))
+    if poll_interval <= 0:
+        return None
+
+    with _watchers_lock:
+        watcher = _watchers.get(os.path.abspath(file_path))
+        if watcher is None or not watcher.is_alive():
+            watcher = DatasetWatcher(file_path, poll_interval, source_paths)
+            watcher.start()
+            _watchers[os.path.abspath(file_path)] = watcher
+    return watcher
+
+
+if __name__ == "__main__":
+    # Example usage: ingest a dataset in two parts and compare with loading it at once
+    import tempfile
+    from Utils.pipeline_cache import get_processed_dataset, refresh_dataset_shared
+
+    source = pd.read_csv("../Satellite_NDVI_data_construction_2.csv", dtype=str, keep_default_na=False)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "dataset.csv")
+        source.iloc[:300].to_csv(file_path, index=False)
+        first = get_processed_dataset(file_path, 0.3, 0.55)
+
+        source.to_csv(file_path, index=False)
+        refresh_dataset_shared(file_path)
+        incremental = get_processed_dataset(file_path, 0.3, 0.55)
+
+        full_path = os.path.join(directory, "full.csv")
+        source.to_csv(full_path, index=False)
+        full = get_processed_dataset(full_path, 0.3, 0.55)
+
+    print(first.weekly.shape, "->", incremental.weekly.shape, "(full load:", full.weekly.shape, ")")
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import tracemalloc
+from dataclasses import dataclass, asdict
+
+# Instrumentation is off unless enabled with the ZESPRI_INSTRUMENTATION variable, `configure_instrumentation`,
+# or for the current thread with `collect_stages` (used by the sidebar diagnostics panel)
+INSTRUMENTATION_ENV = "ZESPRI_INSTRUMENTATION"
+INSTRUMENTATION_LOG_ENV = "ZESPRI_INSTRUMENTATION_LOG"
+TRACE_MEMORY_ENV = "ZESPRI_INSTRUMENTATION_MEMORY"
+
+
+@dataclass
+class StageRecord:
+    """
+    Measurements of one pipeline stage run.
+
+    `peak_bytes` is the peak traced allocation above the memory in use when the stage started (None when
+    memory tracing is off). It is process-wide, so it is approximate when several sessions run at once.
+    """
+    stage: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_bytes: int = None
+    rows_in: int = None
+    rows_out: int = None
+    depth: int = 0
+    timestamp: float = 0.0
+
+
+class _NullRecord:
+    # Shared record of disabled stages, attribute assignments are ignored
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = contextlib.nullcontext(_NullRecord())
+
+
+class _Config:
+    def __init__(self):
+        self.enabled = os.environ.get(INSTRUMENTATION_ENV, "") not in ("", "0")
+        self.log_path = os.environ.get(INSTRUMENTATION_LOG_ENV) or None
+        self.trace_memory = os.environ.get(TRACE_MEMORY_ENV, "1") not in ("", "0")
+        self.log_lock = threading.Lock()
+
+
+_config = _Config()
+_thread_state = threading.local()
+
+
+def configure_instrumentation(enabled: bool = None, log_path: str = None, trace_memory: bool = None):
+    """
+    Change the process-wide instrumentation settings (arguments left to None are unchanged).
+
+    Args:
+        enabled (bool): Whether every stage is measured.
+        log_path (str): JSON-lines file receiving one line per measured stage ("" disables the log).
+        trace_memory (bool): Whether peak memory is measured with `tracemalloc` (slows allocations down).
+    """
+    if enabled is not None:
+        _config.enabled = enabled
+    if log_path is not None:
+        _config.log_path = log_path or None
+    if trace_memory is not None:
+        _config.trace_memory = trace_memory
+
+
+def _active() -> bool:
+    return _config.enabled or getattr(_thread_state, "records", None) is not None
+
+
+def _rows(value) -> int:
+    return None if value is None else len(value)
+
+
+@contextlib.contextmanager
+def _measure(name: str, rows_in: int):
+    stack = _thread_state.__dict__.setdefault("stack", [])
+    record = StageRecord(stage=name, rows_in=rows_in, depth=len(stack), timestamp=time.time())
+
+    trace_memory = _config.trace_memory
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if trace_memory:
+        # Keep the peak reached so far by the enclosing stage before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+    frame = [current if trace_memory else 0, 0]
+    stack.append(frame)
+
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    finally:
+        record.wall_seconds = time.perf_counter() - wall_start
+        record.cpu_seconds = time.thread_time() - cpu_start
+        stack.pop()
+        if trace_memory and tracemalloc.is_tracing():
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            record.peak_bytes = max(peak - frame[0], 0)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+        if started_tracing:
+            tracemalloc.stop()
+        _emit(record)
+
+
+def stage(name: str, rows_in=None):
+    """
+    Context manager measuring a pipeline stage: wall time, CPU time of the calling thread, peak allocated
+    memory and row counts. Set `rows_out` on the yielded record to report the output rows.
+
+    When instrumentation is disabled a shared no-op context is returned, so wrapping a stage costs a
+    function call and an attribute lookup.
+
+    Example:
+        with stage("load_dataset") as record:
+            dataset = load_dataset(file_path)
+            record.rows_out = len(dataset)
+
+    Args:
+        name (str): Stage name, as it appears in the logs and in the diagnostics panel.
+        rows_in (int or sized): Number of input rows (or the input itself, measured with `len`).
+    """
+    if not _active():
+        return _NULL_STAGE
+    return _measure(name, rows_in if rows_in is None or isinstance(rows_in, int) else _rows(rows_in))
+
+
+def _emit(record: StageRecord):
+    records = getattr(_thread_state, "records", None)
+    if records is not None:
+        records.append(record)
+    if _config.log_path:
+        line = json.dumps({**asdict(record), "pid": os.getpid(), "thread": threading.current_thread().name})
+        with _config.log_lock, open(_config.log_path, "a") as f:
+            f.write(line + "\n")
+
+
+@contextlib.contextmanager
+def collect_stages():
+    """
+    Measure every stage run by the current thread within the block, even if instrumentation is disabled.
+
+    Yields:
+        list: The `StageRecord`s, appended as the stages complete (nested stages before their parent).
+    """
+    previous = getattr(_thread_state, "records", None)
+    _thread_state.records = []
+    try:
+        yield _thread_state.records
+    finally:
+        _thread_state.records = previous
+
+
+def stage_records_frame(records):
+    """
+    Records as a DataFrame in start order, with stage names indented by nesting depth and peak memory in MB.
+    """
+    import pandas as pd
+    frame = pd.DataFrame([asdict(record) for record in records],
+                         columns=list(StageRecord.__dataclass_fields__))
+    frame = frame.sort_values("timestamp", kind="stable").drop(columns="timestamp")
+    frame["stage"] = ["  " * depth + name for depth, name in zip(frame["depth"], frame["stage"])]
+    frame["peak_mb"] = frame.pop("peak_bytes") / 2 ** 20
+    return frame.drop(columns="depth").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    from Utils.load_dataset import load_dataset
+    from Utils.threshold_statistics import threshold_and_compute_statistics
+
+    configure_instrumentation(log_path="../instrumentation.jsonl")
+    with collect_stages() as records:
+        with stage("pipeline"):
+            with stage("load_dataset") as record:
+                dataset = load_dataset("../Satellite_NDVI_data_construction_2.csv")
+                record.rows_out = len(dataset)
+            with stage("threshold_and_compute_statistics", rows_in=dataset) as record:
+                dataset = threshold_and_compute_statistics(dataset, 0.3, 0.55)
+                record.rows_out = len(dataset)
+    print(stage_records_frame(records))
+
+    # Overhead of a disabled stage
+    configure_instrumentation(enabled=False, log_path="")
+    start = time.perf_counter()
+    for _ in range(100000):
+        with stage("noop"):
+            pass
+    print("Disabled stage overhead (us):", (time.perf_counter() - start) / 100000 * 1e6)
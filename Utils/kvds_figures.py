@@ -0,0 +1,192 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+
+from Utils.mean_weekly_resampling import PREDEFINED_START_WEEK, NDVI_CLASSES
+from Utils.season_week_pivot import N_WEEK_SLOTS
+
+
+def build_low_kvds_figure(selected_dataset, area_aggregation_dataset, selected_kpin, selected_block, selected_area,
+                          selected_season):
+    """
+    Build the "Low or No KVDS" figure: mean NDVI of green pixels of a block versus its area, and the NDVI
+    pixel distributions of both.
+
+    Args:
+        selected_dataset (pd.DataFrame): Weekly dataset of the block for the season.
+        area_aggregation_dataset (pd.DataFrame): Weekly area aggregation for the season, excluding the block.
+        selected_kpin (int): KPIN of the block.
+        selected_block (str): Block_Name of the block.
+        selected_area (str): Supply_Area_Name of the comparison group.
+        selected_season (int): Season (Year).
+
+    Returns:
+        matplotlib.figure.Figure: The figure (close it with `plt.close` once rendered).
+    """
+    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(7, 10), gridspec_kw={'height_ratios': [2, 1, 1]})
+
+    r1 = [x + 14 for x in range(selected_dataset.shape[0])]
+
+    # Plot the Mean NDVI of Green Pixels for the selected KPIN and Block and for the selected area
+    ax1.plot(selected_dataset["Week"], selected_dataset["Mean_Green_Pixels"], color='green', marker='o',
+             markersize=5,
+             label=f"KPIN: {selected_kpin}, Block: {selected_block} - Mean Green Pixels")
+    ax1.plot(area_aggregation_dataset["Week"], area_aggregation_dataset["Mean_Green_Pixels"], color='lightgreen',
+             marker='o', markersize=5,
+             linestyle='--', label=f"Area: {selected_area}")
+    ax1.set_xlabel("Date")
+    ax1.set_ylabel("Mean NDVI Pixels")
+    ax1.set_title(f"Mean Green Pixels for KPIN: {selected_kpin}, Block: {selected_block}, Season: {selected_season}")
+    ax1.legend()
+    ax1.grid(True)
+    ax1.set_xticks(r1)
+    ax1.set_xlim(13, 45)
+    ax1.set_xticklabels(selected_dataset["Year_Week"].dt.strftime('%m-%d'), rotation=90)
+
+    # Plot the Number of Green NDVI Pixels for the selected KPIN and Block and for the selected area
+    # Create discrete stacked plot in the superior subplot
+    bar_width = 0.35
+    ax2.bar(r1, selected_dataset['Green_NDVI_Pixels_Number'], color='#006400',
+            width=bar_width, label='Green NDVI Pixels')  # Darker green
+    ax2.bar(r1, selected_dataset['Yellow_NDVI_Pixels_Number'],
+            bottom=selected_dataset['Green_NDVI_Pixels_Number'], color='#FFFF00',
+            width=bar_width, label='Yellow NDVI Pixels')  # Lighter yellow
+    ax2.bar(r1, selected_dataset['Red_NDVI_Pixels_Number'],
+            bottom=selected_dataset['Green_NDVI_Pixels_Number'] +
+                   selected_dataset['Yellow_NDVI_Pixels_Number'], color='#8B0000',
+            width=bar_width, label='Red NDVI Pixels')  # Darker red
+
+    ax2.set_xlabel('Date')
+    ax2.set_ylabel('Number of Pixels')
+    ax2.set_title(f'Distribution of NDVI Pixels, KPIN:{selected_kpin}, Block:{selected_block}, Season: {selected_season}')
+    ax2.legend(loc='lower right')
+    ax2.grid(True)
+    ax2.set_xticks(r1)
+    ax2.set_xlim(13, 45)
+    ax2.set_xticklabels(selected_dataset['Year_Week'].dt.strftime('%m-%d'), rotation=90)
+
+    # Create discrete stacked plot in the inferior subplot
+    ax3.bar(r1, area_aggregation_dataset['Green_NDVI_Pixels_Number'], color='#006400',
+            width=bar_width, label='Green NDVI Pixels')  # Darker green
+    ax3.bar(r1, area_aggregation_dataset['Yellow_NDVI_Pixels_Number'],
+            bottom=area_aggregation_dataset['Green_NDVI_Pixels_Number'], color='#FFFF00',
+            width=bar_width, label='Yellow NDVI Pixels')  # Lighter yellow
+    ax3.bar(r1, area_aggregation_dataset['Red_NDVI_Pixels_Number'],
+            bottom=area_aggregation_dataset['Green_NDVI_Pixels_Number'] + area_aggregation_dataset[
+                'Yellow_NDVI_Pixels_Number'],
+            color='#8B0000', width=bar_width, label='Red NDVI Pixels')  # Darker red
+    ax3.set_xlabel('Date')
+    ax3.set_ylabel('Number of Pixels')
+    ax3.set_title(f'Distribution of NDVI Pixels, {selected_area} area, Season: {selected_season}')
+    ax3.grid(True)
+    ax3.set_xticks(r1)
+    ax3.set_xlim(13, 45)
+    ax3.set_xticklabels(area_aggregation_dataset['Year_Week'].dt.strftime('%m-%d'), rotation=90)
+
+    plt.tight_layout()
+    return fig
+
+
+def build_onset_kvds_figure(pivot, selected_kpin, selected_block):
+    """
+    Build the "Onset KVDS" figure: mean NDVI of yellow pixels of a block across seasons, and the NDVI pixel
+    distribution of each season.
+
+    Args:
+        pivot (SeasonWeekPivot): Season x week pivot of the block (see `Utils.season_week_pivot`), with one
+            season per selected season; seasons without data are left empty.
+        selected_kpin (int): KPIN of the block.
+        selected_block (str): Block_Name of the block.
+
+    Returns:
+        matplotlib.figure.Figure: The figure (close it with `plt.close` once rendered).
+    """
+    seasons, present, year_weeks = pivot.seasons, pivot.present[0], pivot.year_weeks[0]
+
+    fig, ax1 = plt.subplots(len(seasons) + 1, 1, figsize=(7, 10), squeeze=False,
+                            gridspec_kw={'height_ratios': [2] + [1] * len(seasons)})
+    ax1 = ax1[:, 0]
+
+    # Seasons are aligned on the predefined week slots, one tick per slot
+    r1 = PREDEFINED_START_WEEK + np.arange(N_WEEK_SLOTS)
+
+    def week_labels(s):
+        return pd.DatetimeIndex(year_weeks[s]).strftime('%m-%d') if present[s] else []
+
+    plt.tight_layout()
+    for s, season in enumerate(seasons):
+        if not present[s]:
+            continue
+        ax1[0].plot(r1, pivot["Mean_Yellow_Pixels"][0, s], marker='o', markersize=5, label=f"Season: {season}")
+
+    ax1[0].set_xlabel("Date")
+    ax1[0].set_ylabel("Mean NDVI Pixels")
+    ax1[0].set_title(f"Mean Green Pixels for Selected KPIN: {selected_kpin}, Block: {selected_block}")
+    ax1[0].set_xticks(r1)
+    ax1[0].set_xlim(13, 45)
+    # Dates of the last selected season
+    ax1[0].set_xticklabels(week_labels(len(seasons) - 1) if seasons else [], rotation=90)
+    ax1[0].legend()
+    ax1[0].grid(True)
+
+    # Plot the Number of Pixels for each season, all slots of the block at once
+    bar_width = 0.35
+    green, yellow, red = (pivot[f"{name}_NDVI_Pixels_Number"][0] for name in NDVI_CLASSES)
+    for s, season in enumerate(seasons):
+        if not present[s]:
+            continue
+        # Create discrete stacked plot in the superior subplot
+        ax1[s + 1].bar(r1, green[s], color='#006400', width=bar_width, label='Green NDVI Pixels', align='center')
+        ax1[s + 1].bar(r1, yellow[s], bottom=green[s], color='#FFFF00', width=bar_width,
+                       label='Yellow NDVI Pixels', align='center')
+        ax1[s + 1].bar(r1, red[s], color='#8B0000', bottom=green[s] + yellow[s], width=bar_width,
+                       label='Red NDVI Pixels', align='center')
+        ax1[s + 1].set_xlabel('Date')
+        ax1[s + 1].set_ylabel('Number of Pixels')
+        ax1[s + 1].set_title(f'Distribution of NDVI Pixels, Season: {season}')
+        ax1[s + 1].legend(loc='lower right')
+        ax1[s + 1].grid(True)
+        ax1[s + 1].set_xticks(r1)
+        ax1[s + 1].set_xlim(13, 45)
+        ax1[s + 1].set_xticklabels(week_labels(s), rotation=90)
+
+    plt.suptitle(f'Distribution of NDVI Pixels')
+    plt.tight_layout()
+
+    return fig
+
+
+def build_threshold_sensitivity_figure(lower_values, upper_values, pairs, values, value_label, lower_ndvi_threshold,
+                                       upper_ndvi_threshold, title):
+    """
+    Build the threshold sensitivity heatmap: a block statistic for every (lower, upper) pair of a threshold grid.
+
+    Args:
+        lower_values (np.ndarray): Lower thresholds of the grid (rows of the heatmap).
+        upper_values (np.ndarray): Upper thresholds of the grid (columns of the heatmap).
+        pairs (np.ndarray): (pairs, 2) thresholds of `values`, pairs missing from the grid are left blank.
+        values (np.ndarray): Statistic of each pair.
+        value_label (str): Name of the statistic, for the color bar.
+        lower_ndvi_threshold (float): Current lower threshold, marked on the heatmap.
+        upper_ndvi_threshold (float): Current upper threshold, marked on the heatmap.
+        title (str): Figure title.
+
+    Returns:
+        matplotlib.figure.Figure: The figure (close it with `plt.close` once rendered).
+    """
+    matrix = np.full((len(lower_values), len(upper_values)), np.nan)
+    matrix[np.searchsorted(lower_values, pairs[:, 0]), np.searchsorted(upper_values, pairs[:, 1])] = values
+
+    fig, ax = plt.subplots(figsize=(7, 6))
+    image = ax.pcolormesh(upper_values, lower_values, np.ma.masked_invalid(matrix), cmap="viridis", shading="nearest")
+    fig.colorbar(image, ax=ax, label=value_label)
+    ax.plot(upper_ndvi_threshold, lower_ndvi_threshold, marker="x", color="red", markersize=10,
+            label="Current Thresholds")
+
+    ax.set_xlabel("Upper NDVI Threshold")
+    ax.set_ylabel("Lower NDVI Threshold")
+    ax.set_title(title)
+    ax.legend(loc="lower right")
+    plt.tight_layout()
+
+    return fig
@@ -0,0 +1,76 @@
+import threading
+
+import pandas as pd
+import numpy as np
+
+from Utils.parallel_parsing import parse_ndvi_list, parse_ndvi_matrix
+
+
+class CSVColumnSource:
+    """
+    Pixel column of a CSV file, read on first access and parsed one row at a time.
+    """
+
+    def __init__(self, file_path: str, column: str):
+        self.file_path = file_path
+        self.column = column
+        self._texts = None
+        self._lock = threading.Lock()
+
+    def load_row(self, row: int) -> np.ndarray:
+        with self._lock:
+            if self._texts is None:
+                self._texts = pd.read_csv(self.file_path, usecols=[self.column])[self.column].to_numpy()
+        text = self._texts[row]
+        return parse_ndvi_matrix(text) if self.column == "NDVI_Data" else parse_ndvi_list(text)
+
+
+class StoreColumnSource:
+    """
+    Pixel column of an NDVI store, mapped one row at a time from the memory-mapped buffers.
+    """
+
+    def __init__(self, store, column: str):
+        self.store = store
+        self.column = column
+
+    def load_row(self, row: int) -> np.ndarray:
+        return self.store.ndvi_matrix_row(row) if self.column == "NDVI_Data" else self.store.valid_ndvi_row(row)
+
+
+class LazyNDVIArray:
+    """
+    Placeholder for the pixel array of one row, loaded from its source only when accessed.
+
+    Use `load()` (or `np.asarray`) to get the array, it is not kept after use.
+    """
+    __slots__ = ("source", "row")
+
+    def __init__(self, source, row: int):
+        self.source = source
+        self.row = row
+
+    def load(self) -> np.ndarray:
+        return self.source.load_row(self.row)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.load()
+        return array if dtype is None else array.astype(dtype)
+
+    def __repr__(self):
+        return f"LazyNDVIArray({self.source.column}, row={self.row})"
+
+
+def lazy_column(source, rows, index) -> pd.Series:
+    """
+    Object column of lazy handles for the given source rows.
+
+    Args:
+        source (CSVColumnSource or StoreColumnSource): Where the pixel arrays are loaded from.
+        rows (iterable): Row number of each entry in the source.
+        index (pd.Index): Index of the resulting Series.
+
+    Returns:
+        pd.Series: One `LazyNDVIArray` per row.
+    """
+    return pd.Series([LazyNDVIArray(source, row) for row in rows], index=index, dtype=object)
@@ -1,43 +1,128 @@
-import pandas as pd
-import numpy as np
-
-
-def load_dataset(file_path: str) -> pd.DataFrame:
-    """
-    Load a dataset from a CSV file and preprocess it.
-
-    Args:
-        file_path (str): Path to the CSV file containing the dataset.
-
-    Returns:
-        pd.DataFrame: Preprocessed dataset.
-    """
-    # Load the dataset
-    dataset = pd.read_csv(file_path)
-
-    # Convert "Block_Name" column to string type
-    dataset["Block_Name"] = dataset["Block_Name"].astype(str)
-
-    # Convert 'NDVI_Data' column from string representation of matrices to numpy matrices objects
-    dataset["NDVI_Data"] = dataset["NDVI_Data"].apply(lambda x: x.replace("null", "None"))
-    dataset["NDVI_Data"] = dataset["NDVI_Data"].apply(eval)
-    dataset["NDVI_Data"] = dataset["NDVI_Data"].apply(lambda x: np.array(x))
-
-    # Convert 'Valid_NDVI_Data' column from string representation of lists to numpy arrays
-    dataset["Valid_NDVI_Data"] = dataset["Valid_NDVI_Data"].apply(eval)
-    dataset["Valid_NDVI_Data"] = dataset["Valid_NDVI_Data"].apply(lambda x: np.array(x))
-
-    # Convert 'Date' column to datetime format
-    dataset["Acquisition_Date"] = pd.to_datetime(dataset["Acquisition_Date"], format="%Y-%m-%d")
-
-    return dataset
-
-
-if __name__ == "__main__":
-    # Example usage:
-    dataset = load_dataset('../Satellite_NDVI_data_construction_2.csv')
-    print(dataset.head())
-    print(dataset.dtypes)
-    print(type(dataset.loc[0, "NDVI_Data"]))
-    print(dataset["Supply_Area_Name"].unique())
-    print(dataset["Acquisition_Date"].count())
+import pandas as pd
+import numpy as np
+
+from Utils.parallel_parsing import parse_ndvi_column
+from Utils.lazy_columns import CSVColumnSource, lazy_column
+from Utils.quality_filter import QUALITY_COLUMNS, quality_mask
+
+# Columns of the NDVI dataset exports
+DATASET_COLUMNS = ["KPIN", "Block_Name", "Primary_Key", "Orchard_Name", "Acquisition_Date", "Year", "Month", "Week",
+                   "Day", "Country_Name", "Supply_Area_Name", "Supply_Region_Name", "Total_Hectares", "Variety_Name",
+                   "NDVI_Data", "Valid_NDVI_Data", "Number_Of_Valid_Pixels", "Cloud_Or_Shadow_Percentage",
+                   "Cloud_Or_Shadow_Return_Code"]
+# Pixel columns, expensive to parse and to keep in memory
+PIXEL_COLUMNS = ["NDVI_Data", "Valid_NDVI_Data"]
+# Columns used by the app pages (none of them reads the 2-D NDVI_Data matrices)
+APP_COLUMNS = [column for column in DATASET_COLUMNS if column != "NDVI_Data"]
+
+
+def load_dataset(file_path: str, workers: int = 1, columns=None, lazy_columns=(),
+                 quality_filter=None, row_filter=None, partitions=None) -> pd.DataFrame:
+    """
+    Load a dataset from a CSV file and preprocess it.
+
+    If `file_path` is an NDVI store directory (see `Utils.ndvi_store.convert_csv_to_store`), the pixel
+    columns are memory-mapped from the store instead of being parsed from text. If it is a partitioned
+    dataset directory (see `Utils.partitioned_dataset.merge_exports`), only the selected partitions are read.
+
+    Args:
+        file_path (str): Path to the CSV file (or NDVI store directory) containing the dataset.
+        workers (int): Number of processes parsing the NDVI columns (None uses all cores).
+        columns (list): Columns to load (all columns if None).
+        lazy_columns (list): Pixel columns (among `columns`) loaded as `LazyNDVIArray` handles, which parse
+            or map a single row only when accessed.
+        quality_filter (QualityFilter): Acquisitions to keep (all if None). The filter is evaluated on the
+            scalar columns first, the pixel columns are only parsed for the acquisitions passing it.
+        row_filter (callable): Takes the raw scalar columns (of a CSV file) and returns a boolean mask of the
+            rows to load, combined with the quality filter and applied in the same way.
+        partitions (PartitionSelection): Partitions to read from a partitioned dataset (all if None).
+
+    Returns:
+        pd.DataFrame: Preprocessed dataset.
+    """
+    from Utils.ndvi_store import is_ndvi_store, load_ndvi_store, store_to_dataframe
+    from Utils.partitioned_dataset import is_partitioned_dataset, load_partitioned_dataset
+    if is_ndvi_store(file_path):
+        return store_to_dataframe(load_ndvi_store(file_path), columns, lazy_columns, quality_filter)
+    if is_partitioned_dataset(file_path):
+        return load_partitioned_dataset(file_path, workers, columns, lazy_columns, quality_filter, row_filter,
+                                        partitions)
+
+    # Load the dataset (lazy columns are not read now)
+    def is_requested(column):
+        return columns is None or column in columns
+
+    def is_loaded(column):
+        return is_requested(column) and column not in lazy_columns
+
+    if row_filter is None and (quality_filter is None or quality_filter.keeps_everything):
+        dataset = pd.read_csv(file_path, usecols=is_loaded)
+        kept_rows = range(len(dataset))
+    else:
+        # Scalar columns first, then the pixel literals of the acquisitions passing the filters only
+        dataset = pd.read_csv(file_path, usecols=lambda column: (is_loaded(column) and column not in PIXEL_COLUMNS)
+                              or column in QUALITY_COLUMNS)
+        keep = np.ones(len(dataset), dtype=bool)
+        if quality_filter is not None:
+            keep &= quality_mask(dataset, quality_filter)
+        if row_filter is not None:
+            keep &= np.asarray(row_filter(dataset), dtype=bool)
+        kept_rows = np.flatnonzero(keep)
+        dataset = dataset[keep].reset_index(drop=True)
+        pixel_columns = [column for column in PIXEL_COLUMNS if is_loaded(column)]
+        if pixel_columns:
+            # File line numbers of the dropped rows (line 0 is the header)
+            skipped_lines = set((np.flatnonzero(~keep) + 1).tolist())
+            pixels = pd.read_csv(file_path, usecols=pixel_columns, skiprows=skipped_lines)
+            for column in pixel_columns:
+                dataset[column] = pixels[column]
+    dataset = preprocess_dataset(dataset, workers)
+
+    for column in lazy_columns:
+        dataset[column] = lazy_column(CSVColumnSource(file_path, column), kept_rows, dataset.index)
+
+    # Restore the column order of the CSV export
+    header = pd.read_csv(file_path, nrows=0).columns
+    return dataset[[column for column in header if column in dataset.columns and is_requested(column)]]
+
+
+def preprocess_dataset(dataset: pd.DataFrame, workers: int = 1) -> pd.DataFrame:
+    """
+    Convert the raw CSV columns (rows of a full file or of a chunk) to their in-memory types.
+
+    Args:
+        dataset (pd.DataFrame): Raw dataset as read by `pd.read_csv`, possibly with a subset of the columns.
+        workers (int): Number of processes parsing the NDVI columns (None uses all cores).
+
+    Returns:
+        pd.DataFrame: Preprocessed dataset.
+    """
+    # Convert "Block_Name" column to string type
+    if "Block_Name" in dataset.columns:
+        dataset["Block_Name"] = dataset["Block_Name"].astype(str)
+
+    # Convert 'NDVI_Data' column from string representation of matrices to numpy matrices ("null" pixels as NaN)
+    if "NDVI_Data" in dataset.columns:
+        dataset["NDVI_Data"] = pd.Series(parse_ndvi_column(dataset["NDVI_Data"], matrix=True, workers=workers),
+                                         index=dataset.index, dtype=object)
+
+    # Convert 'Valid_NDVI_Data' column from string representation of lists to numpy arrays
+    if "Valid_NDVI_Data" in dataset.columns:
+        dataset["Valid_NDVI_Data"] = pd.Series(parse_ndvi_column(dataset["Valid_NDVI_Data"], workers=workers),
+                                               index=dataset.index, dtype=object)
+
+    # Convert 'Date' column to datetime format
+    if "Acquisition_Date" in dataset.columns:
+        dataset["Acquisition_Date"] = pd.to_datetime(dataset["Acquisition_Date"], format="%Y-%m-%d")
+
+    return dataset
+
+
+if __name__ == "__main__":
+    # Example usage:
+    dataset = load_dataset('../Satellite_NDVI_data_construction_2.csv')
+    print(dataset.head())
+    print(dataset.dtypes)
+    print(type(dataset.loc[0, "NDVI_Data"]))
+    print(dataset["Supply_Area_Name"].unique())
+    print(dataset["Acquisition_Date"].count())
@@ -3,90 +3,189 @@ import numpy as np
 from Utils.load_dataset import load_dataset
 from Utils.threshold_dataset import threshold_ndvi_data
 from Utils.compute_statistics import compute_ndvi_statistics
+from Utils.threshold_statistics import ROBUST_STATISTICS
+
+# Predefined range of weeks (April to October)
+PREDEFINED_START_WEEK = 14  # First week of April
+PREDEFINED_END_WEEK = 44   # Last week of October
+
+WEEKLY_KEYS = ["Primary_Key", "Year", "Week"]
+NDVI_CLASSES = ["Green", "Yellow", "Red"]
+
+# Non-aggregated features, constant for a given Primary_Key
+STATIC_COLUMNS = ["KPIN", "Block_Name", "Orchard_Name", "Country_Name", "Supply_Area_Name", "Total_Hectares",
+                  "Variety_Name"]
+# Features taking the earliest value of the week
+MIN_COLUMNS = ["Month", "Day", "Acquisition_Date"]
+# Features averaged over the acquisitions of the week
+MEAN_COLUMNS = ["Green_NDVI_Pixels_Number", "Yellow_NDVI_Pixels_Number", "Red_NDVI_Pixels_Number",
+                "Cloud_Or_Shadow_Percentage", "Cloud_Or_Shadow_Return_Code"]
+
+# Column order of the weekly means (before resampling to the predefined weeks)
+WEEKLY_COLUMNS = WEEKLY_KEYS + ["KPIN", "Block_Name", "Orchard_Name", "Country_Name", "Supply_Area_Name", "Month",
+                                "Day", "Acquisition_Date", "Total_Hectares", "Variety_Name"] + \
+                 [f"Mean_{name}_Pixels" for name in NDVI_CLASSES] + MEAN_COLUMNS
+
+
+def weekly_sufficient_statistics(dataset: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce acquisitions to additive per-(Primary_Key, Year, Week) statistics.
+
+    Count-weighted means are carried as the sums of count * mean ("<Class>_Weighted_Sum") and of
+    count ("<Class>_Weight"), plain means as the sums ("<Feature>_Sum") and the numbers of non-missing
+    values ("<Feature>_Count"), and the earliest Month, Day and Acquisition_Date of the week. The robust
+    statistics of the acquisitions ("Median_<Class>_Pixels", ..., when present) are averaged with the same
+    weights, from the sums of count * statistic ("<Class>_<Statistic>_Weighted_Sum").
+
+    Args:
+        dataset (pd.DataFrame): Dataset with pixel counts and mean NDVI values per acquisition.
+
+    Returns:
+        pd.DataFrame: Statistics indexed by (Primary_Key, Year, Week).
+    """
+    statistics = dataset[WEEKLY_KEYS + MIN_COLUMNS].copy()
+    for name in NDVI_CLASSES:
+        count = dataset[f"{name}_NDVI_Pixels_Number"]
+        # Missing means are skipped by the grouped sum, as in a weighted average over valid means
+        statistics[f"{name}_Weighted_Sum"] = dataset[f"Mean_{name}_Pixels"] * count
+        statistics[f"{name}_Weight"] = count
+        for statistic in _robust_statistics_of(dataset):
+            statistics[f"{name}_{statistic}_Weighted_Sum"] = dataset[f"{statistic}_{name}_Pixels"] * count
+    for column in MEAN_COLUMNS:
+        statistics[f"{column}_Sum"] = dataset[column]
+        statistics[f"{column}_Count"] = dataset[column].notna().astype(np.int64)
+
+    grouped = statistics.groupby(WEEKLY_KEYS)
+    sum_columns = [column for column in statistics.columns if column not in WEEKLY_KEYS + MIN_COLUMNS]
+
+    return pd.concat([grouped[MIN_COLUMNS].min(), grouped[sum_columns].sum()], axis=1)
+
+
+def _robust_statistics_of(dataset: pd.DataFrame) -> list:
+    # Robust statistics computed for the acquisitions (older datasets only have means and stds)
+    return [statistic for statistic in ROBUST_STATISTICS if f"{statistic}_Green_Pixels" in dataset.columns]
+
+
+def combine_weekly_statistics(parts) -> pd.DataFrame:
+    """
+    Merge partial outputs of `weekly_sufficient_statistics` (e.g. computed on chunks of the same dataset).
+
+    Args:
+        parts (list): Partial weekly statistics, possibly sharing (Primary_Key, Year, Week) groups.
+
+    Returns:
+        pd.DataFrame: Statistics indexed by (Primary_Key, Year, Week).
+    """
+    statistics = pd.concat(parts)
+    grouped = statistics.groupby(level=WEEKLY_KEYS)
+    sum_columns = [column for column in statistics.columns if column not in MIN_COLUMNS]
+
+    return pd.concat([grouped[MIN_COLUMNS].min(), grouped[sum_columns].sum()], axis=1)
+
+
+def static_attributes(dataset: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-Primary_Key lookup table of the non-aggregated features (KPIN, orchard, area, variety, hectares).
+
+    Args:
+        dataset (pd.DataFrame): Dataset with one or more rows per Primary_Key.
+
+    Returns:
+        pd.DataFrame: First non-missing value of each static feature, indexed by Primary_Key.
+    """
+    return dataset.groupby("Primary_Key")[STATIC_COLUMNS].first()
+
+
+def finalize_weekly_statistics(statistics: pd.DataFrame, attributes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn weekly sufficient statistics into weekly means resampled to the predefined weeks.
+
+    Args:
+        statistics (pd.DataFrame): Output of `weekly_sufficient_statistics`.
+        attributes (pd.DataFrame): Output of `static_attributes`.
+
+    Returns:
+        pd.DataFrame: Same layout as `resample_and_average_weekly`.
+    """
+    weekly_means = statistics[MIN_COLUMNS].copy()
+    for name in NDVI_CLASSES:
+        weight = statistics[f"{name}_Weight"]
+        weekly_means[f"Mean_{name}_Pixels"] = (statistics[f"{name}_Weighted_Sum"] / weight).where(weight > 0)
+    robust_statistics = [statistic for statistic in ROBUST_STATISTICS
+                         if f"Green_{statistic}_Weighted_Sum" in statistics.columns]
+    robust_columns = [f"{statistic}_{name}_Pixels" for statistic in robust_statistics for name in NDVI_CLASSES]
+    for statistic in robust_statistics:
+        for name in NDVI_CLASSES:
+            weight = statistics[f"{name}_Weight"]
+            weekly_means[f"{statistic}_{name}_Pixels"] = (
+                statistics[f"{name}_{statistic}_Weighted_Sum"] / weight).where(weight > 0)
+    for column in MEAN_COLUMNS:
+        weekly_means[column] = (statistics[f"{column}_Sum"] / statistics[f"{column}_Count"]).where(
+            statistics[f"{column}_Count"] > 0)
+
+    weekly_means = weekly_means.reset_index().join(attributes, on="Primary_Key")[WEEKLY_COLUMNS + robust_columns]
+    weekly_means["Year_Week"] = week_start_dates(weekly_means["Year"], weekly_means["Week"])
+
+    return resample_to_predefined_weeks(weekly_means)
 
 
 def resample_and_average_weekly(dataset):
-    # Group by Primary_Key, Year, and Week, then apply weighted averaging
-    weekly_means = dataset.groupby(["Primary_Key", "Year", "Week"]).agg({
-        # Non-aggregated features
-        "KPIN": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Block_Name": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Orchard_Name": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Country_Name": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Supply_Area_Name": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Month": lambda x: x.min() if not x.empty else np.nan,
-        "Day": lambda x: x.min() if not x.empty else np.nan,
-        "Acquisition_Date": lambda x: x.min() if not x.empty else np.nan,
-        "Total_Hectares": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        "Variety_Name": lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan,
-        # Aggregated features with weighted mean calculations
-        "Mean_Green_Pixels": lambda x: (
-            (x * dataset.loc[x.index, "Green_NDVI_Pixels_Number"]).sum() /
-            dataset.loc[x.index, "Green_NDVI_Pixels_Number"].sum()
-            if dataset.loc[x.index, "Green_NDVI_Pixels_Number"].sum() > 0 else np.nan
-        ),
-        "Mean_Yellow_Pixels": lambda x: (
-            (x * dataset.loc[x.index, "Yellow_NDVI_Pixels_Number"]).sum() /
-            dataset.loc[x.index, "Yellow_NDVI_Pixels_Number"].sum()
-            if dataset.loc[x.index, "Yellow_NDVI_Pixels_Number"].sum() > 0 else np.nan
-        ),
-        "Mean_Red_Pixels": lambda x: (
-            (x * dataset.loc[x.index, "Red_NDVI_Pixels_Number"]).sum() /
-            dataset.loc[x.index, "Red_NDVI_Pixels_Number"].sum()
-            if dataset.loc[x.index, "Red_NDVI_Pixels_Number"].sum() > 0 else np.nan
-        ),
-        "Green_NDVI_Pixels_Number": 'mean',
-        "Yellow_NDVI_Pixels_Number": 'mean',
-        "Red_NDVI_Pixels_Number": 'mean',
-        "Cloud_Or_Shadow_Percentage": 'mean',
-        "Cloud_Or_Shadow_Return_Code": 'mean',
-
-    }).reset_index()
-
-    weekly_means["Year_Week"] = pd.to_datetime(
-        weekly_means["Year"].astype(str) + "-" + weekly_means["Week"].astype(str) + "-1", format="%Y-%W-%w")
-    weekly_means = weekly_means.sort_values(by="Year_Week")
-
-    weekly_means = resample_to_predefined_weeks(weekly_means)
-    #print(resample_to_predefined_weeks(weekly_means))
-    #st.dataframe(resample_to_predefined_weeks(weekly_means))
-
-    return weekly_means
+    """
+    Average the acquisitions of each Primary_Key by week and resample them to the predefined weeks.
 
+    NDVI means (and robust statistics, if computed) are weighted by the pixel counts of their class, pixel
+    counts and cloud features are plain means, static features come from a per-Primary_Key lookup table.
 
-def resample_to_predefined_weeks(dataset):
-    # Define the predefined range of weeks (April to October)
-    predefined_start_week = 14  # First week of April
-    predefined_end_week = 44   # Last week of October
-
-    # Create a complete range of weeks for each Primary_Key and Year
-    complete_weeks = []
-    for (primary_key, year), group in dataset.groupby(["Primary_Key", "Year"]):
-        start_date = pd.to_datetime(f"{year}-{predefined_start_week}-1", format="%Y-%W-%w")
-        end_date = pd.to_datetime(f"{year}-{predefined_end_week}-1", format="%Y-%W-%w")
-        # Create weekly date range
-        all_weeks = pd.date_range(start=start_date, end=end_date, freq="W-MON")
-        # Append the DataFrame
-        complete_weeks.append(pd.DataFrame({"Primary_Key": primary_key, "Year_Week": all_weeks}))
-
-    # Concatenate all complete weeks
-    complete_weeks_df = pd.concat(complete_weeks, ignore_index=True)
+    Args:
+        dataset (pd.DataFrame): Dataset with pixel counts and mean NDVI values per acquisition.
 
+    Returns:
+        pd.DataFrame: One row per Primary_Key, season and predefined week.
     """
-    
-    #complete_weeks_df["Week"] = complete_weeks_df["Year_Week"].dt.isocalendar().week
-    #st.dataframe(complete_weeks_df)
-    #st.dataframe(dataset)
+    return finalize_weekly_statistics(weekly_sufficient_statistics(dataset), static_attributes(dataset))
+
+
+def week_start_dates(years, weeks) -> np.ndarray:
+    """
+    Monday of the given week of each year, as `pd.to_datetime(f"{year}-{week}-1", format="%Y-%W-%w")`.
+
+    Args:
+        years (array-like): Years.
+        weeks (array-like): Week numbers (Monday as the first day of the week).
+
+    Returns:
+        np.ndarray: datetime64 array of the same length.
     """
+    # Only the distinct (year, week) pairs are parsed
+    codes = np.asarray(years, dtype=np.int64) * 100 + np.asarray(weeks, dtype=np.int64)
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    unique_dates = pd.to_datetime(pd.Series(unique_codes // 100).astype(str) + "-" +
+                                  pd.Series(unique_codes % 100).astype(str) + "-1", format="%Y-%W-%w")
+
+    return unique_dates.to_numpy()[inverse.reshape(-1)]
 
-    # Merge the complete weeks with the original dataset
-    resampled_dataset = pd.merge(complete_weeks_df, dataset, on=["Primary_Key", "Year_Week"], how="left")
+
+def resample_to_predefined_weeks(dataset):
+    # Complete range of weeks for each Primary_Key and Year, built as a single MultiIndex
+    groups = dataset[["Primary_Key", "Year"]].drop_duplicates().sort_values(["Primary_Key", "Year"])
+    n_weeks = PREDEFINED_END_WEEK - PREDEFINED_START_WEEK + 1
+    start_dates = week_start_dates(groups["Year"], np.full(len(groups), PREDEFINED_START_WEEK))
+    all_weeks = (start_dates[:, None] + np.arange(n_weeks) * np.timedelta64(7, "D")).ravel()
+    complete_weeks = pd.MultiIndex.from_arrays([np.repeat(groups["Primary_Key"].to_numpy(), n_weeks), all_weeks],
+                                               names=["Primary_Key", "Year_Week"])
+
+    # Align the dataset on the complete weeks (weeks without data are filled with NaN)
+    resampled_dataset = dataset.set_index(["Primary_Key", "Year_Week"]).reindex(complete_weeks).reset_index()
 
     # Extract Year and Week from the resampled Year_Week
     resampled_dataset["Year"] = resampled_dataset["Year_Week"].dt.year
     resampled_dataset["Week"] = resampled_dataset["Year_Week"].dt.isocalendar().week
-    resampled_dataset["KPIN"] = resampled_dataset["Primary_Key"].str.split("_").str[0].astype(int)
-    resampled_dataset["Block_Name"] = resampled_dataset["Primary_Key"].str.split("_").str[1]
+
+    # KPIN and Block_Name from the Primary_Key, parsed once per distinct key
+    key_codes, keys = pd.factorize(resampled_dataset["Primary_Key"])
+    key_parts = pd.Series(keys).str.split("_")
+    resampled_dataset["KPIN"] = key_parts.str[0].astype(int).take(key_codes).set_axis(resampled_dataset.index)
+    resampled_dataset["Block_Name"] = key_parts.str[1].take(key_codes).set_axis(resampled_dataset.index)
 
     return resampled_dataset
 
@@ -122,4 +221,4 @@ Year_Week                    datetime64[ns]
 dtype: object
 
 Process finished with exit code 0
-"""
\ No newline at end of file
+"""
@@ -0,0 +1,322 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+from Utils.load_dataset import load_dataset
+from Utils.ndvi_store import flatten_ragged
+from Utils.threshold_statistics import class_statistics_frame, ROBUST_STATISTICS
+
+# Default number of bins over [-1, 1]: bins are 0.01 wide, so every threshold of the sidebar (step 0.01) falls on
+# a bin edge. Can be overridden with the ZESPRI_HISTOGRAM_BINS variable (see Utils/pipeline_cache.py)
+DEFAULT_HISTOGRAM_BINS = 200
+
+
+@dataclass
+class NDVIHistogram:
+    """
+    Fixed-bin histograms of the valid NDVI pixels of every acquisition, a low-memory alternative to the raw
+    pixels (and to the `ThresholdIndex` sorted over them).
+
+    The bins split [-1, 1] into `n_bins` equal widths and are closed on the right: bin `b` holds the values in
+    (edges[b], edges[b + 1]] (the first bin also holds -1, values outside [-1, 1] go to the first or last bin).
+    Only the bins holding pixels of some acquisition are stored, from `first_bin` on: column `j` of the arrays
+    is bin `first_bin + j`. Row `i` holds the pixel counts `counts[i]` of acquisition `i` in each bin, and the
+    sums `offset_sums[i]` and sums of squares `offset_squares[i]` of the offsets of its pixels from the left
+    edge of their bin. The offsets are at most a bin width, so they are stored in float32 with about the
+    precision of float64 sums of the pixels; `sums` and `sums_squares` give the sums of the pixels.
+
+    An acquisition takes 12 bytes per stored bin whatever its number of pixels, against 24 bytes per pixel for
+    the float32 raw pixels and the threshold index over them (4 for the raw pixels alone). On
+    Satellite_NDVI_data_construction_2.csv (404 acquisitions, 89272 pixels, 2.14 MB of pixels and index) the
+    200-bin histograms store 94 bins (NDVI 0 to 0.94), 0.46 MB, where the 200 bins with float64 sums took
+    1.62 MB. Histograms are additive: the histogram of a set of acquisitions (a week, an area) is the sum of
+    their rows, see `aggregate_histograms`.
+    """
+    edges: np.ndarray
+    first_bin: int
+    counts: np.ndarray
+    offset_sums: np.ndarray
+    offset_squares: np.ndarray
+
+    @property
+    def n_bins(self) -> int:
+        return self.edges.size - 1
+
+    @property
+    def bin_width(self) -> float:
+        return 2.0 / self.n_bins
+
+    @property
+    def n_columns(self) -> int:
+        return self.counts.shape[1]
+
+    @property
+    def column_edges(self) -> np.ndarray:
+        # Edges of the stored bins, column `j` spanning (column_edges[j], column_edges[j + 1]]
+        return self.edges[self.first_bin:self.first_bin + self.n_columns + 1]
+
+    def columns(self, positions):
+        """
+        Columns of the arrays at bin edge positions (0 to n_bins, e.g. from `snap_to_edge`): the bins before a
+        position are the columns before the returned one.
+        """
+        return np.clip(np.asarray(positions) - self.first_bin, 0, self.n_columns)
+
+    def sums(self) -> np.ndarray:
+        """
+        Sums of the pixels of each row in each stored bin (float64).
+        """
+        return self.offset_sums + self.counts * self.column_edges[:-1]
+
+    def sums_squares(self) -> np.ndarray:
+        """
+        Sums of the squared pixels of each row in each stored bin (float64).
+        """
+        left = self.column_edges[:-1]
+        return self.offset_squares + 2.0 * left * self.offset_sums + self.counts * left * left
+
+
+def histogram_edges(n_bins: int) -> np.ndarray:
+    """
+    Edges of `n_bins` equal bins over [-1, 1], computed as (2 * i - n_bins) / n_bins so that an edge equal to a
+    decimal threshold (0.55 with 200 bins) is the same float64 as the threshold.
+    """
+    if int(n_bins) != n_bins or n_bins < 1:
+        raise ValueError(f"The number of histogram bins must be a positive integer, got {n_bins}.")
+    n_bins = int(n_bins)
+    return np.arange(-n_bins, n_bins + 1, 2, dtype=np.float64) / n_bins
+
+
+def build_histogram(values: np.ndarray, offsets: np.ndarray, n_bins: int = DEFAULT_HISTOGRAM_BINS) -> NDVIHistogram:
+    """
+    Reduce the valid pixels of every acquisition to a fixed-bin histogram with per-bin sums.
+
+    Args:
+        values (np.ndarray): Flat buffer with the valid NDVI pixels of all acquisitions.
+        offsets (np.ndarray): Row offsets, acquisition `i` owns `values[offsets[i]:offsets[i + 1]]`.
+        n_bins (int): Number of bins over [-1, 1].
+
+    Returns:
+        NDVIHistogram: One histogram row per acquisition, over the bins holding pixels.
+    """
+    edges = histogram_edges(n_bins)
+    n_bins = edges.size - 1
+    # Binned in float64, the precision the thresholds are compared in
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_rows = offsets.size - 1
+
+    # searchsorted(side="left") - 1 is the bin `b` with edges[b] < value <= edges[b + 1]
+    bins = np.clip(np.searchsorted(edges, values, side="left") - 1, 0, n_bins - 1)
+    first_bin = int(bins.min()) if bins.size else 0
+    n_columns = int(bins.max()) + 1 - first_bin if bins.size else 0
+    cells = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(offsets)) * n_columns + bins - first_bin
+    deltas = values - edges[bins]
+
+    size = n_rows * n_columns
+    counts = np.bincount(cells, minlength=size).astype(np.int32)
+    offset_sums = np.bincount(cells, weights=deltas, minlength=size).astype(np.float32)
+    offset_squares = np.bincount(cells, weights=deltas * deltas, minlength=size).astype(np.float32)
+    return NDVIHistogram(edges, first_bin, *(x.reshape(n_rows, n_columns)
+                                             for x in (counts, offset_sums, offset_squares)))
+
+
+def build_histogram_from_dataset(dataset: pd.DataFrame, n_bins: int = DEFAULT_HISTOGRAM_BINS) -> NDVIHistogram:
+    """
+    Build the histograms of the "Valid_NDVI_Data" column of a loaded dataset, one row per dataset row.
+    """
+    return build_histogram(*flatten_ragged(dataset["Valid_NDVI_Data"], dtype=np.float64), n_bins=n_bins)
+
+
+def concatenate_histograms(first: NDVIHistogram, second: NDVIHistogram) -> NDVIHistogram:
+    """
+    Histograms of the acquisitions of `first` followed by those of `second` (both with the same bins).
+    """
+    if not np.array_equal(first.edges, second.edges):
+        raise ValueError(f"Cannot concatenate histograms of {first.n_bins} and {second.n_bins} bins.")
+    # Both are widened to the bins stored by either one
+    histograms = [histogram for histogram in (first, second) if histogram.n_columns] or [first]
+    first_bin = min(histogram.first_bin for histogram in histograms)
+    end_bin = max(histogram.first_bin + histogram.n_columns for histogram in histograms)
+
+    def widened(histogram, name):
+        x = getattr(histogram, name)
+        start = histogram.first_bin - first_bin if histogram.n_columns else 0
+        return np.pad(x, [(0, 0), (start, end_bin - first_bin - start - x.shape[1])])
+
+    return NDVIHistogram(first.edges, first_bin, *(np.concatenate([widened(first, name), widened(second, name)])
+                                                   for name in ("counts", "offset_sums", "offset_squares")))
+
+
+def aggregate_histograms(histogram: NDVIHistogram, groups: pd.DataFrame):
+    """
+    Sum the histograms of the acquisitions of each group, e.g. of each (Primary_Key, Year, Week) or each area.
+
+    The histogram of a group equals the histogram built on the pixels of all its acquisitions at once, so
+    `query_histogram` on it gives the pooled (count-weighted) class statistics of the group.
+
+    Args:
+        histogram (NDVIHistogram): Histograms of the acquisitions.
+        groups (pd.DataFrame): Group columns, one row per histogram row.
+
+    Returns:
+        tuple: (pd.MultiIndex of the sorted groups, NDVIHistogram with one row per group).
+    """
+    codes, keys = pd.MultiIndex.from_frame(groups).factorize(sort=True)
+
+    def group_sums(x):
+        # The offset sums are accumulated in float64
+        totals = np.zeros((len(keys), x.shape[1]), dtype=np.float64 if x.dtype.kind == "f" else x.dtype)
+        np.add.at(totals, codes, x)
+        return totals
+
+    return keys, NDVIHistogram(histogram.edges, histogram.first_bin,
+                               *(group_sums(x) for x in (histogram.counts, histogram.offset_sums,
+                                                         histogram.offset_squares)))
+
+
+def snap_to_edge(histogram: NDVIHistogram, threshold):
+    """
+    Position of the bin edge nearest to a threshold (0 to n_bins), the threshold `query_histogram` applies.
+    An array of thresholds gives an array of positions.
+    """
+    positions = np.clip(np.rint((np.asarray(threshold, dtype=np.float64) + 1.0) / histogram.bin_width), 0,
+                        histogram.n_bins).astype(np.int64)
+    return positions if positions.ndim else int(positions)
+
+
+def histogram_percentiles(histogram: NDVIHistogram, start: int, end: int, percentiles) -> np.ndarray:
+    """
+    Percentiles of the pixels of the stored bins (columns) [start, end) of every histogram row, assuming the
+    pixels of a bin spread uniformly over it.
+
+    As `np.percentile`, the percentile `q` of n pixels interpolates between the pixels of ranks k and k + 1
+    around (n - 1) * q. The pixel of rank k is estimated at the middle of its share of its bin (cumulative
+    count k + 1/2), which is always within the bin holding that pixel: estimates are within one bin width of
+    the exact percentiles.
+
+    Returns:
+        np.ndarray: (rows, percentiles) float64 array, NaN for rows without pixels in the bins.
+    """
+    n_rows = histogram.counts.shape[0]
+    cumulative = np.concatenate([np.zeros((n_rows, 1), dtype=np.int64),
+                                 np.cumsum(histogram.counts, axis=1, dtype=np.int64)], axis=1)
+    below, total = cumulative[:, start][:, None], (cumulative[:, end] - cumulative[:, start])[:, None]
+    positions = np.maximum(total - 1, 0) * (np.asarray(percentiles, dtype=np.float64) / 100.0)
+    ranks = np.floor(positions)
+
+    # Shifting every row above the previous one makes one searchsorted find the bin of every rank
+    row_ids = np.arange(n_rows, dtype=np.int64)[:, None]
+    stride = int(cumulative[:, -1].max()) + 1 if n_rows else 1
+    shifted = (cumulative + row_ids * stride).ravel()
+
+    def pixel_value(rank):
+        # Estimated value of the pixel of a rank within the bins
+        middle = below + rank + 0.5
+        found = np.searchsorted(shifted, middle + row_ids * stride, side="left")
+        if not histogram.n_columns:
+            return np.full(middle.shape, np.nan)
+        # Empty ranges (an upper threshold of 1) still index a stored bin, their percentiles are NaN
+        bins = np.clip(found - row_ids * (histogram.n_columns + 1) - 1, min(start, histogram.n_columns - 1),
+                       min(max(end - 1, start), histogram.n_columns - 1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = (middle - cumulative[row_ids, bins]) / histogram.counts[row_ids, bins]
+        return histogram.column_edges[bins] + np.clip(np.nan_to_num(fraction), 0.0, 1.0) * histogram.bin_width
+
+    low, high = pixel_value(ranks), pixel_value(np.minimum(ranks + 1, np.maximum(total - 1, 0)))
+    return np.where(total > 0, low + (positions - ranks) * (high - low), np.nan)
+
+
+def query_histogram(histogram: NDVIHistogram, lower_ndvi_threshold: float, upper_ndvi_threshold: float) -> pd.DataFrame:
+    """
+    Compute Green, Yellow and Red pixel counts, means, population standard deviations and robust statistics
+    for a threshold pair from the histograms, with the semantics of `threshold_ndvi_data` (Green if
+    value > upper, Yellow if lower < value <= upper, Red if value <= lower).
+
+    Error bounds: each threshold is moved to the nearest bin edge, and the results are the ones of the raw
+    pixels for these snapped thresholds, up to the rounding of the float32 offset sums (about 1e-9 on the
+    means; standard deviations are taken from the sums of squares, up to about 1e-5 off for classes with no
+    spread).
+    - A threshold on a bin edge (any multiple of 0.01 with the default 200 bins) gives the exact results.
+    - Otherwise the snapped threshold is at most half a bin width away (0.005 with 200 bins), and only the
+      pixels between the two change class: the counts of the two classes on either side are off by at most
+      the pixels of the bin holding the threshold, and their means by at most half a bin width times the
+      fraction of moved pixels, plus the shift of those pixels from the class mean.
+    - Medians and percentiles are estimated within the bins of their pixels (see `histogram_percentiles`): at
+      most one bin width off, two for the interquartile range.
+
+    Args:
+        histogram (NDVIHistogram): Histograms built by `build_histogram` (or summed by `aggregate_histograms`).
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+
+    Returns:
+        pd.DataFrame: One row per histogram row, same columns as `compute_class_statistics`.
+    """
+    if upper_ndvi_threshold < lower_ndvi_threshold:
+        raise ValueError("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+
+    # Class boundaries in the stored bins: Red [0, lower), Yellow [lower, upper), Green [upper, n_columns)
+    boundaries = [0, int(histogram.columns(snap_to_edge(histogram, lower_ndvi_threshold))),
+                  int(histogram.columns(snap_to_edge(histogram, upper_ndvi_threshold))), histogram.n_columns]
+
+    def class_sums(x):
+        return np.stack([x[:, start:end].sum(axis=1) for start, end in zip(boundaries[:-1], boundaries[1:])], axis=1)
+
+    counts = class_sums(histogram.counts).astype(np.int64)
+    sums, sums_squares = class_sums(histogram.sums()), class_sums(histogram.sums_squares())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+        variances = np.maximum(sums_squares / counts - means * means, 0.0)
+        stds = np.where(counts > 0, np.sqrt(variances), np.nan)
+
+    median, p10, p90, p25, p75 = np.moveaxis(np.stack(
+        [histogram_percentiles(histogram, start, end, [50.0, 10.0, 90.0, 25.0, 75.0])
+         for start, end in zip(boundaries[:-1], boundaries[1:])], axis=1), -1, 0)
+    robust = dict(zip(ROBUST_STATISTICS, (median, p10, p90, p75 - p25)))
+
+    # The column order of the boundaries (Red, Yellow, Green) matches NDVI_CLASS_INDEX
+    return class_statistics_frame(counts, means, stds, robust)
+
+
+def threshold_statistics_from_histogram(dataset: pd.DataFrame, histogram: NDVIHistogram, lower_ndvi_threshold: float,
+                                        upper_ndvi_threshold: float) -> pd.DataFrame:
+    """
+    Same output as `threshold_statistics_from_index`, answered from the histograms of the dataset rows (the
+    pixel columns are not used and may have been dropped).
+
+    Args:
+        dataset (pd.DataFrame): Dataset the histograms were built from (same rows, same order).
+        histogram (NDVIHistogram): Histograms built by `build_histogram_from_dataset(dataset)`.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+
+    Returns:
+        pd.DataFrame: Copy of the dataset with pixel counts, means, standard deviations and robust statistics
+        per NDVI category.
+    """
+    statistics = query_histogram(histogram, lower_ndvi_threshold, upper_ndvi_threshold)
+    statistics.index = dataset.index
+
+    return dataset.assign(**statistics)
+
+
+if __name__ == "__main__":
+    # Example usage: footprint and errors against the raw pixels on and off the bin edges, then weekly histograms
+    from Utils.threshold_statistics import compute_class_statistics
+    dataset = load_dataset("../Satellite_NDVI_data_construction_2.csv")
+    histogram = build_histogram_from_dataset(dataset)
+    values, offsets = flatten_ragged(dataset["Valid_NDVI_Data"], dtype=np.float64)
+    histogram_bytes = histogram.counts.nbytes + histogram.offset_sums.nbytes + histogram.offset_squares.nbytes
+    print(f"{values.size * 24} bytes of float32 pixels and threshold index, {histogram_bytes} bytes of "
+          f"{histogram.n_bins}-bin histograms ({histogram.n_columns} bins stored)")
+
+    for lower, upper in [(0.3, 0.55), (0.305, 0.552)]:
+        approximate = query_histogram(histogram, lower, upper)
+        exact = compute_class_statistics(values, offsets, lower, upper)
+        errors = (approximate - exact).abs().max()
+        print(lower, upper, "largest errors:", errors[errors > 0].to_dict())
+
+    keys, weekly = aggregate_histograms(histogram, dataset[["Primary_Key", "Year", "Week"]])
+    print(len(keys), "weekly histograms")
+    print(query_histogram(weekly, 0.3, 0.55).set_index(keys).head())
@@ -0,0 +1,177 @@
+import os
+import json
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+from Utils.load_dataset import load_dataset, PIXEL_COLUMNS
+from Utils.lazy_columns import StoreColumnSource, lazy_column
+from Utils.quality_filter import quality_mask
+
+# File names of the on-disk NDVI store
+METADATA_FILE = "metadata.parquet"
+VALID_PIXELS_FILE = "valid_pixels.npy"
+VALID_OFFSETS_FILE = "valid_offsets.npy"
+MATRIX_VALUES_FILE = "ndvi_matrix_values.npy"
+MATRIX_OFFSETS_FILE = "ndvi_matrix_offsets.npy"
+MATRIX_SHAPES_FILE = "ndvi_matrix_shapes.npy"
+MANIFEST_FILE = "manifest.json"
+
+STORE_FORMAT_VERSION = 1
+
+
+@dataclass
+class NDVIStore:
+    """
+    Memory-mapped view of an NDVI store written by `convert_csv_to_store`.
+
+    Row `i` of `metadata` owns the valid pixels `valid_pixels[valid_offsets[i]:valid_offsets[i + 1]]`
+    and the flattened NDVI matrix `matrix_values[matrix_offsets[i]:matrix_offsets[i + 1]]`,
+    of shape `matrix_shapes[i]`.
+    """
+    metadata: pd.DataFrame
+    columns: list
+    valid_pixels: np.ndarray
+    valid_offsets: np.ndarray
+    matrix_values: np.ndarray
+    matrix_offsets: np.ndarray
+    matrix_shapes: np.ndarray
+
+    def valid_ndvi_row(self, row: int) -> np.ndarray:
+        return self.valid_pixels[self.valid_offsets[row]:self.valid_offsets[row + 1]]
+
+    def ndvi_matrix_row(self, row: int) -> np.ndarray:
+        values = self.matrix_values[self.matrix_offsets[row]:self.matrix_offsets[row + 1]]
+        return values.reshape(self.matrix_shapes[row])
+
+
+def flatten_ragged(arrays, dtype=np.float32):
+    """
+    Concatenate a sequence of 1-D arrays into one flat buffer plus row offsets.
+
+    Args:
+        arrays (iterable): Sequence of array-likes.
+        dtype (np.dtype): Dtype of the flat buffer.
+
+    Returns:
+        tuple: (values, offsets) where row `i` is `values[offsets[i]:offsets[i + 1]]`.
+    """
+    arrays = [np.asarray(x, dtype=dtype).ravel() for x in arrays]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([x.size for x in arrays], out=offsets[1:])
+    values = np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+    return values, offsets
+
+
+def is_ndvi_store(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def convert_csv_to_store(file_path: str, store_dir: str) -> str:
+    """
+    One-time conversion of an NDVI CSV export into the binary ragged-array store.
+
+    Valid pixels and NDVI matrices are written as flat float32 buffers with int64 offsets
+    (matrices also keep their 2-D shape), the scalar columns are written to a Parquet file.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        store_dir (str): Output directory of the store.
+
+    Returns:
+        str: Path to the store directory.
+    """
+    dataset = load_dataset(file_path)
+    os.makedirs(store_dir, exist_ok=True)
+
+    # Valid pixels: one flat buffer, one offset per acquisition
+    valid_pixels, valid_offsets = flatten_ragged(dataset["Valid_NDVI_Data"])
+
+    # NDVI matrices: flattened the same way, "null" pixels are stored as NaN
+    matrix_shapes = np.array([np.shape(x) for x in dataset["NDVI_Data"]], dtype=np.int64).reshape(-1, 2)
+    matrix_values, matrix_offsets = flatten_ragged(dataset["NDVI_Data"])
+
+    np.save(os.path.join(store_dir, VALID_PIXELS_FILE), valid_pixels)
+    np.save(os.path.join(store_dir, VALID_OFFSETS_FILE), valid_offsets)
+    np.save(os.path.join(store_dir, MATRIX_VALUES_FILE), matrix_values)
+    np.save(os.path.join(store_dir, MATRIX_OFFSETS_FILE), matrix_offsets)
+    np.save(os.path.join(store_dir, MATRIX_SHAPES_FILE), matrix_shapes)
+    dataset.drop(columns=PIXEL_COLUMNS).to_parquet(os.path.join(store_dir, METADATA_FILE), index=False)
+
+    # The manifest is written last so that a partially written store is never picked up
+    with open(os.path.join(store_dir, MANIFEST_FILE), "w") as f:
+        json.dump({"version": STORE_FORMAT_VERSION, "source": os.path.abspath(file_path),
+                   "columns": dataset.columns.tolist(), "rows": len(dataset),
+                   "valid_pixels": int(valid_pixels.size)}, f)
+
+    return store_dir
+
+
+def load_ndvi_store(store_dir: str) -> NDVIStore:
+    """
+    Open an NDVI store, memory-mapping the pixel buffers.
+
+    Args:
+        store_dir (str): Directory written by `convert_csv_to_store`.
+
+    Returns:
+        NDVIStore: Store with the tabular metadata and the memory-mapped pixel buffers.
+    """
+    with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest["version"] != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported NDVI store version {manifest['version']} in {store_dir}")
+
+    def open_array(file_name):
+        return np.load(os.path.join(store_dir, file_name), mmap_mode="r")
+
+    return NDVIStore(
+        metadata=pd.read_parquet(os.path.join(store_dir, METADATA_FILE)),
+        columns=manifest["columns"],
+        valid_pixels=open_array(VALID_PIXELS_FILE),
+        valid_offsets=open_array(VALID_OFFSETS_FILE),
+        matrix_values=open_array(MATRIX_VALUES_FILE),
+        matrix_offsets=open_array(MATRIX_OFFSETS_FILE),
+        matrix_shapes=open_array(MATRIX_SHAPES_FILE),
+    )
+
+
+def store_to_dataframe(store: NDVIStore, columns=None, lazy_columns=(), quality_filter=None) -> pd.DataFrame:
+    """
+    Build the same DataFrame layout returned by `load_dataset`, with pixel columns holding
+    read-only views into the memory-mapped buffers instead of parsed copies.
+
+    Args:
+        store (NDVIStore): Opened NDVI store.
+        columns (list): Columns to include (all columns if None).
+        lazy_columns (list): Pixel columns holding `LazyNDVIArray` handles instead of views.
+        quality_filter (QualityFilter): Acquisitions to keep (all if None), selected on the metadata before
+            any pixel buffer is touched.
+
+    Returns:
+        pd.DataFrame: Dataset with the requested columns.
+    """
+    columns = store.columns if columns is None else [column for column in store.columns if column in columns]
+    dataset = store.metadata[[column for column in columns if column not in PIXEL_COLUMNS]].copy()
+    rows = range(len(dataset))
+    if quality_filter is not None and not quality_filter.keeps_everything:
+        rows = np.flatnonzero(quality_mask(store.metadata, quality_filter))
+        dataset = dataset.iloc[rows].reset_index(drop=True)
+    for column, load_row in (("NDVI_Data", store.ndvi_matrix_row), ("Valid_NDVI_Data", store.valid_ndvi_row)):
+        if column in lazy_columns:
+            dataset[column] = lazy_column(StoreColumnSource(store, column), rows, dataset.index)
+        elif column in columns:
+            dataset[column] = pd.Series([load_row(i) for i in rows], index=dataset.index, dtype=object)
+
+    # Restore the column order of the CSV export
+    return dataset[columns]
+
+
+if __name__ == "__main__":
+    # Example usage:
+    convert_csv_to_store("../Satellite_NDVI_data_construction_2.csv", "../Satellite_NDVI_data_construction_2.ndvi")
+    dataset = load_dataset("../Satellite_NDVI_data_construction_2.ndvi")
+    print(dataset.head())
+    print(dataset.dtypes)
+    print(type(dataset.loc[0, "Valid_NDVI_Data"]), dataset.loc[0, "NDVI_Data"].shape)
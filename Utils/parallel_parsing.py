@@ -0,0 +1,159 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import pandas as pd
+import numpy as np
+
+# Number of row shards given to each worker (more shards than workers balances uneven row sizes)
+SHARDS_PER_WORKER = 4
+
+
+def _literal_shape(text: str, matrix: bool) -> tuple:
+    """
+    Shape of a "[...]" list or "[[...],[...]]" matrix literal, counted from its separators without parsing it.
+    """
+    if text.strip() in ("[]", "[[]]"):
+        return (0, 0) if matrix else (0,)
+    if matrix:
+        # "[[a,b],[c,d]]": one closing bracket per row plus the outer one, one comma between any two values
+        n_rows = text.count("]") - 1
+        return n_rows, (text.count(",") + 1) // n_rows
+    return (text.count(",") + 1,)
+
+
+def parse_ndvi_list(text: str) -> np.ndarray:
+    """
+    Parse a "[0.83, 0.72, ...]" literal into a float64 array ("null" values become NaN).
+    """
+    return np.fromstring(text.strip()[1:-1].replace("null", "nan"), sep=",")
+
+
+def parse_ndvi_matrix(text: str) -> np.ndarray:
+    """
+    Parse a "[[null, 0.83, ...], ...]" literal into a 2-D float64 array ("null" values become NaN).
+    """
+    values = np.fromstring(text.replace("[", "").replace("]", "").replace("null", "nan"), sep=",")
+    return values.reshape(_literal_shape(text, matrix=True))
+
+
+def _parse_into(buffer: np.ndarray, texts, offsets: np.ndarray, matrix: bool):
+    # Parse each literal straight into its slice of the flat buffer
+    for text, start, end in zip(texts, offsets[:-1], offsets[1:]):
+        try:
+            values = parse_ndvi_matrix(text).ravel() if matrix else parse_ndvi_list(text)
+        except ValueError as error:
+            raise ValueError(f"Malformed NDVI literal: {error}") from None
+        if values.size != end - start:
+            raise ValueError(f"Malformed NDVI literal: expected {end - start} values, parsed {values.size}")
+        buffer[start:end] = values
+
+
+def _parse_shard(shared_memory_name: str, total_size: int, texts, offsets: np.ndarray, matrix: bool):
+    # Worker side: attach to the parent's shared buffer and fill the rows of this shard
+    shared_memory = SharedMemory(name=shared_memory_name)
+    try:
+        buffer = np.ndarray((total_size,), dtype=np.float64, buffer=shared_memory.buf)
+        _parse_into(buffer, texts, offsets, matrix)
+        del buffer
+    finally:
+        shared_memory.close()
+
+
+def parse_ndvi_column(texts, matrix: bool = False, workers: int = 1) -> list:
+    """
+    Parse a column of NDVI list (or matrix) literals without `eval`, optionally on a process pool.
+
+    The parent sizes every row from its text, allocates one flat float64 buffer in shared memory, and
+    the workers parse their shard of rows directly into it, so no per-row arrays are pickled back.
+
+    Args:
+        texts (iterable): Literals of the "Valid_NDVI_Data" (lists) or "NDVI_Data" (matrices) column.
+        matrix (bool): Whether the literals are 2-D matrices.
+        workers (int): Number of worker processes (1 parses in the calling process, None uses all cores).
+
+    Returns:
+        list: One float64 array per row (views into a single flat buffer), NaN for "null" values.
+    """
+    texts = list(texts)
+    workers = workers or os.cpu_count() or 1
+    shapes = [_literal_shape(text, matrix) for text in texts]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([np.prod(shape, dtype=np.int64) for shape in shapes], out=offsets[1:])
+    total_size = int(offsets[-1])
+
+    if workers == 1 or len(texts) < 2 * workers:
+        values = np.empty(total_size, dtype=np.float64)
+        _parse_into(values, texts, offsets, matrix)
+    else:
+        shared_memory = SharedMemory(create=True, size=max(total_size, 1) * np.dtype(np.float64).itemsize)
+        try:
+            # Contiguous shards of rows, each worker writes its own slice of the shared buffer
+            bounds = np.linspace(0, len(texts), workers * SHARDS_PER_WORKER + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_parse_shard, shared_memory.name, total_size, texts[start:end],
+                                           offsets[start:end + 1], matrix)
+                           for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+                for future in futures:
+                    future.result()
+            values = np.ndarray((total_size,), dtype=np.float64, buffer=shared_memory.buf).copy()
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+
+    # `np.split` of an empty buffer would still give one row
+    rows = np.split(values, offsets[1:-1]) if texts else []
+    return [row.reshape(shape) for row, shape in zip(rows, shapes)] if matrix else rows
+
+
+def write_scaled_csv(file_path: str, output_path: str, target_bytes: int) -> str:
+    """
+    Write a synthetic CSV of about `target_bytes` by repeating the rows of an existing dataset CSV.
+    """
+    with open(file_path) as f:
+        header, rows = f.readline(), f.read()
+    with open(output_path, "w") as f:
+        f.write(header)
+        written = len(header)
+        while written < target_bytes:
+            f.write(rows)
+            written += len(rows)
+    return output_path
+
+
+def measure_parallel_speedup(file_path: str, worker_counts) -> pd.DataFrame:
+    """
+    Time `parse_ndvi_column` on both pixel columns of a CSV file for several worker counts.
+
+    On a 1 GB scaled copy of Satellite_NDVI_data_construction_2.csv, on a single-core machine, 1, 2 and 4
+    workers took 26.4 s, 29.5 s and 26.7 s: the pool only pays off with spare cores, the gain of the eval-free
+    parser itself (about 6x on the sample) does not depend on them.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        worker_counts (list): Worker counts to measure.
+
+    Returns:
+        pd.DataFrame: Seconds and speedup (relative to the first worker count) per worker count.
+    """
+    dataset = pd.read_csv(file_path, usecols=["NDVI_Data", "Valid_NDVI_Data"])
+    results = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        parse_ndvi_column(dataset["NDVI_Data"], matrix=True, workers=workers)
+        parse_ndvi_column(dataset["Valid_NDVI_Data"], workers=workers)
+        results.append({"Workers": workers, "Seconds": time.perf_counter() - start})
+    results = pd.DataFrame(results)
+    results["Speedup"] = results["Seconds"].iloc[0] / results["Seconds"]
+    return results
+
+
+if __name__ == "__main__":
+    # Example usage: speedup curve on a synthetic file scaled to ~1 GB (size in MB as first argument)
+    import sys
+    target_megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    scaled_path = write_scaled_csv("../Satellite_NDVI_data_construction_2.csv",
+                                   "../Satellite_NDVI_data_construction_scaled.csv", target_megabytes << 20)
+    print(measure_parallel_speedup(scaled_path, [1, 2, 4, 8, 16][:max(1, (os.cpu_count() or 1).bit_length())]))
+    os.remove(scaled_path)
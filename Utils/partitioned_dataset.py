@@ -0,0 +1,332 @@
+import os
+import json
+import hashlib
+import threading
+from dataclasses import dataclass
+from urllib.parse import quote
+
+import pandas as pd
+
+# Partition levels of the on-disk layout, "<column>=<value>" directories in this order
+PARTITION_COLUMNS = ["Supply_Region_Name", "Supply_Area_Name", "Year"]
+# Rows of the merged exports are unique on these columns, later exports win
+DEDUPLICATION_KEYS = ["Primary_Key", "Acquisition_Date"]
+PARTITIONS_MANIFEST_FILE = "partitions.json"
+# Previous files of a partition recorded in its "appended_to" list, most recent first
+APPEND_HISTORY = 16
+
+PARTITIONED_FORMAT_VERSION = 2
+
+# Exports of the app dataset, in increasing order of precedence (later exports win on duplicates), and the
+# partitioned dataset they are merged into (paths relative to the app directory)
+SOURCE_EXPORTS = ["./Satellite_NDVI_data_construction.csv", "./Satellite_NDVI_data_construction_2.csv"]
+DATASET_PATH = "./Satellite_NDVI_dataset"
+
+_write_lock = threading.RLock()
+
+
+@dataclass(frozen=True)
+class PartitionSelection:
+    """
+    Partitions to read from a partitioned dataset: the regions, areas and seasons selected (all if None).
+
+    Instances are hashable and are part of the cache keys of the loaded and processed datasets.
+    """
+    regions: tuple = None
+    areas: tuple = None
+    seasons: tuple = None
+
+    def __post_init__(self):
+        # Normalized so that equal selections give equal cache keys
+        for name, convert in (("regions", str), ("areas", str), ("seasons", int)):
+            values = getattr(self, name)
+            if values is not None:
+                object.__setattr__(self, name, tuple(sorted({convert(value) for value in values})))
+
+    def matches(self, partition: dict) -> bool:
+        return all(values is None or partition[column] in values for column, values in
+                   zip(PARTITION_COLUMNS, (self.regions, self.areas, self.seasons)))
+
+
+def is_partitioned_dataset(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, PARTITIONS_MANIFEST_FILE))
+
+
+def read_partitions_manifest(dataset_dir: str) -> dict:
+    """
+    Manifest of a partitioned dataset: its columns, source exports and partitions (with their rows).
+    """
+    with open(os.path.join(dataset_dir, PARTITIONS_MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest["version"] != PARTITIONED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported partitioned dataset version {manifest['version']} in {dataset_dir}")
+    return manifest
+
+
+def partition_options(dataset_dir: str) -> dict:
+    """
+    Sorted regions, areas and seasons of a partitioned dataset, and the areas of each region, read from
+    its manifest only.
+    """
+    partitions = read_partitions_manifest(dataset_dir)["partitions"]
+    region_areas = {}
+    for partition in partitions:
+        region_areas.setdefault(partition["Supply_Region_Name"], set()).add(partition["Supply_Area_Name"])
+    return {"regions": sorted(region_areas),
+            "areas": sorted({partition["Supply_Area_Name"] for partition in partitions}),
+            "seasons": sorted({partition["Year"] for partition in partitions}),
+            "region_areas": {region: sorted(areas) for region, areas in region_areas.items()}}
+
+
+def _is_current_dataset(dataset_dir: str) -> bool:
+    # Datasets written by an older format version are rebuilt from their exports
+    if not is_partitioned_dataset(dataset_dir):
+        return False
+    with open(os.path.join(dataset_dir, PARTITIONS_MANIFEST_FILE)) as f:
+        return json.load(f)["version"] == PARTITIONED_FORMAT_VERSION
+
+
+def _source_signature(file_path: str) -> list:
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_export(file_path: str) -> pd.DataFrame:
+    # Cells are kept as text: partitions are written back exactly as exported, pixel literals are not parsed
+    return pd.read_csv(file_path, dtype=str, keep_default_na=False)
+
+
+def _partition_path(partition: dict) -> str:
+    return os.path.join(*(f"{column}={quote(str(partition[column]), safe='')}" for column in PARTITION_COLUMNS))
+
+
+def _partition_values(values: tuple) -> dict:
+    return {column: int(value) if column == "Year" else value for column, value in zip(PARTITION_COLUMNS, values)}
+
+
+def _partition_key(partition: dict) -> tuple:
+    return tuple(partition[column] for column in PARTITION_COLUMNS)
+
+
+def _check_partition_values(export: pd.DataFrame, source_path: str):
+    # Every row needs a region, an area and an integer year to be placed in a partition
+    for column in PARTITION_COLUMNS:
+        values = export[column].str.strip()
+        invalid = (values == "") | (~values.str.fullmatch(r"-?\d+") if column == "Year" else False)
+        if invalid.any():
+            raise ValueError(f"{int(invalid.sum())} rows of {source_path} have an empty or invalid {column} "
+                             f"(first at row {int(invalid.to_numpy().argmax())}), they cannot be partitioned")
+
+
+def _export_partitions(export: pd.DataFrame) -> set:
+    # Keys of the partitions an export holds rows of
+    return {tuple(_partition_values(values).values())
+            for values in export[PARTITION_COLUMNS].drop_duplicates().itertuples(index=False)}
+
+
+def _appended_rows(previous: pd.DataFrame, rows: pd.DataFrame):
+    # Rows not in `previous` if `rows` keeps every previous row unchanged, else None
+    previous_hashes = pd.util.hash_pandas_object(previous, index=False)
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    if not previous_hashes.isin(hashes).all():
+        return None
+    return rows[~hashes.isin(previous_hashes).to_numpy()]
+
+
+def merge_exports(dataset_dir: str, source_paths, changed_paths=None) -> dict:
+    """
+    Build or update a partitioned dataset from CSV exports.
+
+    Rows are split by Supply_Region_Name / Supply_Area_Name / Year into
+    "<dataset_dir>/Supply_Region_Name=<region>/Supply_Area_Name=<area>/Year=<year>/part-<hash>.csv" files.
+    The partitions the changed exports hold rows of, or held rows of in their previous version, are rebuilt
+    from the rows of every export in `source_paths` order and de-duplicated on (Primary_Key, Acquisition_Date),
+    the rows of later exports winning: the precedence does not depend on which export changed, and rows
+    removed from an export disappear. The other partitions are kept as they are, and only the exports holding
+    rows of rebuilt partitions are read (the partitions of each export are recorded in the manifest).
+    New partition files never overwrite the current ones: the manifest is written last and the replaced files
+    are removed afterwards, so readers always see a consistent dataset.
+
+    When a rebuilt partition keeps all its previous rows unchanged (rows were only added to the exports), the
+    new file is the previous one followed by the new rows, and its manifest entry lists the previous file and
+    row count in "appended_to": readers holding the previous file only need to read the rows after it (see
+    `Utils.pipeline_cache._ingest_new_acquisitions`).
+
+    Args:
+        dataset_dir (str): Partitioned dataset directory.
+        source_paths (list): All the CSV exports of the dataset, in increasing order of precedence. Exports
+            merged before and missing from the list are removed from the dataset.
+        changed_paths (list): Exports new or changed since the last merge (all of them if None).
+
+    Returns:
+        dict: The new manifest.
+    """
+    source_paths = [os.path.abspath(source_path) for source_path in source_paths]
+    with _write_lock:
+        manifest = read_partitions_manifest(dataset_dir) if _is_current_dataset(dataset_dir) else {
+            "version": PARTITIONED_FORMAT_VERSION, "columns": None, "sources": {}, "partitions": []}
+        partitions = {_partition_key(partition): partition for partition in manifest["partitions"]}
+        if changed_paths is None or manifest["columns"] is None:
+            changed_paths = source_paths
+        changed = {os.path.abspath(source_path) for source_path in changed_paths} | \
+            {source_path for source_path in manifest["sources"] if source_path not in source_paths}
+
+        # Partitions to rebuild: those the changed exports held rows of, and those they hold rows of now
+        exports = {source_path: _read_export(source_path) for source_path in source_paths if source_path in changed}
+        for source_path, export in exports.items():
+            _check_partition_values(export, source_path)
+        rebuilt = {tuple(key) for source_path in changed
+                   for key in manifest["sources"].get(source_path, {}).get("partitions", [])}
+        for export in exports.values():
+            rebuilt |= _export_partitions(export)
+        # Unchanged exports holding rows of the rebuilt partitions are read again
+        for source_path in source_paths:
+            if source_path not in exports and rebuilt & {tuple(key) for key in
+                                                         manifest["sources"][source_path]["partitions"]}:
+                exports[source_path] = _read_export(source_path)
+
+        columns = manifest["columns"]
+        for source_path in source_paths:
+            if source_path not in exports:
+                continue
+            if columns is None:
+                columns = exports[source_path].columns.tolist()
+            elif set(exports[source_path].columns) != set(columns):
+                raise ValueError(f"Columns of {source_path} do not match the columns of {dataset_dir}")
+            exports[source_path] = exports[source_path][columns]
+        manifest["columns"] = columns
+
+        # Rows of the rebuilt partitions, in increasing order of precedence
+        rows = pd.concat([exports[source_path] for source_path in source_paths if source_path in exports] or
+                         [pd.DataFrame(columns=columns, dtype=str)], ignore_index=True)
+        rows_by_partition = dict(list(rows.groupby(PARTITION_COLUMNS, sort=True))) if len(rows) else {}
+
+        replaced_files = []
+        for key in sorted(rebuilt):
+            previous = partitions.pop(key, None)
+            if previous is not None:
+                replaced_files.append(os.path.join(dataset_dir, previous["path"]))
+            partition_rows = rows_by_partition.get(tuple(str(value) for value in key))
+            if partition_rows is None:
+                # No export holds rows of this partition anymore
+                continue
+            partition_rows = partition_rows.drop_duplicates(DEDUPLICATION_KEYS, keep="last")
+
+            appended_to = []
+            if previous is not None:
+                previous_rows = _read_export(os.path.join(dataset_dir, previous["path"]))[columns]
+                new_rows = _appended_rows(previous_rows, partition_rows)
+                if new_rows is not None:
+                    partition_rows = pd.concat([previous_rows, new_rows], ignore_index=True)
+                    appended_to = previous.get("appended_to", []) if new_rows.empty else \
+                        ([{"path": previous["path"], "rows": previous["rows"]}] +
+                         previous.get("appended_to", []))[:APPEND_HISTORY]
+
+            text = partition_rows.to_csv(index=False)
+            directory = _partition_path(_partition_values(key))
+            path = os.path.join(directory, f"part-{hashlib.sha1(text.encode()).hexdigest()[:16]}.csv")
+            os.makedirs(os.path.join(dataset_dir, directory), exist_ok=True)
+            with open(os.path.join(dataset_dir, path), "w", newline="") as f:
+                f.write(text)
+            partitions[key] = {**_partition_values(key), "path": path, "rows": len(partition_rows)}
+            if appended_to:
+                partitions[key]["appended_to"] = appended_to
+
+        # Sources in increasing order of precedence, with the partitions they hold rows of
+        manifest["sources"] = {source_path: {"signature": _source_signature(source_path),
+                                             "partitions": sorted(map(list, _export_partitions(exports[source_path])))}
+                               if source_path in exports else manifest["sources"][source_path]
+                               for source_path in source_paths}
+        manifest["partitions"] = [partitions[key] for key in sorted(partitions)]
+        temporary_path = os.path.join(dataset_dir, PARTITIONS_MANIFEST_FILE + ".tmp")
+        os.makedirs(dataset_dir, exist_ok=True)
+        with open(temporary_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temporary_path, os.path.join(dataset_dir, PARTITIONS_MANIFEST_FILE))
+
+        current_files = {os.path.join(dataset_dir, partition["path"]) for partition in manifest["partitions"]}
+        for path in replaced_files:
+            if path not in current_files and os.path.exists(path):
+                os.remove(path)
+
+    return manifest
+
+
+def ensure_partitioned_dataset(dataset_dir: str, source_paths) -> str:
+    """
+    Keep a partitioned dataset up to date with its source exports: if any export is new, changed since it
+    was last merged (by mtime and size) or no longer listed, `merge_exports` rebuilds the partitions involved.
+
+    Args:
+        dataset_dir (str): Partitioned dataset directory.
+        source_paths (list): CSV exports, in increasing order of precedence.
+
+    Returns:
+        str: `dataset_dir`.
+    """
+    with _write_lock:
+        sources = read_partitions_manifest(dataset_dir)["sources"] if _is_current_dataset(dataset_dir) else None
+        if sources is None:
+            merge_exports(dataset_dir, source_paths)
+            return dataset_dir
+        changed = [source_path for source_path in source_paths if
+                   sources.get(os.path.abspath(source_path), {}).get("signature") != _source_signature(source_path)]
+        if changed or set(sources) != {os.path.abspath(source_path) for source_path in source_paths}:
+            merge_exports(dataset_dir, source_paths, changed)
+    return dataset_dir
+
+
+def select_partitions(dataset_dir: str, partitions: PartitionSelection = None) -> list:
+    """
+    Manifest entries of the partitions matching a selection (partition pruning, no data file is opened).
+    """
+    selected = read_partitions_manifest(dataset_dir)["partitions"]
+    return selected if partitions is None else [partition for partition in selected if partitions.matches(partition)]
+
+
+def load_partitioned_dataset(dataset_dir: str, workers: int = 1, columns=None, lazy_columns=(), quality_filter=None,
+                             row_filter=None, partitions: PartitionSelection = None) -> pd.DataFrame:
+    """
+    Load the selected partitions of a partitioned dataset, each one with `load_dataset`.
+
+    Args:
+        dataset_dir (str): Partitioned dataset directory.
+        workers, columns, lazy_columns, quality_filter, row_filter: As in `load_dataset`.
+        partitions (PartitionSelection): Partitions to read (all if None).
+
+    Returns:
+        pd.DataFrame: Preprocessed rows of the selected partitions, in partition order.
+    """
+    return load_partitions(dataset_dir, select_partitions(dataset_dir, partitions), workers, columns, lazy_columns,
+                           quality_filter, row_filter)
+
+
+def load_partitions(dataset_dir: str, selected: list, workers: int = 1, columns=None, lazy_columns=(),
+                    quality_filter=None, row_filter=None) -> pd.DataFrame:
+    """
+    Load partitions of a partitioned dataset given by their manifest entries (see `select_partitions`).
+    """
+    from Utils.load_dataset import load_dataset
+    if not selected:
+        raise ValueError(f"No partition of {dataset_dir} is selected")
+
+    return pd.concat([load_dataset(os.path.join(dataset_dir, partition["path"]), workers, columns, lazy_columns,
+                                   quality_filter, row_filter) for partition in selected], ignore_index=True)
+
+
+if __name__ == "__main__":
+    # Example usage: merge both exports and load one area and season
+    import tempfile
+    from Utils.load_dataset import load_dataset
+    sources = ["../Satellite_NDVI_data_construction.csv", "../Satellite_NDVI_data_construction_2.csv"]
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        manifest = ensure_partitioned_dataset(dataset_dir, sources) and read_partitions_manifest(dataset_dir)
+        for partition in manifest["partitions"]:
+            print(partition["path"], partition["rows"])
+        print(partition_options(dataset_dir))
+
+        merged = load_dataset(dataset_dir, columns=["Primary_Key", "Acquisition_Date", "Year"])
+        print(len(merged), "rows,", merged.duplicated().sum(), "duplicates")
+        selection = PartitionSelection(areas=["Latina"], seasons=[2024])
+        print(len(load_dataset(dataset_dir, partitions=selection)), "rows in",
+              select_partitions(dataset_dir, selection))
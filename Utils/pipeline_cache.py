@@ -0,0 +1,524 @@
+import os
+import sys
+import threading
+import dataclasses
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+from Utils.load_dataset import load_dataset, APP_COLUMNS
+from Utils.quality_filter import QualityFilter, return_code_options
+from Utils.partitioned_dataset import PartitionSelection, PARTITIONS_MANIFEST_FILE, is_partitioned_dataset, \
+    select_partitions, load_partitions
+from Utils.ndvi_store import is_ndvi_store, MANIFEST_FILE
+from Utils.threshold_index import ThresholdIndex, build_threshold_index_from_dataset, threshold_statistics_from_index, \
+    concatenate_threshold_indexes
+from Utils.ndvi_histogram import NDVIHistogram, build_histogram_from_dataset, threshold_statistics_from_histogram, \
+    concatenate_histograms
+from Utils.mean_weekly_resampling import weekly_sufficient_statistics, static_attributes, finalize_weekly_statistics
+from Utils.compute_area_aggregation import AreaStatistics, build_area_statistics, update_area_statistics
+from Utils.incremental_ingestion import acquisition_keys, read_new_acquisitions, update_weekly_dataset
+from Utils.instrumentation import stage
+from Utils.schema import normalize_schema, append_normalized, primary_key_lookup
+from Utils.selection_index import SelectionIndex, build_selection_index
+
+# Byte budget of the processed-dataset cache, can be overridden with the ZESPRI_PIPELINE_CACHE_MB variable
+DEFAULT_PIPELINE_CACHE_MB = 512
+# Byte budget of the loaded datasets (one per file path and selection), can be overridden with the
+# ZESPRI_SHARED_DATASET_CACHE_MB variable. A dataset larger than the budget is reloaded on every use.
+DEFAULT_SHARED_DATASET_CACHE_MB = 2048
+# Bins of the histogram mode (see Utils/ndvi_histogram.py), can be overridden with the ZESPRI_HISTOGRAM_BINS
+# variable (0 keeps the raw pixels and answers thresholds exactly from the threshold index)
+DEFAULT_HISTOGRAM_MODE_BINS = 0
+
+
+def estimate_size(value) -> int:
+    """
+    Approximate memory footprint of a cached value, in bytes.
+
+    DataFrames are measured with `memory_usage(deep=True)`, numpy arrays with `nbytes`, dataclasses,
+    tuples and lists as the sum of their items. Arrays that are views (such as the pixel arrays of the compact
+    schema, see `Utils.schema.normalize_schema`) are measured by the buffer they view, each buffer counted once.
+    """
+    return _estimate_size(value, set())
+
+
+def _estimate_size(value, seen: set) -> int:
+    # `seen` holds the ids of the array buffers already counted
+    if isinstance(value, pd.DataFrame):
+        return int(value.index.memory_usage(deep=True)) + sum(_series_size(value[column], seen)
+                                                              for column in value.columns)
+    if isinstance(value, pd.Series):
+        return int(value.index.memory_usage(deep=True)) + _series_size(value, seen)
+    if isinstance(value, np.ndarray):
+        return _buffer_size(value, seen)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if dataclasses.is_dataclass(value):
+        return sum(_estimate_size(getattr(value, field.name), seen) for field in dataclasses.fields(value))
+    if isinstance(value, (tuple, list)):
+        return sum(_estimate_size(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+
+def _series_size(series: pd.Series, seen: set) -> int:
+    # `memory_usage(deep=True)` counts the array objects of an object column but not the buffers of views
+    if series.dtype == object and len(series) and isinstance(series.iloc[0], np.ndarray):
+        return int(series.memory_usage(index=False)) + sum(
+            _buffer_size(item, seen) if isinstance(item, np.ndarray) else sys.getsizeof(item) for item in series)
+    return int(series.memory_usage(index=False, deep=True))
+
+
+def _buffer_size(array: np.ndarray, seen: set) -> int:
+    # Bytes of the array owning the data of `array`, 0 if already counted
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    if id(array) in seen:
+        return 0
+    seen.add(id(array))
+    return int(array.nbytes)
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by the total estimated size of its values.
+
+    Values larger than the whole budget are returned to the caller but not stored.
+    """
+
+    def __init__(self, max_bytes: int, sizeof=estimate_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value of `key`, computing and storing it on a miss.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, size = self._entries.pop(key)
+            self.current_bytes -= size
+            return value
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _evict(self):
+        # Called with the lock held
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+
+@dataclass
+class SharedDataset:
+    """
+    Loaded dataset shared by all sessions of the process, with its threshold-query index.
+
+    Only the acquisitions passing `quality_filter` (and, for a partitioned dataset, the `partitions`
+    selected) are loaded. The pixel arrays are marked read-only: callers must treat the whole dataset as
+    read-only.
+
+    In histogram mode (`histogram_bins` > 0) the valid pixels are reduced to an `NDVIHistogram` as they are
+    loaded and the "Valid_NDVI_Data" column is dropped; `threshold_index` is then the histogram.
+
+    `partition_files` holds the paths of the partition files loaded from a partitioned dataset.
+    """
+    fingerprint: tuple
+    quality_filter: QualityFilter
+    partitions: PartitionSelection
+    histogram_bins: int
+    dataset: pd.DataFrame
+    threshold_index: ThresholdIndex | NDVIHistogram
+    partition_files: tuple = ()
+
+
+@dataclass
+class ProcessedDataset:
+    """
+    Output of the preprocessing pipeline for a threshold pair.
+
+    `cache_key` is (dataset fingerprint, quality filter, partitions, histogram bins, lower, upper): it
+    identifies the data shown by the pages.
+    `weekly_statistics` and `block_attributes` are the additive statistics the weekly dataset is finalized
+    from, kept to fold in the acquisitions appended to the dataset (see Utils/incremental_ingestion.py).
+    """
+    cache_key: tuple
+    weekly: pd.DataFrame
+    area_statistics: AreaStatistics
+    selection_index: SelectionIndex
+    weekly_statistics: pd.DataFrame
+    block_attributes: pd.DataFrame
+
+
+_shared_datasets = LRUCache(
+    int(os.environ.get("ZESPRI_SHARED_DATASET_CACHE_MB", DEFAULT_SHARED_DATASET_CACHE_MB)) << 20)
+# Guards `_loading_locks`: each shared dataset is loaded under its own lock, so that sessions using other files or
+# selections are not blocked by a load
+_shared_datasets_lock = threading.Lock()
+_loading_locks = {}
+_return_code_options = {}
+_processed_datasets = LRUCache(int(os.environ.get("ZESPRI_PIPELINE_CACHE_MB", DEFAULT_PIPELINE_CACHE_MB)) << 20)
+
+
+def dataset_fingerprint(file_path: str) -> tuple:
+    """
+    Identify the current content of a dataset by its absolute path, modification time and size.
+
+    For an NDVI store or a partitioned dataset directory the manifest is used, as it is written last.
+    """
+    stat_path = os.path.join(file_path, MANIFEST_FILE) if is_ndvi_store(file_path) else \
+        os.path.join(file_path, PARTITIONS_MANIFEST_FILE) if is_partitioned_dataset(file_path) else file_path
+    stat = os.stat(stat_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def _loading_lock(key) -> threading.Lock:
+    # Lock of one shared dataset key (kept for the life of the process, there are few keys)
+    with _shared_datasets_lock:
+        return _loading_locks.setdefault(key, threading.Lock())
+
+
+def load_dataset_shared(file_path: str, quality_filter: QualityFilter = None, partitions: PartitionSelection = None,
+                        histogram_bins: int = None) -> SharedDataset:
+    """
+    Process-wide cached `load_dataset`, reloaded only when the file mtime or size change.
+
+    Only the columns used by the app are loaded (the 2-D NDVI_Data matrices are never parsed), in the
+    compact schema of `Utils.schema.normalize_schema`. The acquisitions dropped by the quality filter, or
+    outside the selected partitions, are neither parsed nor held in memory. One dataset is kept per file path,
+    quality filter, partition selection and histogram mode, in an LRU cache bounded by
+    ZESPRI_SHARED_DATASET_CACHE_MB, so sessions with different selections do not evict each other.
+
+    When rows were only appended to a CSV file (or to the partitions of a partitioned dataset), just the new
+    acquisitions are parsed and indexed, and the cached processed datasets are updated instead of being
+    recomputed (see `_ingest_new_acquisitions`).
+
+    Args:
+        file_path (str): Path to the CSV file (or NDVI store or partitioned dataset directory) containing
+            the dataset.
+        quality_filter (QualityFilter): Acquisitions to load (all if None).
+        partitions (PartitionSelection): Partitions to load from a partitioned dataset (all if None).
+        histogram_bins (int): Bins of the histogram mode, 0 to keep the raw pixels (ZESPRI_HISTOGRAM_BINS or
+            DEFAULT_HISTOGRAM_MODE_BINS if None).
+
+    Returns:
+        SharedDataset: Read-only dataset with its threshold-query index.
+    """
+    quality_filter = QualityFilter() if quality_filter is None else quality_filter
+    partitions = PartitionSelection() if partitions is None else partitions
+    if histogram_bins is None:
+        histogram_bins = int(os.environ.get("ZESPRI_HISTOGRAM_BINS", DEFAULT_HISTOGRAM_MODE_BINS))
+    fingerprint = dataset_fingerprint(file_path)
+    key = (fingerprint[0], quality_filter, partitions, histogram_bins)
+    # Concurrent sessions asking for the same dataset wait for a single load
+    with _loading_lock(key):
+        shared = _shared_datasets.get(key)
+        if shared is not None and shared.fingerprint != fingerprint:
+            shared = _ingest_new_acquisitions(shared, file_path, fingerprint)
+        if shared is None or shared.fingerprint != fingerprint:
+            # Partition files chosen once, so that the files loaded are known even if the dataset is merged again
+            selected = select_partitions(file_path, partitions) if is_partitioned_dataset(file_path) else None
+            with stage("load_dataset") as record:
+                dataset = load_dataset(file_path, columns=APP_COLUMNS, quality_filter=quality_filter) \
+                    if selected is None else \
+                    load_partitions(file_path, selected, columns=APP_COLUMNS, quality_filter=quality_filter)
+                dataset = normalize_schema(dataset)
+                record.rows_out = len(dataset)
+            dataset, threshold_index = _index_pixels(dataset, histogram_bins)
+            shared = SharedDataset(fingerprint, quality_filter, partitions, histogram_bins, dataset, threshold_index,
+                                   tuple(partition["path"] for partition in selected or ()))
+        _shared_datasets.put(key, shared)
+
+    return shared
+
+
+def refresh_dataset_shared(file_path: str) -> bool:
+    """
+    Bring the shared datasets of a file (one per selection) up to date with the file, if any is loaded (used by
+    `DatasetWatcher`).
+
+    Returns:
+        bool: Whether a shared dataset of the file was loaded.
+    """
+    path = os.path.abspath(file_path)
+    selections = [key[1:] for key in _shared_datasets.keys() if key[0] == path]
+    for quality_filter, partitions, histogram_bins in selections:
+        load_dataset_shared(file_path, quality_filter, partitions, histogram_bins)
+    return bool(selections)
+
+
+def _freeze_pixels(dataset: pd.DataFrame):
+    for pixels in dataset["Valid_NDVI_Data"]:
+        pixels.flags.writeable = False
+
+
+def _index_pixels(dataset: pd.DataFrame, histogram_bins: int):
+    # Threshold-query index of the dataset rows and the dataset to keep: in histogram mode the valid pixels are
+    # reduced to their histograms and dropped
+    if histogram_bins:
+        with stage("build_histogram", rows_in=dataset):
+            histogram = build_histogram_from_dataset(dataset, histogram_bins)
+        return dataset.drop(columns="Valid_NDVI_Data"), histogram
+    _freeze_pixels(dataset)
+    with stage("build_threshold_index", rows_in=dataset):
+        return dataset, build_threshold_index_from_dataset(dataset)
+
+
+def _concatenate_indexes(first, second):
+    if isinstance(first, NDVIHistogram):
+        return concatenate_histograms(first, second)
+    return concatenate_threshold_indexes(first, second)
+
+
+def _threshold_statistics(dataset: pd.DataFrame, index, lower_ndvi_threshold: float,
+                          upper_ndvi_threshold: float) -> pd.DataFrame:
+    if isinstance(index, NDVIHistogram):
+        return threshold_statistics_from_histogram(dataset, index, lower_ndvi_threshold, upper_ndvi_threshold)
+    return threshold_statistics_from_index(dataset, index, lower_ndvi_threshold, upper_ndvi_threshold)
+
+
+def _read_new_partition_rows(shared: SharedDataset, dataset_dir: str, selected: list):
+    """
+    Rows appended to the partitions of a shared dataset and rows of the partitions selected since, or None if
+    a loaded partition was rebuilt or removed (see the "appended_to" entries of `merge_exports`).
+    """
+    loaded = {os.path.dirname(path): path for path in shared.partition_files}
+    reads = []
+    for partition in selected:
+        path = loaded.pop(os.path.dirname(partition["path"]), None)
+        if path == partition["path"]:
+            continue
+        appended_to = {previous["path"]: previous["rows"] for previous in partition.get("appended_to", [])}
+        if path is not None and path not in appended_to:
+            return None
+        reads.append((partition, 0 if path is None else appended_to[path]))
+    if loaded:
+        return None
+
+    new_rows = [load_dataset(os.path.join(dataset_dir, partition["path"]), columns=APP_COLUMNS,
+                             quality_filter=shared.quality_filter,
+                             row_filter=lambda scalars, start=start: np.arange(len(scalars)) >= start)
+                for partition, start in reads]
+    return pd.concat(new_rows, ignore_index=True) if new_rows else pd.DataFrame()
+
+
+def _ingest_new_acquisitions(shared: SharedDataset, file_path: str, fingerprint: tuple):
+    """
+    Shared dataset extended with the acquisitions appended to its CSV file (or to the partitions of its
+    partitioned dataset), or None if it needs a full reload.
+
+    Only the new rows are parsed, classified and indexed; every cached processed dataset of the previous
+    content and same selection (quality filter, partitions and histogram mode) is updated on the weekly buckets
+    and area totals the new rows fall in, and moved to the new cache key. In histogram mode the new rows are reduced to their histograms too.
+    Called with the loading lock of the shared dataset held.
+    """
+    # NDVI stores are rewritten as a whole by the converter
+    if is_ndvi_store(file_path):
+        return None
+    selected = select_partitions(file_path, shared.partitions) if is_partitioned_dataset(file_path) else None
+    with stage("read_new_acquisitions") as record:
+        new_rows = read_new_acquisitions(file_path, acquisition_keys(shared.dataset), APP_COLUMNS,
+                                         shared.quality_filter) if selected is None else \
+            _read_new_partition_rows(shared, file_path, selected)
+        record.rows_out = None if new_rows is None else len(new_rows)
+    if new_rows is None:
+        return None
+
+    dataset, threshold_index, new_index = shared.dataset, shared.threshold_index, None
+    if len(new_rows):
+        dataset = append_normalized(shared.dataset, new_rows)
+        new_rows, new_index = _index_pixels(dataset.iloc[len(shared.dataset):], shared.histogram_bins)
+        threshold_index = _concatenate_indexes(shared.threshold_index, new_index)
+        if shared.histogram_bins:
+            dataset = dataset.drop(columns="Valid_NDVI_Data")
+
+    for key in _processed_datasets.keys():
+        # Processed datasets of the other selections are refreshed with their own shared dataset
+        if key[0] != shared.fingerprint or \
+                key[1:-2] != (shared.quality_filter, shared.partitions, shared.histogram_bins):
+            continue
+        processed = _processed_datasets.pop(key)
+        if processed is None:
+            continue
+        new_key = (fingerprint,) + key[1:]
+        if new_index is not None:
+            processed = _fold_new_acquisitions(processed, new_key, new_rows, new_index, primary_key_lookup(dataset))
+        _processed_datasets.put(new_key, dataclasses.replace(processed, cache_key=new_key))
+
+    return SharedDataset(fingerprint, shared.quality_filter, shared.partitions, shared.histogram_bins, dataset,
+                         threshold_index, tuple(partition["path"] for partition in selected or ()))
+
+
+def _fold_new_acquisitions(processed: ProcessedDataset, key: tuple, new_rows: pd.DataFrame, new_index,
+                           primary_keys: pd.Index) -> ProcessedDataset:
+    # Classify the new acquisitions only, then update the weekly buckets and area totals they fall in
+    lower_ndvi_threshold, upper_ndvi_threshold = key[-2:]
+    with stage("threshold_statistics", rows_in=new_rows) as record:
+        new_rows = _threshold_statistics(new_rows, new_index, lower_ndvi_threshold, upper_ndvi_threshold)
+        record.rows_out = len(new_rows)
+    with stage("update_weekly_dataset", rows_in=new_rows) as record:
+        update = update_weekly_dataset(processed.weekly, processed.weekly_statistics, processed.block_attributes,
+                                       new_rows, primary_keys)
+        record.rows_out = len(update.season_rows)
+    with stage("update_area_statistics", rows_in=update.season_rows) as record:
+        area_statistics = update_area_statistics(processed.area_statistics, update.season_rows, update.seasons)
+        record.rows_out = len(area_statistics.totals)
+    with stage("build_selection_index", rows_in=update.weekly):
+        selection_index = build_selection_index(update.weekly)
+    return ProcessedDataset(cache_key=key, weekly=update.weekly, area_statistics=area_statistics,
+                            selection_index=selection_index, weekly_statistics=update.statistics,
+                            block_attributes=update.attributes)
+
+
+def get_return_code_options(file_path: str) -> list:
+    """
+    Cloud_Or_Shadow_Return_Code values of a dataset (the choices of the quality filter), read from that
+    column only and cached by dataset fingerprint.
+    """
+    fingerprint = dataset_fingerprint(file_path)
+    with _loading_lock(("return_codes", fingerprint[0])):
+        cached = _return_code_options.get(fingerprint[0])
+        if cached is None or cached[0] != fingerprint:
+            return_codes = load_dataset(file_path, columns=["Cloud_Or_Shadow_Return_Code"])
+            cached = (fingerprint, return_code_options(return_codes))
+            _return_code_options[fingerprint[0]] = cached
+    return cached[1]
+
+
+def get_processed_dataset(file_path: str, lower_ndvi_threshold: float, upper_ndvi_threshold: float,
+                          quality_filter: QualityFilter = None, partitions: PartitionSelection = None,
+                          histogram_bins: int = None) -> ProcessedDataset:
+    """
+    Weekly dataset and area statistics for a threshold pair, cached by (dataset fingerprint, quality filter,
+    partitions, histogram bins, lower, upper).
+
+    Args:
+        file_path (str): Path to the CSV file (or NDVI store or partitioned dataset directory).
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        quality_filter (QualityFilter): Acquisitions to include (all if None).
+        partitions (PartitionSelection): Partitions to include from a partitioned dataset (all if None).
+        histogram_bins (int): Bins of the histogram mode, whose class statistics are approximate for thresholds
+            off the bin edges (see `Utils.ndvi_histogram.query_histogram`), 0 for the exact statistics of the raw
+            pixels (ZESPRI_HISTOGRAM_BINS or DEFAULT_HISTOGRAM_MODE_BINS if None).
+
+    Returns:
+        ProcessedDataset: Read-only pipeline output, shared by all sessions.
+    """
+    shared = load_dataset_shared(file_path, quality_filter, partitions, histogram_bins)
+    key = (shared.fingerprint, shared.quality_filter, shared.partitions, shared.histogram_bins,
+           float(lower_ndvi_threshold), float(upper_ndvi_threshold))
+
+    def process():
+        with stage("threshold_statistics", rows_in=shared.dataset) as record:
+            dataset = _threshold_statistics(shared.dataset, shared.threshold_index, lower_ndvi_threshold,
+                                            upper_ndvi_threshold)
+            record.rows_out = len(dataset)
+        with stage("resample_and_average_weekly", rows_in=dataset) as record:
+            # As `resample_and_average_weekly`, keeping the sufficient statistics for incremental updates
+            weekly_statistics, block_attributes = weekly_sufficient_statistics(dataset), static_attributes(dataset)
+            # Same Primary_Key codes as the loaded dataset
+            weekly = normalize_schema(finalize_weekly_statistics(weekly_statistics, block_attributes),
+                                      primary_key_lookup(shared.dataset))
+            record.rows_out = len(weekly)
+        with stage("build_area_statistics", rows_in=weekly) as record:
+            area_statistics = build_area_statistics(weekly)
+            record.rows_out = len(area_statistics.totals)
+        with stage("build_selection_index", rows_in=weekly):
+            selection_index = build_selection_index(weekly)
+        return ProcessedDataset(cache_key=key, weekly=weekly, area_statistics=area_statistics,
+                                selection_index=selection_index, weekly_statistics=weekly_statistics,
+                                block_attributes=block_attributes)
+
+    return _processed_datasets.get_or_compute(key, process)
+
+
+def configure_pipeline_cache(max_bytes: int):
+    """
+    Change the byte budget of the processed-dataset cache (evicting entries if needed).
+    """
+    _processed_datasets.resize(max_bytes)
+
+
+def pipeline_cache_stats() -> dict:
+    """
+    Entries, bytes, hits, misses and evictions of the processed-dataset cache.
+    """
+    return _processed_datasets.stats()
+
+
+def configure_shared_dataset_cache(max_bytes: int):
+    """
+    Change the byte budget of the loaded-dataset cache (evicting entries if needed).
+    """
+    _shared_datasets.resize(max_bytes)
+
+
+def shared_dataset_cache_stats() -> dict:
+    """
+    Entries, bytes, hits, misses and evictions of the loaded-dataset cache.
+    """
+    return _shared_datasets.stats()
+
+
+if __name__ == "__main__":
+    # Example usage:
+    for lower, upper in [(0.3, 0.55), (0.4, 0.6), (0.3, 0.55)]:
+        processed = get_processed_dataset("../Satellite_NDVI_data_construction_2.csv", lower, upper)
+        print(processed.weekly.shape)
+    print(pipeline_cache_stats())
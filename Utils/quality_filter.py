@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+# Scalar columns the scene quality filter reads (cheap to parse, no pixel literal)
+QUALITY_COLUMNS = ["Number_Of_Valid_Pixels", "Cloud_Or_Shadow_Percentage", "Cloud_Or_Shadow_Return_Code"]
+
+
+@dataclass(frozen=True)
+class QualityFilter:
+    """
+    Scene quality criteria applied to the acquisitions before their pixel columns are parsed.
+
+    The default filter keeps every acquisition. Instances are hashable and are part of the cache keys of
+    the loaded and processed datasets.
+
+    Attributes:
+        max_cloud_percentage (float): Maximum Cloud_Or_Shadow_Percentage kept (inclusive).
+        allowed_return_codes (tuple): Cloud_Or_Shadow_Return_Code values kept (all codes if None).
+        min_valid_pixels (int): Minimum Number_Of_Valid_Pixels kept (inclusive).
+    """
+    max_cloud_percentage: float = 100.0
+    allowed_return_codes: tuple = None
+    min_valid_pixels: int = 0
+
+    def __post_init__(self):
+        if not 0.0 <= self.max_cloud_percentage <= 100.0:
+            raise ValueError(f"max_cloud_percentage must be between 0 and 100, got {self.max_cloud_percentage}")
+        if self.min_valid_pixels < 0:
+            raise ValueError(f"min_valid_pixels must be non-negative, got {self.min_valid_pixels}")
+        if self.allowed_return_codes is not None:
+            # Normalized so that equal selections give equal cache keys
+            object.__setattr__(self, "allowed_return_codes",
+                               tuple(sorted({int(code) for code in self.allowed_return_codes})))
+
+    @property
+    def keeps_everything(self) -> bool:
+        return self.max_cloud_percentage >= 100.0 and self.allowed_return_codes is None and \
+            self.min_valid_pixels <= 0
+
+
+def quality_mask(dataset: pd.DataFrame, quality_filter: QualityFilter) -> np.ndarray:
+    """
+    Rows of a dataset passing a quality filter, computed on the scalar quality columns only.
+
+    Rows with a missing quality value fail the criteria on that value (and pass when it is not filtered).
+
+    Args:
+        dataset (pd.DataFrame): Dataset holding (at least) the QUALITY_COLUMNS.
+        quality_filter (QualityFilter): Criteria to apply.
+
+    Returns:
+        np.ndarray: Boolean mask of the kept rows.
+    """
+    keep = np.ones(len(dataset), dtype=bool)
+    if quality_filter.max_cloud_percentage < 100.0:
+        cloud = dataset["Cloud_Or_Shadow_Percentage"].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep &= cloud <= quality_filter.max_cloud_percentage
+    if quality_filter.allowed_return_codes is not None:
+        return_codes = dataset["Cloud_Or_Shadow_Return_Code"].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep &= np.isin(return_codes, quality_filter.allowed_return_codes)
+    if quality_filter.min_valid_pixels > 0:
+        valid_pixels = dataset["Number_Of_Valid_Pixels"].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep &= valid_pixels >= quality_filter.min_valid_pixels
+    return keep
+
+
+def return_code_options(dataset: pd.DataFrame) -> list:
+    """
+    Sorted Cloud_Or_Shadow_Return_Code values present in a dataset, as integers.
+    """
+    return_codes = dataset["Cloud_Or_Shadow_Return_Code"].dropna().unique()
+    return sorted(int(code) for code in return_codes)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    dataset = pd.read_csv("../Satellite_NDVI_data_construction_2.csv", usecols=QUALITY_COLUMNS)
+    print(return_code_options(dataset))
+    for quality_filter in [QualityFilter(), QualityFilter(max_cloud_percentage=20),
+                           QualityFilter(allowed_return_codes=[17]), QualityFilter(min_valid_pixels=50)]:
+        print(quality_filter, quality_mask(dataset, quality_filter).sum(), "of", len(dataset))
@@ -0,0 +1,143 @@
+import pandas as pd
+import numpy as np
+
+# Low-cardinality text columns, stored as categoricals
+CATEGORICAL_COLUMNS = ["Orchard_Name", "Supply_Area_Name", "Supply_Region_Name", "Country_Name", "Variety_Name",
+                       "Primary_Key", "Block_Name"]
+# Integer code of the "KPIN_Block" Primary_Key, an index into the Primary_Key lookup table
+PRIMARY_KEY_CODE = "Primary_Key_Code"
+# NDVI values are computed in single precision and exported as the shortest literal of each float32 value, so
+# float32 storage is lossless (the sample exports round-trip exactly, see tests/test_schema.py). Exports written
+# with more precision than float32 would be rounded to about 7 significant digits.
+PIXEL_DTYPE = np.float32
+PIXEL_COLUMNS = ["NDVI_Data", "Valid_NDVI_Data"]
+
+
+def normalize_schema(dataset: pd.DataFrame, primary_keys: pd.Index = None) -> pd.DataFrame:
+    """
+    Convert a dataset to the compact schema: categorical text columns, an integer Primary_Key code and
+    float32 pixel arrays.
+
+    Args:
+        dataset (pd.DataFrame): Dataset returned by `load_dataset` (or a dataset derived from it).
+        primary_keys (pd.Index): Primary_Key lookup table to code the keys with (built from the dataset
+            if None). Keys missing from the table get the code -1.
+
+    Returns:
+        pd.DataFrame: Dataset with the same columns plus "Primary_Key_Code".
+    """
+    dataset = dataset.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in dataset.columns:
+            categories = primary_keys if column == "Primary_Key" and primary_keys is not None else None
+            dataset[column] = pd.Categorical(dataset[column], categories=categories)
+    if "Primary_Key" in dataset.columns:
+        dataset[PRIMARY_KEY_CODE] = _primary_key_codes(dataset["Primary_Key"])
+
+    for column in PIXEL_COLUMNS:
+        # Lazy columns (see Utils/lazy_columns.py) are left as they are
+        if column in dataset.columns and all(isinstance(pixels, np.ndarray) for pixels in dataset[column]):
+            dataset[column] = pd.Series(_pixel_views(dataset[column]), index=dataset.index, dtype=object)
+    return dataset
+
+
+def append_normalized(dataset: pd.DataFrame, new_rows: pd.DataFrame, primary_keys: pd.Index = None) -> pd.DataFrame:
+    """
+    Append rows to a dataset in the compact schema, without copying the pixel arrays already stored.
+
+    The new rows get their own pixel buffer. Categories are the sorted union of both datasets, as if the
+    combined dataset had been normalized at once, and the Primary_Key codes are recomputed accordingly.
+
+    Args:
+        dataset (pd.DataFrame): Output of `normalize_schema`.
+        new_rows (pd.DataFrame): Rows to append, in the layout of the dataset before normalization.
+        primary_keys (pd.Index): Primary_Key lookup table of the result (the union of both datasets if None).
+
+    Returns:
+        pd.DataFrame: Combined dataset with a fresh RangeIndex.
+    """
+    new_rows = normalize_schema(new_rows, primary_keys)
+    dataset, new_rows = dataset.copy(deep=False), new_rows.copy(deep=False)
+    for column in CATEGORICAL_COLUMNS:
+        if column in dataset.columns:
+            categories = primary_keys if column == "Primary_Key" and primary_keys is not None else \
+                dataset[column].cat.categories.union(new_rows[column].cat.categories)
+            dataset[column] = dataset[column].cat.set_categories(categories)
+            new_rows[column] = new_rows[column].cat.set_categories(categories)
+    combined = pd.concat([dataset, new_rows], ignore_index=True)
+    if "Primary_Key" in combined.columns:
+        combined[PRIMARY_KEY_CODE] = _primary_key_codes(combined["Primary_Key"])
+    return combined
+
+
+def _primary_key_codes(primary_keys: pd.Series) -> pd.Series:
+    # Category codes in the smallest integer type holding them
+    return primary_keys.cat.codes.astype(np.int32 if len(primary_keys.cat.categories) > 2 ** 15 else np.int16)
+
+
+def _pixel_views(arrays) -> list:
+    # Copy the arrays into one flat float32 buffer and return per-row views with the original shapes
+    arrays = list(arrays)
+    if not arrays:
+        return []
+    values = np.concatenate([pixels.ravel() for pixels in arrays]).astype(PIXEL_DTYPE)
+    offsets = np.cumsum([0] + [pixels.size for pixels in arrays])
+    return [values[start:end].reshape(pixels.shape) for pixels, start, end in zip(arrays, offsets[:-1], offsets[1:])]
+
+
+def primary_key_lookup(dataset: pd.DataFrame) -> pd.Index:
+    """
+    Primary_Key lookup table of a normalized dataset: the key of code `i` is `lookup[i]`.
+    """
+    return dataset["Primary_Key"].cat.categories
+
+
+def primary_key_code(dataset: pd.DataFrame, primary_key: str) -> int:
+    """
+    Integer code of a Primary_Key in a normalized dataset (-1 if the key is unknown, which matches no row).
+    """
+    lookup = primary_key_lookup(dataset)
+    return int(lookup.get_loc(primary_key)) if primary_key in lookup else -1
+
+
+def primary_key_mask(dataset: pd.DataFrame, primary_key: str) -> np.ndarray:
+    """
+    Boolean row mask of a Primary_Key, compared on the integer codes.
+    """
+    return dataset[PRIMARY_KEY_CODE].to_numpy() == primary_key_code(dataset, primary_key)
+
+
+def dataset_memory_usage(dataset: pd.DataFrame) -> pd.Series:
+    """
+    Bytes held by each column, including the Python strings of object columns and the pixel array buffers.
+    """
+    usage = dataset.memory_usage(index=False, deep=True)
+    for column in PIXEL_COLUMNS:
+        if column in dataset.columns:
+            # `deep=True` counts the buffers of arrays owning their data but not of views, count them all
+            usage[column] = dataset[column].to_numpy().nbytes + sum(
+                pixels.nbytes for pixels in dataset[column] if isinstance(pixels, np.ndarray))
+    return usage
+
+
+def memory_savings_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-column memory of a dataset before and after `normalize_schema`, with the saving.
+
+    Returns:
+        pd.DataFrame: "Before_Bytes", "After_Bytes" and "Saving_Percent" per column, plus a "Total" row.
+    """
+    report = pd.DataFrame({"Before_Bytes": dataset_memory_usage(before), "After_Bytes": dataset_memory_usage(after)})
+    report = report.fillna(0).astype(np.int64)
+    report.loc["Total"] = report.sum()
+    report["Saving_Percent"] = (1 - report["After_Bytes"] / report["Before_Bytes"].replace(0, np.nan)) * 100
+    return report
+
+
+if __name__ == "__main__":
+    # Example usage: memory saving on the sample datasets
+    from Utils.load_dataset import load_dataset
+    for file_path in ["../Satellite_NDVI_data_construction.csv", "../Satellite_NDVI_data_construction_2.csv"]:
+        dataset = load_dataset(file_path)
+        print(file_path)
+        print(memory_savings_report(dataset, normalize_schema(dataset)).round(1))
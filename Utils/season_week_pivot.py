@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+from Utils.mean_weekly_resampling import PREDEFINED_START_WEEK, PREDEFINED_END_WEEK, NDVI_CLASSES, \
+    week_start_dates
+
+# Weekly columns pivoted by default: mean NDVI and pixel count of each class
+PIVOT_COLUMNS = [f"Mean_{name}_Pixels" for name in NDVI_CLASSES] + \
+                [f"{name}_NDVI_Pixels_Number" for name in NDVI_CLASSES]
+N_WEEK_SLOTS = PREDEFINED_END_WEEK - PREDEFINED_START_WEEK + 1
+
+
+@dataclass
+class SeasonWeekPivot:
+    """
+    Dense block x season x week-slot tensors of a weekly dataset.
+
+    Week slot `w` is the predefined week `PREDEFINED_START_WEEK + w` of the season (the week the resampled
+    rows are built on), so every season has the same number of slots. `weeks` holds the "Week" column of
+    each slot and `year_weeks` its "Year_Week" start date (NaN / NaT where the block has no row).
+    """
+    primary_keys: list
+    seasons: list
+    values: dict
+    weeks: np.ndarray
+    year_weeks: np.ndarray
+    present: np.ndarray
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.values[column]
+
+    def block(self, primary_key: str) -> "SeasonWeekPivot":
+        """
+        Pivot restricted to one block (the block axis is kept, with length 1).
+        """
+        b = self.primary_keys.index(primary_key)
+        return SeasonWeekPivot([primary_key], self.seasons, {column: tensor[b:b + 1]
+                                                            for column, tensor in self.values.items()},
+                               self.weeks[b:b + 1], self.year_weeks[b:b + 1], self.present[b:b + 1])
+
+
+def pivot_season_weeks(dataset: pd.DataFrame, primary_keys=None, seasons=None,
+                       columns=PIVOT_COLUMNS) -> SeasonWeekPivot:
+    """
+    Scatter the rows of a weekly dataset into dense (block, season, week slot) tensors, in one pass.
+
+    Args:
+        dataset (pd.DataFrame): Output of `resample_and_average_weekly` (or any subset of its rows).
+        primary_keys (list): Blocks of the block axis (the blocks of the dataset, in order, if None).
+        seasons (list): Seasons of the season axis (the seasons of the dataset, sorted, if None).
+        columns (list): Numeric weekly columns to pivot.
+
+    Returns:
+        SeasonWeekPivot: Tensors of shape (blocks, seasons, N_WEEK_SLOTS), NaN where there is no row.
+    """
+    if primary_keys is None:
+        primary_keys = list(pd.unique(dataset["Primary_Key"].to_numpy()))
+    if seasons is None:
+        seasons = sorted(int(season) for season in pd.unique(dataset["Year"].to_numpy()))
+    primary_keys, seasons = list(primary_keys), list(seasons)
+
+    # Coordinates of every row; rows outside the requested blocks, seasons or weeks are dropped
+    year_weeks = dataset["Year_Week"].to_numpy(dtype="datetime64[ns]")
+    years = dataset["Year"].to_numpy(dtype=np.int64)
+    block_index = pd.Index(primary_keys).get_indexer(dataset["Primary_Key"].astype(object))
+    season_index = pd.Index(seasons).get_indexer(years)
+    first_weeks = week_start_dates(years, np.full(len(years), PREDEFINED_START_WEEK)).astype("datetime64[ns]")
+    slot = (year_weeks - first_weeks) // np.timedelta64(7, "D")
+    keep = (block_index >= 0) & (season_index >= 0) & (slot >= 0) & (slot < N_WEEK_SLOTS)
+    coordinates = block_index[keep], season_index[keep], slot[keep]
+
+    shape = (len(primary_keys), len(seasons), N_WEEK_SLOTS)
+    stacked = np.full((len(columns),) + shape, np.nan)
+    stacked[(slice(None),) + coordinates] = dataset[columns].to_numpy(dtype=np.float64, na_value=np.nan)[keep].T
+    weeks = np.full(shape, np.nan)
+    weeks[coordinates] = dataset["Week"].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    dates = np.full(shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    dates[coordinates] = year_weeks[keep]
+    present = np.zeros(shape[:2], dtype=bool)
+    present[coordinates[:2]] = True
+
+    return SeasonWeekPivot(primary_keys, seasons, dict(zip(columns, stacked)), weeks, dates, present)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    from Utils.pipeline_cache import get_processed_dataset
+    weekly = get_processed_dataset("../Satellite_NDVI_data_construction_2.csv", 0.3, 0.55).weekly
+    pivot = pivot_season_weeks(weekly)
+    print(len(pivot.primary_keys), pivot.seasons, pivot["Mean_Yellow_Pixels"].shape)
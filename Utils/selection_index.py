@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+BLOCK_SORT_KEYS = ["Primary_Key", "Year", "Week"]
+
+
+@dataclass
+class SelectionIndex:
+    """
+    Lookups of the page selections (orchard, block, area, season), built once per processed dataset.
+
+    `dataset` is sorted by (Primary_Key, Year, Week), so the rows of a block (or of a block and season) are a
+    contiguous slice whose bounds are stored in `block_ranges` and `block_season_ranges`.
+    """
+    dataset: pd.DataFrame
+    orchards: list
+    areas: list
+    seasons: list
+    kpins: list
+    orchard_kpins: dict
+    kpin_blocks: dict
+    block_areas: dict
+    block_seasons: dict
+    block_ranges: dict
+    block_season_ranges: dict
+
+    def block_rows(self, primary_key: str, season: int = None) -> pd.DataFrame:
+        """
+        Rows of a block (of one season if given), as a slice of the sorted dataset (empty if unknown).
+        """
+        ranges, key = (self.block_ranges, primary_key) if season is None else \
+            (self.block_season_ranges, (primary_key, season))
+        start, stop = ranges.get(key, (0, 0))
+        return self.dataset.iloc[start:stop]
+
+
+def _sorted(dataset: pd.DataFrame, keys) -> pd.DataFrame:
+    # Stable sort, skipped when the rows are already in order (the weekly dataset is sorted by block)
+    order = np.lexsort([pd.factorize(dataset[key], sort=True)[0] for key in reversed(keys)])
+    if np.array_equal(order, np.arange(len(dataset))):
+        return dataset
+    return dataset.iloc[order]
+
+
+def _group_ranges(dataset: pd.DataFrame, keys) -> dict:
+    """
+    (start, stop) positions of every group of consecutive rows sharing the same `keys` values.
+    """
+    if dataset.empty:
+        return {}
+    codes = np.stack([pd.factorize(dataset[key])[0] for key in keys], axis=1)
+    starts = np.flatnonzero(np.concatenate(([True], (codes[1:] != codes[:-1]).any(axis=1))))
+    stops = np.append(starts[1:], len(dataset))
+    # Group keys as Python scalars, a tuple for several keys
+    values = [dataset[key].to_numpy()[starts].tolist() for key in keys]
+    groups = list(zip(*values)) if len(keys) > 1 else values[0]
+    return {group: (int(start), int(stop)) for group, start, stop in zip(groups, starts, stops)}
+
+
+def build_selection_index(dataset: pd.DataFrame) -> SelectionIndex:
+    """
+    Build the selection index of a weekly dataset.
+
+    Args:
+        dataset (pd.DataFrame): Output of `resample_and_average_weekly` (in the compact schema or not).
+
+    Returns:
+        SelectionIndex: Sorted option lists, orchard and block mappings, and row ranges.
+    """
+    dataset = _sorted(dataset, BLOCK_SORT_KEYS)
+
+    orchards = sorted(dataset["Orchard_Name"].dropna().unique())
+    # The KPIN is the number before the dash in the orchard name
+    orchard_kpins = {orchard: int(orchard.replace("_", " ").split("-")[0]) for orchard in orchards}
+
+    # Blocks of each KPIN, in dataset order
+    kpin_blocks = {}
+    for kpin, block in dataset[["KPIN", "Block_Name"]].drop_duplicates().itertuples(index=False):
+        kpin_blocks.setdefault(int(kpin), []).append(block)
+
+    # Area of each block (padded weeks have no area)
+    with_area = dataset.dropna(subset=["Supply_Area_Name"])
+    block_areas = dict(with_area.groupby("Primary_Key", observed=True, sort=False)["Supply_Area_Name"].first())
+
+    block_season_ranges = _group_ranges(dataset, ["Primary_Key", "Year"])
+    block_seasons = {}
+    for primary_key, season in block_season_ranges:
+        block_seasons.setdefault(primary_key, []).append(season)
+
+    return SelectionIndex(
+        dataset=dataset,
+        orchards=orchards,
+        areas=sorted(with_area["Supply_Area_Name"].unique()),
+        seasons=sorted(int(season) for season in dataset["Year"].unique()),
+        kpins=sorted(kpin_blocks),
+        orchard_kpins=orchard_kpins,
+        kpin_blocks=kpin_blocks,
+        block_areas=block_areas,
+        block_seasons=block_seasons,
+        block_ranges=_group_ranges(dataset, ["Primary_Key"]),
+        block_season_ranges=block_season_ranges,
+    )
+
+
+if __name__ == "__main__":
+    # Example usage:
+    from Utils.pipeline_cache import get_processed_dataset
+    weekly = get_processed_dataset("../Satellite_NDVI_data_construction_2.csv", 0.3, 0.55).weekly
+    index = build_selection_index(weekly)
+    print(index.orchards, index.areas, index.seasons)
+    primary_key = next(iter(index.block_seasons))
+    print(index.block_rows(primary_key, index.block_seasons[primary_key][0]).head())
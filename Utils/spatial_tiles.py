@@ -0,0 +1,363 @@
+import io
+import os
+import re
+import shutil
+import warnings
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colors import ListedColormap, Normalize
+from PIL import Image
+
+from Utils.ndvi_store import is_ndvi_store, convert_csv_to_store, load_ndvi_store
+from Utils.partitioned_dataset import PartitionSelection, is_partitioned_dataset, select_partitions
+from Utils.quality_filter import QualityFilter, quality_mask
+from Utils.mean_weekly_resampling import week_start_dates
+from Utils.threshold_statistics import NDVI_CLASS_INDEX
+from Utils.pipeline_cache import LRUCache, dataset_fingerprint, estimate_size
+from Utils.instrumentation import stage
+
+# Byte budget of the tile cache, can be overridden with the ZESPRI_TILE_CACHE_MB variable
+DEFAULT_TILE_CACHE_MB = 64
+# Byte budget of the spatial sources (one per dataset content, quality filter and partition selection), can be
+# overridden with the ZESPRI_SPATIAL_SOURCE_CACHE_MB variable. Only their in-memory metadata is counted, the
+# matrices are memory-mapped.
+DEFAULT_SPATIAL_SOURCE_CACHE_MB = 64
+# Largest side of a tile, in NDVI cells (larger matrices are averaged down to it)
+TILE_SIZE = 64
+# Side of the rendered tile images, in image pixels (cells are upscaled by an integer factor, without smoothing)
+DISPLAY_SIZE = 320
+# NDVI color scale of the heatmap, and colors of the classified map (same as the pixel counts of the KVDS pages)
+NDVI_COLORMAP = "RdYlGn"
+NDVI_RANGE = (0.0, 1.0)
+CLASS_COLORS = {"Red": "#8B0000", "Yellow": "#FFFF00", "Green": "#006400"}
+
+
+def _spatial_source_size(source) -> int:
+    # The mapped buffers of the stores are backed by their files, only the metadata tables are held in memory
+    return estimate_size(source.acquisitions) + sum(estimate_size(store.metadata) for store in source.stores)
+
+
+_tiles = LRUCache(int(os.environ.get("ZESPRI_TILE_CACHE_MB", DEFAULT_TILE_CACHE_MB)) << 20)
+_spatial_sources = LRUCache(
+    int(os.environ.get("ZESPRI_SPATIAL_SOURCE_CACHE_MB", DEFAULT_SPATIAL_SOURCE_CACHE_MB)) << 20,
+    sizeof=_spatial_source_size)
+_spatial_sources_lock = threading.Lock()
+_conversion_lock = threading.Lock()
+
+
+@dataclass
+class SpatialSource:
+    """
+    NDVI matrices of a dataset, memory-mapped from NDVI stores (one per CSV file or partition).
+
+    `acquisitions` has one row per acquisition passing the quality filter: Primary_Key, Year, Acquisition_Date,
+    Year_Week (the Monday of its week, as in the weekly dataset), and the `store` and `row` holding its matrix.
+    """
+    fingerprint: tuple
+    quality_filter: QualityFilter
+    partitions: PartitionSelection
+    stores: list
+    acquisitions: pd.DataFrame
+
+    def ndvi_matrix(self, acquisition: int) -> np.ndarray:
+        store, row = self.acquisitions.iloc[acquisition][["store", "row"]]
+        return self.stores[store].ndvi_matrix_row(row)
+
+
+@dataclass
+class SpatialTile:
+    """
+    Downsampled NDVI heatmap and classified map of a block for one week, with their rendered PNG images.
+
+    `ndvi` is NaN and `classes` is -1 outside the block (or where no pixel is valid); classes follow
+    NDVI_CLASS_INDEX. `class_shares` are the fractions of the valid pixels of each class, at full resolution.
+    """
+    ndvi: np.ndarray
+    classes: np.ndarray
+    class_shares: np.ndarray
+    acquisitions: int
+    ndvi_png: bytes
+    classes_png: bytes
+
+
+def _store_path(csv_path: str) -> str:
+    # Named after the size and mtime of the CSV file, so a store is never rewritten while it is memory-mapped
+    stat = os.stat(csv_path)
+    return f"{os.path.splitext(csv_path)[0]}.{stat.st_size}-{stat.st_mtime_ns}.ndvi"
+
+
+def _remove_stale_stores(directory: str):
+    # Stores converted from CSV files that were changed or removed since (e.g. partitions replaced by a merge)
+    for name in os.listdir(directory):
+        match = re.fullmatch(r"(.+)\.\d+-\d+\.ndvi", name)
+        if match is None:
+            continue
+        csv_path = os.path.join(directory, match.group(1) + ".csv")
+        if not os.path.exists(csv_path) or _store_path(csv_path) != os.path.join(directory, name):
+            # Stores still memory-mapped elsewhere cannot be removed on every platform, they are retried later
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def ensure_ndvi_store(csv_path: str) -> str:
+    """
+    NDVI store of a CSV file, converted with `convert_csv_to_store` the first time (or after the file changed).
+
+    Args:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        str: Path to the store directory, next to the CSV file.
+    """
+    store_dir = _store_path(csv_path)
+    with _conversion_lock:
+        if not is_ndvi_store(store_dir):
+            with stage("convert_csv_to_store"):
+                convert_csv_to_store(csv_path, store_dir)
+            _remove_stale_stores(os.path.dirname(os.path.abspath(csv_path)))
+    return store_dir
+
+
+def store_paths(file_path: str, partitions: PartitionSelection = None) -> list:
+    """
+    NDVI stores holding the matrices of a dataset, converting its CSV files (or selected partitions) if needed.
+    """
+    if is_ndvi_store(file_path):
+        return [file_path]
+    if is_partitioned_dataset(file_path):
+        return [ensure_ndvi_store(os.path.join(file_path, partition["path"]))
+                for partition in select_partitions(file_path, partitions)]
+    return [ensure_ndvi_store(file_path)]
+
+
+def get_spatial_source(file_path: str, quality_filter: QualityFilter = None,
+                       partitions: PartitionSelection = None) -> SpatialSource:
+    """
+    Process-wide cached `SpatialSource` of a dataset, kept per dataset fingerprint, quality filter and partition
+    selection in an LRU cache bounded by ZESPRI_SPATIAL_SOURCE_CACHE_MB, so sessions with different selections
+    do not evict each other. The sources of the previous contents of the dataset are dropped when it changes.
+
+    Nothing is converted nor memory-mapped until the spatial view is first opened; only the metadata of the
+    stores is read here, the matrices are read from the mapped buffers as tiles are built.
+
+    Args:
+        file_path (str): Path to the CSV file (or NDVI store or partitioned dataset directory).
+        quality_filter (QualityFilter): Acquisitions to include (all if None).
+        partitions (PartitionSelection): Partitions to include from a partitioned dataset (all if None).
+
+    Returns:
+        SpatialSource: Memory-mapped matrices of the acquisitions.
+    """
+    quality_filter = QualityFilter() if quality_filter is None else quality_filter
+    partitions = PartitionSelection() if partitions is None else partitions
+    fingerprint = dataset_fingerprint(file_path)
+    key = (fingerprint, quality_filter, partitions)
+    with _spatial_sources_lock:
+        source = _spatial_sources.get(key)
+        if source is None:
+            for stale_key in _spatial_sources.keys():
+                if stale_key[0][0] == fingerprint[0] and stale_key[0] != fingerprint:
+                    _spatial_sources.pop(stale_key)
+            stores = [load_ndvi_store(store_dir) for store_dir in store_paths(file_path, partitions)]
+            acquisitions = []
+            for position, store in enumerate(stores):
+                rows = np.arange(len(store.metadata))
+                if not quality_filter.keeps_everything:
+                    rows = np.flatnonzero(quality_mask(store.metadata, quality_filter))
+                metadata = store.metadata.iloc[rows]
+                acquisitions.append(pd.DataFrame({
+                    "Primary_Key": metadata["Primary_Key"].astype(str).to_numpy(),
+                    "Year": metadata["Year"].to_numpy(np.int64),
+                    "Acquisition_Date": pd.to_datetime(metadata["Acquisition_Date"]).to_numpy(),
+                    "Year_Week": week_start_dates(metadata["Year"], metadata["Week"]),
+                    "store": position, "row": rows}))
+            acquisitions = pd.concat(acquisitions, ignore_index=True).sort_values(
+                ["Primary_Key", "Acquisition_Date"], kind="stable", ignore_index=True)
+            source = SpatialSource(fingerprint, quality_filter, partitions, stores, acquisitions)
+            _spatial_sources.put(key, source)
+
+    return source
+
+
+def block_weeks(source: SpatialSource, primary_key: str, season: int) -> np.ndarray:
+    """
+    Sorted Year_Week dates of the weeks with at least one acquisition of a block in a season.
+    """
+    acquisitions = source.acquisitions
+    selected = (acquisitions["Primary_Key"] == str(primary_key)) & (acquisitions["Year"] == int(season))
+    return np.unique(acquisitions.loc[selected, "Year_Week"].to_numpy())
+
+
+def weekly_ndvi_matrix(matrices: list) -> tuple:
+    """
+    Per-pixel mean NDVI of the acquisitions of a week (NaN where no acquisition has a valid pixel).
+
+    Only the acquisitions with the same matrix shape as the last one are averaged, as the matrices of a block
+    can be cropped differently from one acquisition to the next.
+
+    Returns:
+        tuple: The mean matrix and the number of acquisitions averaged.
+    """
+    shape = matrices[-1].shape
+    stacked = np.stack([matrix for matrix in matrices if matrix.shape == shape]).astype(np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(stacked, axis=0), len(stacked)
+
+
+def downsample(matrix: np.ndarray, tile_size: int = TILE_SIZE) -> np.ndarray:
+    """
+    Average a matrix down to at most `tile_size` cells per side, ignoring NaN (cells without any value are NaN).
+    """
+    factor = -(-max(matrix.shape) // tile_size)
+    if factor <= 1:
+        return matrix
+    height, width = -(-matrix.shape[0] // factor), -(-matrix.shape[1] // factor)
+    padded = np.full((height * factor, width * factor), np.nan, dtype=matrix.dtype)
+    padded[:matrix.shape[0], :matrix.shape[1]] = matrix
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(padded.reshape(height, factor, width, factor), axis=(1, 3))
+
+
+def classify_matrix(matrix: np.ndarray, lower_ndvi_threshold: float, upper_ndvi_threshold: float) -> np.ndarray:
+    """
+    NDVI class of every pixel with the semantics of `threshold_ndvi_data` (Red if value <= lower, Yellow if
+    lower < value <= upper, Green if value > upper), indexed as NDVI_CLASS_INDEX, -1 for NaN pixels.
+    """
+    edges = np.array([lower_ndvi_threshold, upper_ndvi_threshold], dtype=np.float64)
+    classes = np.searchsorted(edges, matrix.astype(np.float64), side="left").astype(np.int8)
+    classes[np.isnan(matrix)] = -1
+    return classes
+
+
+def downsample_classes(classes: np.ndarray, tile_size: int = TILE_SIZE) -> np.ndarray:
+    """
+    Majority class of every cell of the downsampled grid (-1 for cells without any classified pixel).
+    """
+    valid = classes >= 0
+    shares = np.stack([downsample(np.where(valid, classes == value, np.nan), tile_size)
+                       for value in range(len(NDVI_CLASS_INDEX))])
+    majority = np.argmax(np.nan_to_num(shares, nan=-1.0), axis=0).astype(np.int8)
+    return np.where(np.isnan(shares[0]), np.int8(-1), majority)
+
+
+def render_tile_png(rgba: np.ndarray) -> bytes:
+    """
+    Encode an RGBA tile as PNG, upscaled by an integer factor towards DISPLAY_SIZE (cells stay sharp squares).
+    """
+    scale = max(1, DISPLAY_SIZE // max(rgba.shape[:2]))
+    pixels = np.repeat(np.repeat(np.round(rgba * 255).astype(np.uint8), scale, axis=0), scale, axis=1)
+    image = io.BytesIO()
+    Image.fromarray(pixels, mode="RGBA").save(image, format="png")
+    return image.getvalue()
+
+
+def build_tile(matrices: list, lower_ndvi_threshold: float, upper_ndvi_threshold: float,
+               tile_size: int = TILE_SIZE) -> SpatialTile:
+    """
+    Heatmap and classified map of the NDVI matrices of a block for one week.
+
+    Args:
+        matrices (list): NDVI matrices of the acquisitions of the week, by acquisition date.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        tile_size (int): Largest side of the tile, in cells.
+
+    Returns:
+        SpatialTile: Downsampled maps, class shares and PNG images (transparent outside the block).
+    """
+    if upper_ndvi_threshold < lower_ndvi_threshold:
+        raise ValueError("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+
+    matrix, n_acquisitions = weekly_ndvi_matrix(matrices)
+    classes = classify_matrix(matrix, lower_ndvi_threshold, upper_ndvi_threshold)
+    counts = np.bincount(classes[classes >= 0], minlength=len(NDVI_CLASS_INDEX))
+    class_shares = counts / counts.sum() if counts.sum() else np.full(len(NDVI_CLASS_INDEX), np.nan)
+
+    ndvi = downsample(matrix, tile_size)
+    tile_classes = downsample_classes(classes, tile_size)
+
+    # NaN and -1 cells are "bad" values, drawn transparent
+    ndvi_rgba = colormaps[NDVI_COLORMAP](Normalize(*NDVI_RANGE)(np.ma.masked_invalid(ndvi)))
+    class_colormap = ListedColormap([CLASS_COLORS[name] for name in sorted(NDVI_CLASS_INDEX,
+                                                                          key=NDVI_CLASS_INDEX.get)])
+    classes_rgba = class_colormap(np.ma.masked_less(tile_classes, 0))
+
+    return SpatialTile(ndvi, tile_classes, class_shares, n_acquisitions, render_tile_png(ndvi_rgba),
+                       render_tile_png(classes_rgba))
+
+
+def get_block_tile(source: SpatialSource, primary_key: str, year_week, lower_ndvi_threshold: float,
+                   upper_ndvi_threshold: float) -> SpatialTile:
+    """
+    `build_tile` of the acquisitions of a block in a week, cached per (dataset, block, week, thresholds).
+
+    Scrubbing through a season only reads the matrices of the weeks not seen yet with the same thresholds.
+
+    Args:
+        source (SpatialSource): Output of `get_spatial_source`.
+        primary_key (str): Primary_Key of the block.
+        year_week (np.datetime64): Monday of the week, as returned by `block_weeks`.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+
+    Returns:
+        SpatialTile: Tile of the week, None if the block has no acquisition in it.
+    """
+    year_week = np.datetime64(year_week, "ns")
+    key = (source.fingerprint, source.quality_filter, source.partitions, str(primary_key), year_week,
+           float(lower_ndvi_threshold), float(upper_ndvi_threshold), TILE_SIZE)
+    acquisitions = source.acquisitions
+    selected = np.flatnonzero((acquisitions["Primary_Key"] == str(primary_key)).to_numpy() &
+                              (acquisitions["Year_Week"] == year_week).to_numpy())
+    if not selected.size:
+        return None
+    return _tiles.get_or_compute(key, lambda: build_tile([source.ndvi_matrix(i) for i in selected],
+                                                         lower_ndvi_threshold, upper_ndvi_threshold))
+
+
+def configure_tile_cache(max_bytes: int):
+    """
+    Change the byte budget of the tile cache (evicting entries if needed).
+    """
+    _tiles.resize(max_bytes)
+
+
+def tile_cache_stats() -> dict:
+    """
+    Entries, bytes, hits, misses and evictions of the tile cache.
+    """
+    return _tiles.stats()
+
+
+def configure_spatial_source_cache(max_bytes: int):
+    """
+    Change the byte budget of the spatial source cache (evicting entries if needed).
+    """
+    _spatial_sources.resize(max_bytes)
+
+
+def spatial_source_cache_stats() -> dict:
+    """
+    Entries, bytes, hits, misses and evictions of the spatial source cache.
+    """
+    return _spatial_sources.stats()
+
+
+if __name__ == "__main__":
+    # Example usage: every week of a block, then the same season again from the tile cache
+    import time
+    file_path = "../Satellite_NDVI_data_construction_2.csv"
+    source = get_spatial_source(file_path)
+    primary_key, season = source.acquisitions.iloc[0][["Primary_Key", "Year"]]
+
+    for attempt in ("built", "cached"):
+        start = time.perf_counter()
+        tiles = [get_block_tile(source, primary_key, week, 0.3, 0.55) for week in block_weeks(source, primary_key,
+                                                                                             season)]
+        print(f"{len(tiles)} weeks of {primary_key} ({season}) {attempt} in {time.perf_counter() - start:.4f}s")
+    print(tiles[0].ndvi.shape, tiles[0].class_shares, tile_cache_stats())
@@ -0,0 +1,82 @@
+import pandas as pd
+
+from Utils.load_dataset import preprocess_dataset
+from Utils.threshold_statistics import threshold_and_compute_statistics
+from Utils.mean_weekly_resampling import weekly_sufficient_statistics, combine_weekly_statistics, \
+    static_attributes, finalize_weekly_statistics
+
+# Number of CSV rows parsed at once by the streaming ingestion
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_dataset_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, include_ndvi_matrix: bool = False):
+    """
+    Read and preprocess a dataset CSV file in chunks of rows.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        chunk_size (int): Number of rows per chunk.
+        include_ndvi_matrix (bool): Whether to parse the 2-D "NDVI_Data" matrices (skipped by default).
+
+    Yields:
+        pd.DataFrame: Preprocessed chunk, as returned by `load_dataset` for the same rows.
+    """
+    usecols = None if include_ndvi_matrix else (lambda column: column != "NDVI_Data")
+    with pd.read_csv(file_path, chunksize=chunk_size, usecols=usecols) as reader:
+        for chunk in reader:
+            yield preprocess_dataset(chunk)
+
+
+def stream_weekly_dataset(file_path: str, lower_ndvi_threshold: float, upper_ndvi_threshold: float,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Weekly dataset computed chunk by chunk, without holding the raw pixels of the whole file.
+
+    Each chunk is parsed, classified, and reduced to per-(Primary_Key, Year, Week) sufficient statistics
+    before its pixels are dropped, so peak memory depends on the chunk size and on the number of weekly
+    groups, not on the file size.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        chunk_size (int): Number of rows per chunk.
+
+    Returns:
+        pd.DataFrame: Same output as `resample_and_average_weekly` on the fully loaded dataset.
+    """
+    statistics, attributes = None, None
+    for chunk in iter_dataset_chunks(file_path, chunk_size):
+        chunk = threshold_and_compute_statistics(chunk, lower_ndvi_threshold, upper_ndvi_threshold)
+        chunk_statistics, chunk_attributes = weekly_sufficient_statistics(chunk), static_attributes(chunk)
+        del chunk
+
+        # Fold the chunk into the running statistics (a week can span two chunks)
+        if statistics is None:
+            statistics, attributes = chunk_statistics, chunk_attributes
+        else:
+            statistics = combine_weekly_statistics([statistics, chunk_statistics])
+            attributes = pd.concat([attributes, chunk_attributes]).groupby(level="Primary_Key").first()
+
+    if statistics is None:
+        raise ValueError(f"No rows found in {file_path}")
+
+    return finalize_weekly_statistics(statistics, attributes)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    import tracemalloc
+    from Utils.load_dataset import load_dataset
+    from Utils.mean_weekly_resampling import resample_and_average_weekly
+
+    tracemalloc.start()
+    streamed = stream_weekly_dataset("../Satellite_NDVI_data_construction_2.csv", 0.3, 0.55, chunk_size=50)
+    print("Streaming peak memory (MB):", tracemalloc.get_traced_memory()[1] / 2 ** 20)
+
+    tracemalloc.reset_peak()
+    in_memory = resample_and_average_weekly(
+        threshold_and_compute_statistics(load_dataset("../Satellite_NDVI_data_construction_2.csv"), 0.3, 0.55))
+    print("In-memory peak memory (MB):", tracemalloc.get_traced_memory()[1] / 2 ** 20)
+
+    print(streamed.shape, in_memory.shape)
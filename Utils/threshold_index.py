@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+from Utils.load_dataset import load_dataset
+from Utils.ndvi_store import flatten_ragged
+from Utils.threshold_statistics import class_statistics_frame, robust_statistics, sort_segments
+from Utils.schema import PIXEL_DTYPE
+
+
+@dataclass
+class ThresholdIndex:
+    """
+    Threshold-independent index over the valid NDVI pixels of every acquisition.
+
+    The pixels of acquisition `i` are stored sorted in `sorted_values[offsets[i]:offsets[i + 1]]`, in
+    their loaded precision (float32 for the compact schema); everything derived from them is float64.
+    Prefix sums are taken over the values centered on the acquisition mean (`row_means`), and over the
+    squared centered values minus their acquisition mean (`row_mean_squares`). Both summands add up to
+    zero over every acquisition, so the prefix sums do not drift along the buffer and the variances
+    computed from them stay accurate.
+    """
+    sorted_values: np.ndarray
+    offsets: np.ndarray
+    row_means: np.ndarray
+    row_mean_squares: np.ndarray
+    prefix_sum: np.ndarray
+    prefix_sum_squares: np.ndarray
+
+
+def build_threshold_index(values: np.ndarray, offsets: np.ndarray) -> ThresholdIndex:
+    """
+    Build the threshold index from a flat valid-pixel buffer.
+
+    Args:
+        values (np.ndarray): Flat buffer with the valid NDVI pixels of all acquisitions.
+        offsets (np.ndarray): Row offsets, acquisition `i` owns `values[offsets[i]:offsets[i + 1]]`.
+
+    Returns:
+        ThresholdIndex: Sorted pixels and prefix sums of x and x^2 (centered per acquisition).
+    """
+    values = np.asarray(values)
+    if values.dtype not in (np.float32, np.float64):
+        values = values.astype(np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    row_ids = np.repeat(np.arange(lengths.size, dtype=np.int64), lengths)
+
+    # Sort the pixels within each acquisition (rows stay contiguous)
+    sorted_values = sort_segments(values, offsets)
+
+    def row_mean(weights):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.bincount(row_ids, weights=weights, minlength=lengths.size) / lengths
+        means[lengths == 0] = 0.0
+        return means
+
+    row_means = row_mean(sorted_values)
+    centered = sorted_values - row_means[row_ids]
+    row_mean_squares = row_mean(centered * centered)
+
+    prefix_sum = np.concatenate(([0.0], np.cumsum(centered)))
+    prefix_sum_squares = np.concatenate(([0.0], np.cumsum(centered * centered - row_mean_squares[row_ids])))
+
+    return ThresholdIndex(sorted_values, offsets, row_means, row_mean_squares, prefix_sum, prefix_sum_squares)
+
+
+def build_threshold_index_from_dataset(dataset: pd.DataFrame) -> ThresholdIndex:
+    """
+    Build the threshold index from the "Valid_NDVI_Data" column of a loaded dataset.
+
+    Args:
+        dataset (pd.DataFrame): Dataset returned by `load_dataset`.
+
+    Returns:
+        ThresholdIndex: Index with one entry per dataset row, in row order.
+    """
+    pixels = dataset["Valid_NDVI_Data"]
+    # Keep single precision if the pixels are already float32 (exported NDVI values are float32)
+    dtype = PIXEL_DTYPE if len(pixels) and all(row.dtype == PIXEL_DTYPE for row in pixels) else np.float64
+    return build_threshold_index(*flatten_ragged(pixels, dtype=dtype))
+
+
+def concatenate_threshold_indexes(first: ThresholdIndex, second: ThresholdIndex) -> ThresholdIndex:
+    """
+    Index of the acquisitions of `first` followed by those of `second`, without sorting any pixel again.
+
+    The prefix sums of `second` are shifted by the last prefix sums of `first`; as the centered summands
+    add up to zero over every acquisition, the result matches an index built on all acquisitions at once
+    up to rounding.
+    """
+    return ThresholdIndex(
+        sorted_values=np.concatenate([first.sorted_values, second.sorted_values]),
+        offsets=np.concatenate([first.offsets, second.offsets[1:] + first.offsets[-1]]),
+        row_means=np.concatenate([first.row_means, second.row_means]),
+        row_mean_squares=np.concatenate([first.row_mean_squares, second.row_mean_squares]),
+        prefix_sum=np.concatenate([first.prefix_sum, second.prefix_sum[1:] + first.prefix_sum[-1]]),
+        prefix_sum_squares=np.concatenate([first.prefix_sum_squares,
+                                           second.prefix_sum_squares[1:] + first.prefix_sum_squares[-1]]),
+    )
+
+
+def segmented_searchsorted(sorted_values: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                           thresholds) -> np.ndarray:
+    """
+    Vectorized binary search in many sorted segments at once.
+
+    For every segment `[start, end)` returns the first position whose value is greater than the
+    threshold (as `np.searchsorted(..., side="right")`), so `position - start` pixels are <= threshold.
+    `starts`, `ends` and `thresholds` are broadcast together, which allows searching several
+    thresholds per segment in the same call.
+
+    Args:
+        sorted_values (np.ndarray): Buffer whose segments are sorted.
+        starts (np.ndarray): Segment start positions.
+        ends (np.ndarray): Segment end positions (exclusive).
+        thresholds (float or np.ndarray): Threshold(s) to search.
+
+    Returns:
+        np.ndarray: Absolute positions in `sorted_values`, with the broadcast shape of the inputs.
+    """
+    starts, ends, thresholds = np.broadcast_arrays(np.asarray(starts, dtype=np.int64),
+                                                   np.asarray(ends, dtype=np.int64),
+                                                   np.asarray(thresholds, dtype=np.float64))
+    low, high = starts.copy(), ends.copy()
+    last = max(sorted_values.size - 1, 0)
+
+    # Halve every active [low, high) interval until all of them are empty
+    active = low < high
+    while active.any():
+        middle = (low + high) // 2
+        go_right = active & (sorted_values[np.minimum(middle, last)] <= thresholds)
+        low = np.where(go_right, middle + 1, low)
+        high = np.where(active & ~go_right, middle, high)
+        active = low < high
+
+    return low
+
+
+def query_threshold_index(index: ThresholdIndex, lower_ndvi_threshold: float,
+                          upper_ndvi_threshold: float) -> pd.DataFrame:
+    """
+    Compute Green, Yellow and Red pixel counts, means, population standard deviations and robust statistics
+    for a threshold pair, without touching the raw pixels.
+
+    The pixels of each class are a sorted run of the acquisition segment, so the robust statistics are read
+    from the runs directly.
+
+    Classification semantics are the ones of `threshold_ndvi_data`: Green if value > upper,
+    Yellow if lower < value <= upper, Red if value <= lower.
+
+    Args:
+        index (ThresholdIndex): Index built by `build_threshold_index`.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+
+    Returns:
+        pd.DataFrame: One row per acquisition, same columns as `compute_class_statistics`.
+    """
+    if upper_ndvi_threshold < lower_ndvi_threshold:
+        raise ValueError("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+
+    starts, ends = index.offsets[:-1], index.offsets[1:]
+    lower_position = segmented_searchsorted(index.sorted_values, starts, ends, lower_ndvi_threshold)
+    upper_position = segmented_searchsorted(index.sorted_values, starts, ends, upper_ndvi_threshold)
+
+    # Class boundaries in the sorted segments: Red [start, lower), Yellow [lower, upper), Green [upper, end)
+    boundaries = np.stack([starts, lower_position, upper_position, ends], axis=1)
+    counts = np.diff(boundaries, axis=1)
+    sums = np.diff(index.prefix_sum[boundaries], axis=1)
+    sums_squares = np.diff(index.prefix_sum_squares[boundaries], axis=1) + counts * index.row_mean_squares[:, None]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centered_means = np.where(counts > 0, sums / counts, np.nan)
+        means = index.row_means[:, None] + centered_means
+        variances = np.maximum(sums_squares / counts - centered_means * centered_means, 0.0)
+
+    # Classes whose pixels are all equal (first == last in the sorted segment) have exactly zero spread
+    if index.sorted_values.size:
+        last = index.sorted_values.size - 1
+        constant = (index.sorted_values[np.minimum(boundaries[:, :-1], last)] ==
+                    index.sorted_values[np.clip(boundaries[:, 1:] - 1, 0, last)])
+        variances = np.where(constant, 0.0, variances)
+    stds = np.where(counts > 0, np.sqrt(variances), np.nan)
+    robust = robust_statistics(index.sorted_values, boundaries[:, :-1], boundaries[:, 1:])
+
+    # The column order of the boundaries (Red, Yellow, Green) matches NDVI_CLASS_INDEX
+    return class_statistics_frame(counts, means, stds, robust)
+
+
+def threshold_statistics_from_index(dataset: pd.DataFrame, index: ThresholdIndex, lower_ndvi_threshold: float,
+                                    upper_ndvi_threshold: float) -> pd.DataFrame:
+    """
+    Same output as `threshold_and_compute_statistics`, answered from a prebuilt threshold index.
+
+    Args:
+        dataset (pd.DataFrame): Dataset the index was built from (same rows, same order).
+        index (ThresholdIndex): Index built by `build_threshold_index_from_dataset(dataset)`.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+
+    Returns:
+        pd.DataFrame: Copy of the dataset with pixel counts, means, standard deviations and robust statistics
+        per NDVI category.
+    """
+    statistics = query_threshold_index(index, lower_ndvi_threshold, upper_ndvi_threshold)
+    statistics.index = dataset.index
+
+    return dataset.assign(**statistics)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    dataset = load_dataset("../Satellite_NDVI_data_construction.csv")
+    index = build_threshold_index_from_dataset(dataset)
+    for lower, upper in [(0.3, 0.55), (0.4, 0.6)]:
+        result_dataset = threshold_statistics_from_index(dataset, index, lower, upper)
+        print(result_dataset[["Primary_Key", "Green_NDVI_Pixels_Number", "Mean_Green_Pixels"]].head())
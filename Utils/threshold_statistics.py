@@ -0,0 +1,228 @@
+import pandas as pd
+import numpy as np
+from Utils.load_dataset import load_dataset
+from Utils.ndvi_store import flatten_ragged
+
+# Class index of each NDVI pixel category (pixels are binned by increasing NDVI)
+NDVI_CLASS_INDEX = {"Red": 0, "Yellow": 1, "Green": 2}
+# Robust statistics of each category, "<Statistic>_<Class>_Pixels" columns: median, 10th and 90th percentiles
+# (interpolated as `np.percentile`) and interquartile range
+ROBUST_STATISTICS = ["Median", "P10", "P90", "IQR"]
+_ROBUST_PERCENTILES = [50.0, 10.0, 90.0, 25.0, 75.0]
+
+
+def compute_class_statistics(values: np.ndarray, offsets: np.ndarray, lower_ndvi_threshold: float,
+                             upper_ndvi_threshold: float, robust: bool = True) -> pd.DataFrame:
+    """
+    Classify every valid pixel into Green, Yellow and Red and compute per-acquisition counts, means,
+    population standard deviations and robust statistics, in a single vectorized pass over the flat pixel
+    buffer.
+
+    The classification follows `threshold_ndvi_data`: Green if value > upper, Yellow if
+    lower < value <= upper, Red if value <= lower.
+
+    The robust statistics need the pixels of each acquisition sorted, which costs more than everything else.
+    The sort does not depend on the thresholds: to evaluate several threshold pairs on the same pixels, build
+    a `Utils.threshold_index.ThresholdIndex` once (it keeps the sorted pixels) and query it instead.
+
+    Args:
+        values (np.ndarray): Flat buffer with the valid NDVI pixels of all acquisitions.
+        offsets (np.ndarray): Row offsets, acquisition `i` owns `values[offsets[i]:offsets[i + 1]]`.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        robust (bool): Whether to compute the robust statistics (no pixel is sorted otherwise).
+
+    Returns:
+        pd.DataFrame: One row per acquisition with the pixel counts, means, standard deviations and (if
+        `robust`) robust statistics of each NDVI pixel category (NaN for empty categories).
+    """
+    if upper_ndvi_threshold < lower_ndvi_threshold:
+        raise ValueError("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+
+    values = np.asarray(values)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_rows = offsets.size - 1
+    n_classes = len(NDVI_CLASS_INDEX)
+
+    # Class index of every pixel: 0 (value <= lower), 1 (lower < value <= upper), 2 (value > upper).
+    # Thresholds are float64 so that float32 buffers are compared with the same semantics as float64 ones.
+    edges = np.array([lower_ndvi_threshold, upper_ndvi_threshold], dtype=np.float64)
+    row_ids = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(offsets))
+    bins = row_ids * n_classes + np.searchsorted(edges, values, side="left")
+
+    counts, means, stds, _ = segment_statistics(values, bins, n_rows * n_classes, robust=False)
+    counts, means, stds = (x.reshape(n_rows, n_classes) for x in (counts, means, stds))
+    if not robust:
+        return class_statistics_frame(counts, means, stds)
+
+    # The classes are consecutive value ranges, so each one is a run of its sorted acquisition: Red first, then
+    # Yellow, then Green, with the class counts as run lengths
+    boundaries = offsets[:-1, None] + np.concatenate([np.zeros((n_rows, 1), dtype=np.int64),
+                                                      np.cumsum(counts, axis=1)], axis=1)
+    return class_statistics_frame(counts, means, stds, robust_statistics(sort_segments(values, offsets),
+                                                                         boundaries[:, :-1], boundaries[:, 1:]))
+
+
+def sort_segments(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Copy of a flat buffer with the values of every segment sorted (segments stay in place).
+
+    Buffers of float32 values (as the exported NDVI pixels, even when loaded as float64) are sorted with a single
+    integer key per value: the segment, then the float32 bits mapped to integers of the same order. This is
+    several times faster than sorting by two keys, which is done for the other buffers.
+
+    Args:
+        values (np.ndarray): Flat buffer of values.
+        offsets (np.ndarray): Segment offsets, segment `i` is `values[offsets[i]:offsets[i + 1]]`.
+
+    Returns:
+        np.ndarray: Sorted segments, with the dtype of `values`.
+    """
+    lengths = np.diff(np.asarray(offsets, dtype=np.int64))
+    segment_ids = np.repeat(np.arange(lengths.size, dtype=np.uint64), lengths)
+    single = values.astype(np.float32)
+    if np.isnan(single).any() or not np.array_equal(single, values):
+        return values[np.lexsort((values, segment_ids))]
+    # IEEE bits ordered as the values: negative values reversed below the positive ones
+    bits = single.view(np.uint32).astype(np.uint64)
+    ordered_bits = np.where(bits >> np.uint64(31), ~bits & np.uint64(0xFFFFFFFF), bits | np.uint64(0x80000000))
+    return values[np.argsort((segment_ids << np.uint64(32)) | ordered_bits)]
+
+
+def segment_statistics(values: np.ndarray, segment_ids: np.ndarray, n_segments: int, robust: bool = True) -> tuple:
+    """
+    Counts, means, population standard deviations and robust statistics of the segments of a flat buffer.
+
+    Counts and moments come from bincounts over the segment ids, the robust statistics from one sort of the
+    buffer by (segment, value), so no per-segment Python call is made.
+
+    Args:
+        values (np.ndarray): Flat buffer of values.
+        segment_ids (np.ndarray): Segment of every value, in [0, n_segments).
+        n_segments (int): Number of segments.
+        robust (bool): Whether to compute the robust statistics (the buffer is not sorted otherwise).
+
+    Returns:
+        tuple: (counts, means, stds, robust) arrays of length n_segments, `robust` a dict of `robust_statistics`
+        (NaN for empty segments), or None if not computed.
+    """
+    counts = np.bincount(segment_ids, minlength=n_segments)
+    sums = np.bincount(segment_ids, weights=values, minlength=n_segments)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+
+        # Population standard deviation from the squared deviations to the segment mean (two-pass)
+        deviations = values - means[segment_ids]
+        squared = np.bincount(segment_ids, weights=deviations * deviations, minlength=n_segments)
+        stds = np.where(counts > 0, np.sqrt(squared / counts), np.nan)
+
+    if not robust:
+        return counts, means, stds, None
+
+    # Segments become contiguous and sorted runs of the sorted buffer
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    robust = robust_statistics(values[np.lexsort((values, segment_ids))], offsets[:-1], offsets[1:])
+
+    return counts, means, stds, robust
+
+
+def segment_percentiles(sorted_values: np.ndarray, starts: np.ndarray, ends: np.ndarray, percentiles) -> np.ndarray:
+    """
+    Percentiles of many sorted segments at once, interpolated between the closest ranks as `np.percentile`.
+
+    Args:
+        sorted_values (np.ndarray): Buffer whose segments are sorted.
+        starts (np.ndarray): Segment start positions.
+        ends (np.ndarray): Segment end positions (exclusive), same shape as `starts`.
+        percentiles (list): Percentiles to compute, in [0, 100].
+
+    Returns:
+        np.ndarray: float64 array of shape `starts.shape + (len(percentiles),)`, NaN for empty segments.
+    """
+    starts = np.asarray(starts, dtype=np.int64)[..., None]
+    lengths = np.asarray(ends, dtype=np.int64)[..., None] - starts
+    if not sorted_values.size:
+        # Every segment is empty (e.g. a class without any pixel for these thresholds)
+        return np.full(lengths.shape[:-1] + (len(percentiles),), np.nan)
+    positions = (lengths - 1) * (np.asarray(percentiles, dtype=np.float64) / 100.0)
+    below = np.floor(positions).astype(np.int64)
+    fraction = positions - below
+
+    last = max(sorted_values.size - 1, 0)
+    low = sorted_values[np.clip(starts + below, 0, last)].astype(np.float64)
+    high = sorted_values[np.clip(starts + np.minimum(below + 1, lengths - 1), 0, last)].astype(np.float64)
+    return np.where(lengths > 0, low + fraction * (high - low), np.nan)
+
+
+def robust_statistics(sorted_values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> dict:
+    """
+    Median, 10th and 90th percentiles and interquartile range of many sorted segments at once.
+
+    Returns:
+        dict: One array per name of ROBUST_STATISTICS, with the shape of `starts` (NaN for empty segments).
+    """
+    median, p10, p90, p25, p75 = np.moveaxis(segment_percentiles(sorted_values, starts, ends, _ROBUST_PERCENTILES),
+                                              -1, 0)
+    return {"Median": median, "P10": p10, "P90": p90, "IQR": p75 - p25}
+
+
+def class_statistics_frame(counts: np.ndarray, means: np.ndarray, stds: np.ndarray,
+                           robust: dict = None) -> pd.DataFrame:
+    """
+    Lay out per-acquisition class statistics with the column names used by the rest of the pipeline.
+
+    Args:
+        counts (np.ndarray): Pixel counts of shape (acquisitions, 3), columns indexed by `NDVI_CLASS_INDEX`.
+        means (np.ndarray): Mean NDVI values, same layout as `counts`.
+        stds (np.ndarray): Population standard deviations, same layout as `counts`.
+        robust (dict): Arrays of the ROBUST_STATISTICS, same layout as `counts` (no robust column if None).
+
+    Returns:
+        pd.DataFrame: One row per acquisition with the pixel counts, means, standard deviations and robust
+        statistics ("Median_Green_Pixels", ...).
+    """
+    statistics = {}
+    for name in ("Green", "Yellow", "Red"):
+        statistics[f"{name}_NDVI_Pixels_Number"] = counts[:, NDVI_CLASS_INDEX[name]]
+    for name in ("Green", "Yellow", "Red"):
+        statistics[f"Mean_{name}_Pixels"] = means[:, NDVI_CLASS_INDEX[name]]
+    for name in ("Green", "Yellow", "Red"):
+        statistics[f"Std_{name}_Pixels"] = stds[:, NDVI_CLASS_INDEX[name]]
+    for statistic in ROBUST_STATISTICS if robust is not None else ():
+        for name in ("Green", "Yellow", "Red"):
+            statistics[f"{statistic}_{name}_Pixels"] = robust[statistic][:, NDVI_CLASS_INDEX[name]]
+
+    return pd.DataFrame(statistics)
+
+
+def threshold_and_compute_statistics(dataset: pd.DataFrame, lower_ndvi_threshold: float,
+                                     upper_ndvi_threshold: float, robust: bool = True) -> pd.DataFrame:
+    """
+    Fused replacement of `threshold_ndvi_data` followed by `compute_ndvi_statistics`.
+
+    The per-category pixel arrays ("Green_NDVI_Pixels", ...) are not built, only the numeric columns
+    (pixel counts, means, standard deviations and robust statistics) are added. The input dataset is not modified.
+
+    Args:
+        dataset (pd.DataFrame): Pandas DataFrame containing NDVI data.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        robust (bool): Whether to compute the robust statistics (see `compute_class_statistics`).
+
+    Returns:
+        pd.DataFrame: Copy of the dataset with pixel counts, means, standard deviations and (if `robust`)
+        robust statistics per NDVI category.
+    """
+    values, offsets = flatten_ragged(dataset["Valid_NDVI_Data"], dtype=np.float64)
+    statistics = compute_class_statistics(values, offsets, lower_ndvi_threshold, upper_ndvi_threshold, robust)
+    statistics.index = dataset.index
+
+    return dataset.assign(**statistics)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    dataset = load_dataset("../Satellite_NDVI_data_construction.csv")
+    result_dataset = threshold_and_compute_statistics(dataset, lower_ndvi_threshold=0.3, upper_ndvi_threshold=0.55)
+    print(result_dataset.head())
+    print(result_dataset.dtypes)
@@ -0,0 +1,191 @@
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+import numpy as np
+
+from Utils.threshold_index import segmented_searchsorted
+from Utils.ndvi_histogram import NDVIHistogram, snap_to_edge
+from Utils.threshold_statistics import NDVI_CLASS_INDEX
+from Utils.schema import primary_key_mask
+from Utils.mean_weekly_resampling import week_start_dates
+from Utils.pipeline_cache import LRUCache
+
+# Default grid of the sensitivity sweep: lower and upper thresholds in [0, 1], 50 values each
+DEFAULT_GRID_STEPS = 50
+# Byte budget of the sweep cache, can be overridden with the ZESPRI_SWEEP_CACHE_MB variable
+DEFAULT_SWEEP_CACHE_MB = 64
+
+_sweeps = LRUCache(int(os.environ.get("ZESPRI_SWEEP_CACHE_MB", DEFAULT_SWEEP_CACHE_MB)) << 20)
+
+
+@dataclass
+class ThresholdSweep:
+    """
+    Weekly class statistics of blocks for many (lower, upper) threshold pairs.
+
+    `counts[p, b, w, c]` and `means[p, b, w, c]` are the pixel count and mean NDVI of class `c` (in the order of
+    NDVI_CLASS_INDEX: Red, Yellow, Green) of block `blocks[b]` in week `weeks[w]` for the thresholds `pairs[p]`,
+    aggregated as in the weekly dataset: the count is the mean over the acquisitions of the week and the NDVI
+    the count-weighted mean. Both are NaN for weeks without acquisitions, means also for empty classes.
+    `weeks` holds the (Year, Week) of the acquisitions and `year_weeks` the Monday of each week, the "Year_Week"
+    of the weekly dataset.
+    """
+    pairs: np.ndarray
+    blocks: pd.Index
+    weeks: pd.MultiIndex
+    year_weeks: np.ndarray
+    counts: np.ndarray
+    means: np.ndarray
+
+    def class_values(self, name: str, statistic: str = "counts") -> np.ndarray:
+        """
+        (pairs x block x week) array of a class ("Green", "Yellow" or "Red"), "counts" or "means".
+        """
+        return getattr(self, statistic)[..., NDVI_CLASS_INDEX[name]]
+
+
+def threshold_grid(lower_values, upper_values) -> np.ndarray:
+    """
+    (lower, upper) pairs of a grid of thresholds, keeping the pairs with lower <= upper.
+
+    Returns:
+        np.ndarray: (pairs, 2) float64 array, by increasing lower then upper threshold.
+    """
+    lower, upper = np.meshgrid(np.asarray(lower_values, dtype=np.float64), np.asarray(upper_values, dtype=np.float64),
+                               indexing="ij")
+    valid = lower <= upper
+    return np.stack([lower[valid], upper[valid]], axis=1)
+
+
+def cumulative_class_sums(index, rows: np.ndarray, thresholds: np.ndarray):
+    """
+    Number and sum of the pixels <= each threshold, for some acquisitions of a threshold index or histogram.
+
+    Every class statistic of every threshold pair is a difference of these: Red is <= lower, Yellow is
+    <= upper minus <= lower, Green is all pixels (threshold +inf) minus <= upper. A histogram answers with the
+    thresholds snapped to its bin edges (see `Utils.ndvi_histogram.query_histogram` for the error bounds).
+
+    Args:
+        index (ThresholdIndex or NDVIHistogram): Threshold-query index of the dataset.
+        rows (np.ndarray): Positions of the acquisitions in the index.
+        thresholds (np.ndarray): Sorted thresholds.
+
+    Returns:
+        tuple: (counts, sums), (rows, thresholds) arrays.
+    """
+    if isinstance(index, NDVIHistogram):
+        columns = index.columns(snap_to_edge(index, thresholds))
+
+        def cumulative(x):
+            return np.concatenate([np.zeros((len(rows), 1), dtype=x.dtype), np.cumsum(x, axis=1)], axis=1)[:, columns]
+
+        return cumulative(index.counts[rows]).astype(np.int64), cumulative(index.sums()[rows])
+
+    starts, ends = index.offsets[rows][:, None], index.offsets[rows + 1][:, None]
+    # All thresholds of all acquisitions in one batched binary search
+    positions = segmented_searchsorted(index.sorted_values, starts, ends, thresholds[None, :])
+    counts = positions - starts
+    # The prefix sums are centered on the acquisition means
+    sums = index.prefix_sum[positions] - index.prefix_sum[starts] + counts * index.row_means[rows][:, None]
+    return counts, sums
+
+
+def sweep_thresholds(dataset: pd.DataFrame, index, pairs: np.ndarray, rows: np.ndarray = None) -> ThresholdSweep:
+    """
+    Weekly class counts and mean NDVI of every block for a batch of threshold pairs, in one pass over the index.
+
+    The pixels are searched once per distinct threshold of the batch (at most 100 for a 50 x 50 grid), the
+    resulting cumulative counts and sums are pooled per (block, week), and each pair only differences them, so
+    the sweep costs about as much as a few threshold evaluations whatever the number of pairs.
+
+    Args:
+        dataset (pd.DataFrame): Dataset the index was built from, with Primary_Key, Year and Week.
+        index (ThresholdIndex or NDVIHistogram): Threshold-query index of the dataset.
+        pairs (np.ndarray): (pairs, 2) lower and upper thresholds, e.g. from `threshold_grid`.
+        rows (np.ndarray): Positions of the acquisitions to include (all if None).
+
+    Returns:
+        ThresholdSweep: (pairs x block x week) class statistics.
+    """
+    pairs = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)
+    if (pairs[:, 1] < pairs[:, 0]).any():
+        raise ValueError("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+    rows = np.arange(len(dataset)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    # Cumulative sums at every distinct threshold, the last column (+inf) holding all pixels
+    thresholds = np.unique(pairs)
+    counts, sums = cumulative_class_sums(index, rows, np.append(thresholds, np.inf))
+
+    # Pool the acquisitions of each (block, week)
+    selected = dataset.iloc[rows]
+    block_codes, blocks = pd.factorize(selected["Primary_Key"].astype(str), sort=True)
+    week_codes, weeks = pd.MultiIndex.from_frame(selected[["Year", "Week"]].astype(np.int64)).factorize(sort=True)
+    weeks = weeks.set_names(["Year", "Week"])
+    groups = block_codes * len(weeks) + week_codes
+    n_groups = len(blocks) * len(weeks)
+    acquisitions = np.bincount(groups, minlength=n_groups)
+    group_counts = np.zeros((n_groups, counts.shape[1]), dtype=np.int64)
+    group_sums = np.zeros((n_groups, counts.shape[1]))
+    np.add.at(group_counts, groups, counts)
+    np.add.at(group_sums, groups, sums)
+
+    # Class boundaries of each pair among the thresholds: Red [-inf, lower], Yellow (lower, upper], Green (upper, inf]
+    lower, upper = np.searchsorted(thresholds, pairs[:, 0]), np.searchsorted(thresholds, pairs[:, 1])
+    total = np.full(len(pairs), thresholds.size)
+
+    def by_class(x):
+        below_lower, below_upper, below_total = x[:, lower], x[:, upper], x[:, total]
+        # (pairs, groups, classes) in the order of NDVI_CLASS_INDEX
+        return np.stack([below_lower, below_upper - below_lower, below_total - below_upper], axis=-1).swapaxes(0, 1)
+
+    class_counts, class_sums = by_class(group_counts), by_class(group_sums)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_counts = np.where(acquisitions[:, None] > 0, class_counts / acquisitions[:, None], np.nan)
+        means = np.where(class_counts > 0, class_sums / class_counts, np.nan)
+
+    shape = (len(pairs), len(blocks), len(weeks), len(NDVI_CLASS_INDEX))
+    return ThresholdSweep(pairs, pd.Index(blocks, name="Primary_Key"), weeks,
+                          week_start_dates(weeks.get_level_values(0), weeks.get_level_values(1)),
+                          mean_counts.reshape(shape), means.reshape(shape))
+
+
+def get_block_sweep(shared_dataset, primary_key: str, lower_values, upper_values) -> ThresholdSweep:
+    """
+    `sweep_thresholds` of one block over a threshold grid, cached per shared dataset (data fingerprint, quality
+    filter, partitions and histogram mode), block and grid.
+
+    Args:
+        shared_dataset (SharedDataset): Output of `Utils.pipeline_cache.load_dataset_shared`.
+        primary_key (str): Primary_Key of the block.
+        lower_values (list): Lower thresholds of the grid.
+        upper_values (list): Upper thresholds of the grid.
+
+    Returns:
+        ThresholdSweep: Sweep of the pairs of `threshold_grid(lower_values, upper_values)`.
+    """
+    lower_values, upper_values = tuple(map(float, lower_values)), tuple(map(float, upper_values))
+    key = (shared_dataset.fingerprint, shared_dataset.quality_filter, shared_dataset.partitions,
+           shared_dataset.histogram_bins, primary_key, lower_values, upper_values)
+    dataset = shared_dataset.dataset
+    return _sweeps.get_or_compute(key, lambda: sweep_thresholds(
+        dataset, shared_dataset.threshold_index, threshold_grid(lower_values, upper_values),
+        np.flatnonzero(primary_key_mask(dataset, primary_key))))
+
+
+if __name__ == "__main__":
+    # Example usage: a 50 x 50 sweep takes about the time of one threshold pair
+    import time
+    from Utils.pipeline_cache import load_dataset_shared, get_processed_dataset
+    file_path = "../Satellite_NDVI_data_construction_2.csv"
+    shared = load_dataset_shared(file_path)
+    start = time.perf_counter()
+    get_processed_dataset(file_path, 0.3, 0.55)
+    print(f"One threshold pair: {time.perf_counter() - start:.3f}s")
+
+    grid = np.round(np.linspace(0.0, 1.0, DEFAULT_GRID_STEPS), 2)
+    start = time.perf_counter()
+    sweep = sweep_thresholds(shared.dataset, shared.threshold_index, threshold_grid(grid, grid))
+    print(f"{len(sweep.pairs)} threshold pairs: {time.perf_counter() - start:.3f}s, counts {sweep.counts.shape}")
+
+    print(sweep.class_values("Green")[len(sweep.pairs) // 2, 0])
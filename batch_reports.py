@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.partitioned_dataset import ensure_partitioned_dataset, SOURCE_EXPORTS, DATASET_PATH
+from Utils.mean_weekly_resampling import resample_and_average_weekly
+from Utils.compute_area_aggregation import compute_weighted_average_excluding
+from Utils.schema import primary_key_mask
+from Utils.season_week_pivot import pivot_season_weeks
+
+MANIFEST_FILE = "reports_manifest.json"
+# Bump when the figures change, so that every report is rendered again
+FIGURES_VERSION = 1
+# Seasons left out of the "Onset KVDS" reports, as in the page (incomplete season)
+ONSET_EXCLUDED_SEASONS = [2025]
+
+
+def _input_hash(kind: str, frames, parameters: dict) -> str:
+    """
+    Hash of everything a report depends on: its input frames, thresholds, output formats and figure code version.
+    """
+    digest = hashlib.sha256(json.dumps([kind, FIGURES_VERSION, parameters], sort_keys=True, default=str).encode())
+    for frame in frames:
+        digest.update(",".join(map(str, frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def build_report_jobs(dataset: pd.DataFrame, area_statistics) -> list:
+    """
+    Inputs of every report: one "Low or No KVDS" report per block and season (compared with the block's area,
+    if any other block of the area has data) and one "Onset KVDS" report per block.
+
+    Returns:
+        list: (name, kind, arguments, frames) tuples, `arguments` being the keyword arguments of the figure
+        builder and `frames` the weekly frames the report is built from.
+    """
+    jobs = []
+    blocks = dataset.dropna(subset=["Supply_Area_Name"]).groupby("Primary_Key", sort=True)
+    for primary_key, block_dataset in blocks:
+        kpin, block = block_dataset["KPIN"].iloc[0], block_dataset["Block_Name"].iloc[0]
+        area = block_dataset["Supply_Area_Name"].iloc[0]
+        # Padded weeks have no metadata, select the block rows as the page does (by Primary_Key)
+        block_weeks = dataset[primary_key_mask(dataset, primary_key)]
+
+        for season in sorted(block_weeks["Year"].unique()):
+            area_aggregation_dataset = compute_weighted_average_excluding(area_statistics, area, season, primary_key)
+            if area_aggregation_dataset.empty:
+                # No other block in the area this season, there is nothing to compare with
+                continue
+            area_aggregation_dataset = resample_and_average_weekly(area_aggregation_dataset)
+            selected_dataset = block_weeks[block_weeks["Year"] == season]
+            jobs.append((f"low_kvds_{primary_key}_{season}", "low", dict(
+                selected_dataset=selected_dataset, area_aggregation_dataset=area_aggregation_dataset,
+                selected_kpin=kpin, selected_block=block, selected_area=area, selected_season=season),
+                [selected_dataset, area_aggregation_dataset]))
+
+        seasons = [season for season in block_weeks["Year"].unique() if season not in ONSET_EXCLUDED_SEASONS]
+        selected_dataset = block_weeks[block_weeks["Year"].isin(seasons)]
+        jobs.append((f"onset_kvds_{primary_key}", "onset", dict(
+            pivot=pivot_season_weeks(selected_dataset, primary_keys=[primary_key], seasons=seasons),
+            selected_kpin=kpin, selected_block=block), [selected_dataset]))
+    return jobs
+
+
+def render_report(kind: str, arguments: dict, output_paths: list):
+    """
+    Render one report with the Agg backend and save it to every output path (format given by the extension).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from Utils.kvds_figures import build_low_kvds_figure, build_onset_kvds_figure
+
+    if kind == "low":
+        fig = build_low_kvds_figure(**arguments)
+    else:
+        fig = build_onset_kvds_figure(**arguments)
+    try:
+        for output_path in output_paths:
+            fig.savefig(output_path)
+    finally:
+        plt.close(fig)
+
+
+def generate_reports(dataset_path: str, output_dir: str, lower_ndvi_threshold: float, upper_ndvi_threshold: float,
+                     formats=("png",), workers: int = None, force: bool = False) -> dict:
+    """
+    Render the "Low or No KVDS" and "Onset KVDS" reports of every block on a process pool.
+
+    The dataset is processed once in the calling process; each worker only receives the small weekly frames of
+    its report. Reports whose inputs, thresholds and formats are unchanged since the last run (according to the
+    manifest in `output_dir`) and whose files still exist are skipped.
+
+    Args:
+        dataset_path (str): Path to the CSV file (or NDVI store or partitioned dataset directory) containing
+            the dataset.
+        output_dir (str): Directory of the reports and of their manifest.
+        lower_ndvi_threshold (float): Lower threshold for NDVI classification.
+        upper_ndvi_threshold (float): Upper threshold for NDVI classification.
+        formats (list): Output formats ("png", "pdf", ...).
+        workers (int): Number of worker processes (None uses all cores).
+        force (bool): Render every report, even if unchanged.
+
+    Returns:
+        dict: Lists of the "rendered", "skipped" and "failed" report names.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    processed_dataset = get_processed_dataset(dataset_path, lower_ndvi_threshold, upper_ndvi_threshold)
+    parameters = {"lower": float(lower_ndvi_threshold), "upper": float(upper_ndvi_threshold), "formats": list(formats)}
+
+    summary = {"rendered": [], "skipped": [], "failed": []}
+    pending = {}
+    for name, kind, arguments, frames in build_report_jobs(processed_dataset.weekly,
+                                                           processed_dataset.area_statistics):
+        output_paths = [os.path.join(output_dir, f"{name}.{extension}") for extension in formats]
+        input_hash = _input_hash(kind, frames, parameters)
+        if manifest.get(name) == input_hash and all(os.path.exists(path) for path in output_paths):
+            summary["skipped"].append(name)
+        else:
+            pending[name] = (input_hash, kind, arguments, output_paths)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(render_report, kind, arguments, output_paths)
+                   for name, (_, kind, arguments, output_paths) in pending.items()}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                # Keep rendering the other reports, the failed one is retried on the next run
+                print(f"Failed to render {name}: {error!r}", file=sys.stderr)
+                manifest.pop(name, None)
+                summary["failed"].append(name)
+            else:
+                manifest[name] = pending[name][0]
+                summary["rendered"].append(name)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render the KVDS reports of every orchard block.")
+    parser.add_argument("--dataset", default=DATASET_PATH,
+                        help="Dataset to report on (default: the partitioned dataset of the app)")
+    parser.add_argument("--output-dir", default="./reports")
+    parser.add_argument("--lower", type=float, default=0.3, help="Lower NDVI threshold")
+    parser.add_argument("--upper", type=float, default=0.55, help="Upper NDVI threshold")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=["png", "pdf", "svg"])
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Render unchanged reports too")
+    args = parser.parse_args(argv)
+    if args.upper < args.lower:
+        parser.error("Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
+
+    if args.dataset == DATASET_PATH:
+        # Same data as the app: merge new or changed exports first
+        ensure_partitioned_dataset(DATASET_PATH, SOURCE_EXPORTS)
+    summary = generate_reports(args.dataset, args.output_dir, args.lower, args.upper, args.formats, args.workers,
+                               args.force)
+    print(", ".join(f"{len(names)} {status}" for status, names in summary.items()))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python batch_reports.py --output-dir ./reports --formats png pdf
+    sys.exit(main())
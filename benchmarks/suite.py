@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+from Utils.load_dataset import load_dataset
+from Utils.threshold_dataset import threshold_ndvi_data
+from Utils.compute_statistics import compute_ndvi_statistics
+from Utils.mean_weekly_resampling import resample_and_average_weekly
+from Utils.compute_area_aggregation import compute_weighted_average
+from benchmarks.synthetic_dataset import generate_synthetic_dataset
+
+# Generator parameters of each benchmark scale
+SCALES = {
+    "small": dict(n_orchards=5, blocks_per_orchard=2, seasons=1, acquisitions_per_week=1, pixels_per_block=200),
+    "medium": dict(n_orchards=20, blocks_per_orchard=2, seasons=2, acquisitions_per_week=1, pixels_per_block=400),
+    "large": dict(n_orchards=40, blocks_per_orchard=3, seasons=3, acquisitions_per_week=2, pixels_per_block=800),
+}
+LOWER_NDVI_THRESHOLD = 0.3
+UPPER_NDVI_THRESHOLD = 0.55
+# Allowed relative slowdown (or memory growth) of a stage before it is reported as a regression
+DEFAULT_TOLERANCE = 0.25
+# Differences below these floors are noise, whatever the relative change
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 1 << 20
+
+
+def _stages(file_path: str) -> list:
+    """
+    Pipeline stages in app order, as (name, setup, run): `setup` builds the stage input from the previous
+    stage output (outside of the measurements), `run` is the measured call.
+    """
+    def copy(dataset):
+        # Thresholding and statistics add columns in place
+        return dataset.copy()
+
+    return [
+        ("load_dataset", lambda _: file_path, load_dataset),
+        ("threshold_ndvi_data", copy,
+         lambda dataset: threshold_ndvi_data(dataset, LOWER_NDVI_THRESHOLD, UPPER_NDVI_THRESHOLD)),
+        ("compute_ndvi_statistics", copy, compute_ndvi_statistics),
+        ("resample_and_average_weekly", copy, resample_and_average_weekly),
+        ("compute_weighted_average", copy, compute_weighted_average),
+    ]
+
+
+def _rows(value) -> int:
+    return len(value) if isinstance(value, pd.DataFrame) else 0
+
+
+def benchmark_dataset(file_path: str, repeats: int = 3) -> list:
+    """
+    Time and memory-profile every pipeline stage on a dataset CSV file.
+
+    Each stage is timed `repeats` times (the best run is kept, to filter out scheduling noise), then run
+    once more under `tracemalloc` to measure its peak allocation above the memory held by its input.
+
+    Args:
+        file_path (str): Path to the CSV file containing the dataset.
+        repeats (int): Number of timed runs per stage.
+
+    Returns:
+        list: One dict per stage with its name, seconds, peak bytes and rows in/out.
+    """
+    results = []
+    output = None
+    for name, setup, run in _stages(file_path):
+        seconds = []
+        for _ in range(repeats):
+            stage_input = setup(output)
+            start = time.perf_counter()
+            run(stage_input)
+            seconds.append(time.perf_counter() - start)
+
+        stage_input = setup(output)
+        tracemalloc.start()
+        output = run(stage_input)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results.append({"stage": name, "seconds": min(seconds), "peak_bytes": peak_bytes,
+                        "rows_in": _rows(stage_input), "rows_out": _rows(output)})
+    return results
+
+
+def run_benchmarks(scales, repeats: int = 3, data_dir: str = None) -> dict:
+    """
+    Generate the synthetic dataset of each scale (reused if already present in `data_dir`) and benchmark it.
+
+    Args:
+        scales (list): Names of the scales to run (keys of `SCALES`).
+        repeats (int): Number of timed runs per stage.
+        data_dir (str): Directory of the generated datasets (a temporary directory if None).
+
+    Returns:
+        dict: Machine-readable results, with the environment and per-scale stage measurements.
+    """
+    data_dir = data_dir or tempfile.mkdtemp(prefix="ndvi_benchmarks_")
+    os.makedirs(data_dir, exist_ok=True)
+    results = {"python": platform.python_version(), "pandas": pd.__version__, "machine": platform.machine(),
+               "repeats": repeats, "scales": {}}
+    for scale in scales:
+        parameters = SCALES[scale]
+        file_path = os.path.join(data_dir, f"synthetic_{scale}.csv")
+        if not os.path.exists(file_path):
+            generate_synthetic_dataset(file_path, **parameters)
+        results["scales"][scale] = {"parameters": parameters, "file_bytes": os.path.getsize(file_path),
+                                    "stages": benchmark_dataset(file_path, repeats)}
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Compare results with a baseline produced by `run_benchmarks`.
+
+    A stage regresses when its time or peak memory grows by more than `tolerance` (relative) and by more
+    than the noise floors. Scales or stages missing from the baseline are not compared.
+
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for scale, scale_results in results["scales"].items():
+        baseline_stages = {stage["stage"]: stage for stage in baseline.get("scales", {}).get(scale, {}).get("stages", [])}
+        for stage in scale_results["stages"]:
+            reference = baseline_stages.get(stage["stage"])
+            if reference is None:
+                continue
+            for metric, floor in (("seconds", MIN_SECONDS_DELTA), ("peak_bytes", MIN_BYTES_DELTA)):
+                value, previous = stage[metric], reference[metric]
+                if value > previous * (1 + tolerance) and value - previous > floor:
+                    regressions.append(f"{scale}/{stage['stage']}: {metric} {previous:.4g} -> {value:.4g} "
+                                       f"(+{(value / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the NDVI pipeline stages on synthetic datasets.")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data-dir", help="Directory of the generated datasets (kept between runs)")
+    parser.add_argument("--output", help="JSON file to write the results to (printed if omitted)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.repeats, args.data_dir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    # Example usage (from the repository root):
+    #   python -m benchmarks.suite --output baseline.json
+    #   python -m benchmarks.suite --baseline baseline.json
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import datetime
+
+import numpy as np
+
+from Utils.load_dataset import DATASET_COLUMNS
+
+# Weeks of the season covered by the generated acquisitions (same range as the resampled dataset)
+SEASON_START_WEEK = 14
+SEASON_END_WEEK = 44
+SUPPLY_AREAS = ["Latina", "Viterbo", "Roma"]
+
+
+def _format_values(values: np.ndarray) -> str:
+    # JSON-like literal, with NaN written as null as in the exports. The exports hold float32 values written at
+    # float64 precision, so that the compact schema stores them losslessly (see Utils/schema.py)
+    return ",".join("null" if np.isnan(value) else repr(value) for value in values.astype(np.float32).tolist())
+
+
+def _block_mask(rng: np.random.Generator, n_pixels: int) -> np.ndarray:
+    """
+    Random elliptical block footprint with about `n_pixels` pixels, inside a bounding grid with a border of nulls.
+    """
+    side = int(np.ceil(np.sqrt(n_pixels * 4 / np.pi))) + 2
+    rows, cols = np.mgrid[0:side, 0:side]
+    center = (side - 1) / 2
+    aspect = rng.uniform(0.8, 1.25)
+    distance = ((rows - center) / aspect) ** 2 + ((cols - center) * aspect) ** 2
+    mask = np.zeros(side * side, dtype=bool)
+    mask[np.argsort(distance, axis=None, kind="stable")[:n_pixels]] = True
+    return mask.reshape(side, side)
+
+
+def generate_synthetic_dataset(output_path: str, n_orchards: int = 10, blocks_per_orchard: int = 2,
+                               seasons: int = 2, acquisitions_per_week: int = 1, pixels_per_block: int = 400,
+                               first_season: int = 2022, seed: int = 0) -> str:
+    """
+    Write a synthetic dataset CSV with the same columns and literal formats as the NDVI exports.
+
+    Every block gets a fixed footprint and a seasonal NDVI curve; each acquisition adds pixel noise and
+    clouds (whose pixels are written as null and left out of "Valid_NDVI_Data").
+
+    Args:
+        output_path (str): Path of the CSV file to write.
+        n_orchards (int): Number of orchards (KPIN).
+        blocks_per_orchard (int): Number of blocks per orchard.
+        seasons (int): Number of consecutive seasons (years), starting at `first_season`.
+        acquisitions_per_week (int): Number of acquisitions per block and week of the season (at most 7).
+        pixels_per_block (int): Number of pixels inside each block footprint.
+        first_season (int): Year of the first season.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        str: `output_path`.
+    """
+    if not 1 <= acquisitions_per_week <= 7:
+        raise ValueError("acquisitions_per_week must be between 1 and 7")
+    rng = np.random.default_rng(seed)
+
+    with open(output_path, "w") as f:
+        f.write(",".join(DATASET_COLUMNS) + "\n")
+        for orchard in range(n_orchards):
+            kpin = 1000 + orchard
+            area = SUPPLY_AREAS[orchard % len(SUPPLY_AREAS)]
+            for block in range(1, blocks_per_orchard + 1):
+                mask = _block_mask(rng, pixels_per_block)
+                hectares = rng.uniform(1.0, 8.0)
+                # Block vigour: peak NDVI and the pixel-to-pixel variability of the block
+                peak, spread = rng.uniform(0.55, 0.9), rng.uniform(0.05, 0.15)
+                pixel_offsets = rng.normal(0.0, spread, mask.shape)
+
+                for season in range(first_season, first_season + seasons):
+                    for week in range(SEASON_START_WEEK, SEASON_END_WEEK + 1):
+                        # Weekdays of this week's acquisitions
+                        weekdays = np.sort(rng.choice(7, size=acquisitions_per_week, replace=False)) + 1
+                        for weekday in weekdays:
+                            date = datetime.date.fromisocalendar(season, week, weekday)
+                            progress = (week - SEASON_START_WEEK) / (SEASON_END_WEEK - SEASON_START_WEEK)
+                            level = 0.25 + (peak - 0.25) * np.sin(np.pi * progress)
+                            ndvi = np.clip(level + pixel_offsets + rng.normal(0.0, 0.03, mask.shape), -1.0, 1.0)
+
+                            # Clouds cover a random share of the block on some acquisitions
+                            cloud_percentage = float(rng.choice([0.0, 0.0, 0.0, rng.uniform(0, 60)]).round(1))
+                            cloudy = rng.random(mask.shape) < cloud_percentage / 100
+                            ndvi[~mask | cloudy] = np.nan
+                            valid = ndvi[~np.isnan(ndvi)]
+                            return_code = 17.0 if cloud_percentage == 0 else float(rng.choice([18.0, 19.0]))
+
+                            matrix = "[" + ",".join(f"[{_format_values(row)}]" for row in ndvi) + "]"
+                            fields = [kpin, block, f"{kpin}_{block}", f"{kpin} - Orchard {orchard}",
+                                      date.isoformat(), date.year, date.month, week, date.day, "Italy", area,
+                                      "Lazio", f"{hectares:.4f}", "Gold3 (G3)", f'"{matrix}"',
+                                      f'"[{_format_values(valid)}]"', valid.size, cloud_percentage, return_code]
+                            f.write(",".join(str(field) for field in fields) + "\n")
+
+    return output_path
+
+
+if __name__ == "__main__":
+    # Example usage:
+    from Utils.load_dataset import load_dataset
+    path = generate_synthetic_dataset("../Satellite_NDVI_data_synthetic.csv", n_orchards=3, seasons=1)
+    dataset = load_dataset(path)
+    print(dataset.drop(columns=["NDVI_Data", "Valid_NDVI_Data"]).head())
+    print(dataset.shape, dataset["Number_Of_Valid_Pixels"].mean())
@@ -1,15 +1,21 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 
-from Utils.load_dataset import load_dataset
-from Utils.threshold_dataset import threshold_ndvi_data
-from Utils.compute_statistics import compute_ndvi_statistics
-from Utils.mean_weekly_resampling import resample_and_average_weekly
+from Utils.pipeline_cache import get_processed_dataset, get_return_code_options, load_dataset_shared
+from Utils.quality_filter import QualityFilter
+from Utils.partitioned_dataset import PartitionSelection, ensure_partitioned_dataset, partition_options, \
+    SOURCE_EXPORTS, DATASET_PATH
+from Utils.incremental_ingestion import start_dataset_watcher
+from Utils.instrumentation import stage, collect_stages, stage_records_frame
 
 from page_low_kvds import page_low_or_no_kvds
 from page_onset_kvds import page_onset_kvds
 from page_enstablished_kvds import page_established_kvds
+from page_threshold_sensitivity import page_threshold_sensitivity
+from Utils.threshold_sweep import DEFAULT_GRID_STEPS
+from Utils.area_screening import get_area_screening
 
 
 # Page Configuration
@@ -36,37 +42,124 @@ def sidebar():
             raise ValueError(
                 "Upper NDVI Threshold must be greater than or equal to the Lower NDVI Threshold.")
 
-        # Visualization Type Selection (Dropdown Menu)
-        visualization_options = ["Low or No KVDS", "Onset KVDS", "Established KVDS"]
-        selected_visualization = st.selectbox("Select Visualization Type", visualization_options)
-
-    return lower_ndvi_threshold, upper_ndvi_threshold, selected_visualization
+        # Threshold Sensitivity Mode: a whole grid of threshold pairs evaluated at once for the selected block
+        sensitivity_grid = None
+        if st.checkbox("Threshold Sensitivity Mode", value=False):
+            lower_range = st.slider("Lower NDVI Threshold Range", 0.0, 1.0, (0.0, 1.0), step=0.01)
+            upper_range = st.slider("Upper NDVI Threshold Range", 0.0, 1.0, (0.0, 1.0), step=0.01)
+            grid_steps = st.number_input("Grid Steps", min_value=2, max_value=100, value=DEFAULT_GRID_STEPS, step=1)
+            sensitivity_grid = (np.round(np.linspace(*lower_range, int(grid_steps)), 4),
+                                np.round(np.linspace(*upper_range, int(grid_steps)), 4))
+
+        # Data Selection: only the partitions of the selected areas and seasons are loaded
+        options = partition_options(DATASET_PATH)
+        with st.expander("Data Selection"):
+            selected_areas = st.multiselect("Supply Areas", options["areas"], default=options["areas"])
+            selected_seasons = st.multiselect("Seasons", options["seasons"], default=options["seasons"])
+        if not selected_areas or not selected_seasons:
+            st.warning("Select at least one Supply Area and one Season.")
+            raise ValueError("Select at least one Supply Area and one Season.")
+        # Everything selected means no partition pruning (same cache key as the default selection)
+        partitions = PartitionSelection(
+            areas=None if set(selected_areas) == set(options["areas"]) else selected_areas,
+            seasons=None if set(selected_seasons) == set(options["seasons"]) else selected_seasons)
+
+        # Scene Quality Filter: acquisitions failing it are dropped before their pixels are parsed
+        with st.expander("Scene Quality Filter"):
+            max_cloud_percentage = st.number_input("Max Cloud or Shadow Percentage", min_value=0.0, max_value=100.0,
+                                                   value=100.0, step=1.0)
+            return_code_options = get_return_code_options(DATASET_PATH)
+            allowed_return_codes = st.multiselect("Allowed Cloud or Shadow Return Codes", return_code_options,
+                                                  default=return_code_options)
+            min_valid_pixels = st.number_input("Min Number of Valid Pixels", min_value=0, value=0, step=1)
+        # All codes selected means no return code filtering (same cache key as the default filter)
+        if set(allowed_return_codes) == set(return_code_options):
+            allowed_return_codes = None
+        quality_filter = QualityFilter(max_cloud_percentage=float(max_cloud_percentage),
+                                       allowed_return_codes=allowed_return_codes,
+                                       min_valid_pixels=int(min_valid_pixels))
+
+        # Visualization Type Selection (Dropdown Menu), replaced by the sensitivity heatmap in sensitivity mode
+        if sensitivity_grid is None:
+            visualization_options = ["Low or No KVDS", "Onset KVDS", "Established KVDS", "Spatial View"]
+            selected_visualization = st.selectbox("Select Visualization Type", visualization_options)
+        else:
+            selected_visualization = "Threshold Sensitivity"
+
+        # Timing and memory of the pipeline stages run by this page load
+        show_diagnostics = st.checkbox("Show Diagnostics", value=False)
+
+    return lower_ndvi_threshold, upper_ndvi_threshold, sensitivity_grid, partitions, quality_filter, \
+        selected_visualization, show_diagnostics
+
+
+def diagnostics_panel(records):
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        if not records:
+            st.write("No stage was measured.")
+            return
+        st.dataframe(stage_records_frame(records), hide_index=True)
 
 
 # Determine which page to load
 def main():
 
-    # Load the dataset
-    dataset_df = load_dataset("./Satellite_NDVI_data_construction_2.csv")
+    # Merge new or changed exports into the partitioned dataset (only the partitions they touch are rewritten)
+    ensure_partitioned_dataset(DATASET_PATH, SOURCE_EXPORTS)
+    # Background merge and refresh when the source exports change (started once per process)
+    start_dataset_watcher(DATASET_PATH, source_paths=SOURCE_EXPORTS)
 
     # Sidebar for input parameters
-    lower_ndvi_threshold, upper_ndvi_threshold, selected_visualization = sidebar()
+    lower_ndvi_threshold, upper_ndvi_threshold, sensitivity_grid, partitions, quality_filter, \
+        selected_visualization, show_diagnostics = sidebar()
+
+    if show_diagnostics:
+        with collect_stages() as records:
+            run_pipeline_and_page(lower_ndvi_threshold, upper_ndvi_threshold, sensitivity_grid, partitions,
+                                  quality_filter, selected_visualization)
+        diagnostics_panel(records)
+    else:
+        run_pipeline_and_page(lower_ndvi_threshold, upper_ndvi_threshold, sensitivity_grid, partitions,
+                              quality_filter, selected_visualization)
+
 
+def run_pipeline_and_page(lower_ndvi_threshold, upper_ndvi_threshold, sensitivity_grid, partitions, quality_filter,
+                          selected_visualization):
     ########## Data Preprocessing ##########
-    # Apply NDVI thresholding
-    dataset = threshold_ndvi_data(dataset_df, lower_ndvi_threshold, upper_ndvi_threshold)
-    # Compute NDVI statistics
-    dataset = compute_ndvi_statistics(dataset)
-    # Resample weekly for visualization
-    dataset = resample_and_average_weekly(dataset)
+    # Load the dataset, apply NDVI thresholding, compute NDVI statistics and resample weekly for visualization.
+    # The loaded dataset and the processed datasets are cached and shared by all sessions (see Utils/pipeline_cache.py)
+    with stage("get_processed_dataset") as record:
+        processed_dataset = get_processed_dataset(DATASET_PATH, lower_ndvi_threshold, upper_ndvi_threshold,
+                                                  quality_filter, partitions)
+        record.rows_out = len(processed_dataset.weekly)
+    dataset = processed_dataset.weekly
+    area_statistics = processed_dataset.area_statistics
+    selection_index = processed_dataset.selection_index
+    data_key = processed_dataset.cache_key
 
     ########## Page Navigation ##########
-    if selected_visualization == "Low or No KVDS":
-        page_low_or_no_kvds(dataset)
-    elif selected_visualization == "Onset KVDS":
-        page_onset_kvds(dataset)
-    elif selected_visualization == "Established KVDS":
-        page_established_kvds(dataset)
+    with stage(f"page: {selected_visualization}", rows_in=dataset):
+        if selected_visualization == "Low or No KVDS":
+            page_low_or_no_kvds(selection_index, area_statistics, data_key)
+        elif selected_visualization == "Onset KVDS":
+            page_onset_kvds(selection_index, data_key)
+        elif selected_visualization == "Established KVDS":
+            with stage("get_area_screening") as record:
+                area_screening = get_area_screening(processed_dataset)
+                record.rows_out = len(area_screening)
+            page_established_kvds(selection_index, area_screening)
+        elif selected_visualization == "Threshold Sensitivity":
+            # The sweep runs on the acquisitions, shared with the processed dataset above
+            shared_dataset = load_dataset_shared(DATASET_PATH, quality_filter, partitions)
+            page_threshold_sensitivity(selection_index, shared_dataset, lower_ndvi_threshold, upper_ndvi_threshold,
+                                       *sensitivity_grid, data_key)
+        elif selected_visualization == "Spatial View":
+            # Imported here, so the other pages never load the spatial view nor convert the NDVI matrices
+            from page_spatial_view import page_spatial_view
+            from Utils.spatial_tiles import get_spatial_source
+            with stage("get_spatial_source"):
+                spatial_source = get_spatial_source(DATASET_PATH, quality_filter, partitions)
+            page_spatial_view(selection_index, spatial_source, lower_ndvi_threshold, upper_ndvi_threshold)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,54 @@
 import streamlit as st
 
-def page_established_kvds(dataset):
+visualization_description = "Ranking of the blocks of the selected area by how far their average NDVI values of "\
+                            "green and yellow pixels drift from the other blocks of the area, week by week. "\
+                            "Score is the mean absolute rolling z-score, higher values are more anomalous."
+
+
+def page_established_kvds(selection_index, area_screening):
     st.title("Established KVDS")
-    st.markdown(f"**Description:** To be added later.")
+    st.markdown(f"**Description:** {visualization_description}")
 
     # KPIN and Block selection
     col1, col2 = st.columns(2)
     with col1:
-        kpin_options = sorted(dataset["KPIN"].unique())
+        kpin_options = selection_index.kpins
         selected_kpin = st.selectbox("Select KPIN", kpin_options)
     with col2:
-        filtered_blocks = dataset[dataset["KPIN"] == selected_kpin]["Block_Name"].unique()
+        filtered_blocks = selection_index.kpin_blocks.get(selected_kpin, [])
         selected_block = st.selectbox("Select Block", filtered_blocks)
+    selected_primary_key = f"{selected_kpin}_{selected_block}"
+
+    # Area and Season selection, the area defaults to the one of the selected block
+    col1, col2 = st.columns(2)
+    with col1:
+        area_options = selection_index.areas
+        selected_area_default = selection_index.block_areas.get(selected_primary_key)
+        selected_area = st.selectbox("Select Area", area_options if len(area_options) > 0 else ["No Areas Available"],
+                                     index=area_options.index(
+                                         selected_area_default) if selected_area_default in area_options else 0)
+    with col2:
+        season_options = selection_index.seasons
+        selected_season = st.selectbox("Select Season",
+                                       season_options if len(season_options) > 0 else ["No Seasons Available"])
+
+    # Screening of the blocks of the area, precomputed for all areas and seasons (sorted by Score)
+    ranking = area_screening[(area_screening["Supply_Area_Name"] == selected_area) &
+                             (area_screening["Year"] == selected_season)]
+    if ranking.empty:
+        st.warning("No screening available for the selected area and season.")
+        return
+
+    rank = ranking.index[ranking["Primary_Key"] == selected_primary_key]
+    if len(rank):
+        position = ranking.index.get_loc(rank[0]) + 1
+        st.markdown(f"KPIN: {selected_kpin}, Block: {selected_block} ranks **{position}** of {len(ranking)} blocks "
+                    f"in {selected_area}, Season: {selected_season}.")
 
-    # Plot
\ No newline at end of file
+    # Sortable ranking table
+    st.dataframe(ranking.drop(columns=["Supply_Area_Name", "Year"]), hide_index=True,
+                 column_config={"Score": st.column_config.NumberColumn(format="%.2f"),
+                                "Green_Z": st.column_config.NumberColumn(format="%.2f"),
+                                "Yellow_Z": st.column_config.NumberColumn(format="%.2f"),
+                                "Green_Deviation": st.column_config.NumberColumn(format="%.3f"),
+                                "Yellow_Deviation": st.column_config.NumberColumn(format="%.3f")})
@@ -0,0 +1,46 @@
+import streamlit as st
+import pandas as pd
+from select_kpin_block import select_kpin_and_block
+from Utils.instrumentation import stage
+from Utils.mean_weekly_resampling import NDVI_CLASSES
+from Utils.threshold_statistics import NDVI_CLASS_INDEX
+from Utils.spatial_tiles import get_block_tile, block_weeks, NDVI_RANGE
+
+visualization_description = "Pixel layout of the selected field week by week: the average NDVI of every pixel, "\
+                            "and the pixels classified as green, yellow or red with the current NDVI thresholds."
+
+
+def page_spatial_view(selection_index, spatial_source, lower_ndvi_threshold, upper_ndvi_threshold):
+    st.title("Spatial View")
+    st.markdown(f"**Description:** {visualization_description}")
+
+    # KPIN and Block selection
+    selected_kpin, selected_block, selected_primary_key = select_kpin_and_block(selection_index)
+    season_options = selection_index.block_seasons.get(selected_primary_key, [])
+    if not season_options:
+        st.warning("No data available for the selected KPIN and Block.")
+        return
+    selected_season = st.selectbox("Select Season", season_options)
+
+    # Week selection among the weeks of the season with acquisitions (tiles already seen are served from the cache)
+    weeks = block_weeks(spatial_source, selected_primary_key, selected_season)
+    if not len(weeks):
+        st.warning("No NDVI matrix available for the selected KPIN, Block and Season.")
+        return
+    week_labels = pd.DatetimeIndex(weeks).strftime("%Y-%m-%d").tolist()
+    selected_week = st.select_slider("Select Week", week_labels) if len(week_labels) > 1 else week_labels[0]
+
+    with stage("get_block_tile"):
+        tile = get_block_tile(spatial_source, selected_primary_key, weeks[week_labels.index(selected_week)],
+                              lower_ndvi_threshold, upper_ndvi_threshold)
+
+    st.markdown(f"**KPIN:** {selected_kpin}, **Block:** {selected_block}, **Week:** {selected_week} "
+                f"({tile.acquisitions} acquisition{'s' if tile.acquisitions > 1 else ''})")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.image(tile.ndvi_png, width="stretch",
+                 caption=f"Mean NDVI, from red ({NDVI_RANGE[0]:.1f} or less) to green ({NDVI_RANGE[1]:.1f})")
+    with col2:
+        shares = ", ".join(f"{name} {tile.class_shares[NDVI_CLASS_INDEX[name]]:.0%}" for name in NDVI_CLASSES)
+        st.image(tile.classes_png, width="stretch",
+                 caption=f"NDVI Pixels (thresholds {lower_ndvi_threshold:.2f} / {upper_ndvi_threshold:.2f}): {shares}")
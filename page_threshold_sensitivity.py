@@ -0,0 +1,69 @@
+import warnings
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+from select_kpin_block import select_kpin_and_block
+from Utils.instrumentation import stage
+from Utils.kvds_figures import build_threshold_sensitivity_figure
+from Utils.figure_cache import cached_figure_png
+from Utils.mean_weekly_resampling import NDVI_CLASSES
+from Utils.threshold_sweep import get_block_sweep
+
+visualization_description = "Sensitivity of the selected field to the NDVI thresholds: the number of pixels or "\
+                            "the average NDVI values of a pixel category for the whole grid of lower and upper "\
+                            "thresholds set in the sidebar, computed in a single pass over the pixels."
+
+STATISTICS = {"Number of Pixels": "counts", "Mean NDVI": "means"}
+SEASON_AVERAGE = "Season Average"
+
+
+def page_threshold_sensitivity(selection_index, shared_dataset, lower_ndvi_threshold, upper_ndvi_threshold,
+                               lower_values, upper_values, data_key):
+    st.title("Threshold Sensitivity")
+    st.markdown(f"**Description:** {visualization_description}")
+
+    # KPIN and Block selection
+    selected_kpin, selected_block, selected_primary_key = select_kpin_and_block(selection_index)
+    season_options = selection_index.block_seasons.get(selected_primary_key, [])
+    if not season_options:
+        st.warning("No data available for the selected KPIN and Block.")
+        return
+
+    # Season, pixel category and statistic selection
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_season = st.selectbox("Select Season", season_options)
+    with col2:
+        selected_class = st.selectbox("Select NDVI Pixels", NDVI_CLASSES)
+    with col3:
+        selected_statistic = st.selectbox("Select Statistic", list(STATISTICS))
+
+    # Every pair of the grid in one batched pass over the pixels of the block (cached per block and grid)
+    with stage("threshold_sweep"):
+        sweep = get_block_sweep(shared_dataset, selected_primary_key, lower_values, upper_values)
+    if not len(sweep.pairs):
+        st.warning("No threshold pair of the grid has a Lower NDVI Threshold below the Upper NDVI Threshold.")
+        return
+
+    # Week selection among the weeks of the season with acquisitions
+    season_weeks = np.flatnonzero(sweep.weeks.get_level_values("Year") == selected_season)
+    week_labels = pd.DatetimeIndex(sweep.year_weeks[season_weeks]).strftime("%Y-%m-%d").tolist()
+    selected_week = st.select_slider("Select Week", [SEASON_AVERAGE] + week_labels)
+    weeks = season_weeks if selected_week == SEASON_AVERAGE else season_weeks[[week_labels.index(selected_week)]]
+
+    # Average over the selected weeks (classes empty in every week stay blank)
+    values = sweep.class_values(selected_class, STATISTICS[selected_statistic])[:, 0, weeks]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        values = np.nanmean(values, axis=1)
+
+    with stage("render_figure"):
+        figure_png = cached_figure_png(
+            ("Threshold Sensitivity", selected_primary_key, selected_season, selected_class, selected_statistic,
+             selected_week, tuple(lower_values), tuple(upper_values), data_key),
+            lambda: build_threshold_sensitivity_figure(
+                lower_values, upper_values, sweep.pairs, values, f"{selected_statistic} ({selected_class} Pixels)",
+                lower_ndvi_threshold, upper_ndvi_threshold,
+                f"KPIN: {selected_kpin}, Block: {selected_block}, Season: {selected_season}, {selected_week}"))
+    st.image(figure_png, width="stretch")
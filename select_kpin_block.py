@@ -1,25 +1,25 @@
 import streamlit as st
 
-def select_kpin_and_block(dataset):
+def select_kpin_and_block(selection_index):
     """
     Creates a Streamlit UI for selecting a KPIN and Block from the dataset.
 
     Args:
-        dataset (pd.DataFrame): The dataset containing 'Orchard_Name', 'KPIN', and 'Block_Name' columns.
+        selection_index (SelectionIndex): Selection index of the dataset (see Utils/selection_index.py).
 
     Returns:
         tuple: A tuple containing the selected KPIN, Block, and Primary Key.
     """
     col1, col2 = st.columns(2)
     with col1:
-        orchard_options = dataset["Orchard_Name"].dropna().unique()
+        orchard_options = selection_index.orchards
         if len(orchard_options) == 0:
             st.warning("No orchards available in the dataset.")
             return None, None, None
-        selected_orchard = st.selectbox("Select Orchard", sorted(orchard_options))
-        selected_kpin = int(selected_orchard.replace("_", " ").split("-")[0])
+        selected_orchard = st.selectbox("Select Orchard", orchard_options)
+        selected_kpin = selection_index.orchard_kpins[selected_orchard]
     with col2:
-        filtered_blocks = dataset[dataset["KPIN"] == selected_kpin]["Block_Name"].unique()
+        filtered_blocks = selection_index.kpin_blocks.get(selected_kpin, [])
         selected_block = st.selectbox("Select Block",
                                       filtered_blocks if len(filtered_blocks) > 0 else ["No Blocks Available"])
     selected_primary_key = f"{selected_kpin}_{selected_block}"
@@ -0,0 +1,68 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+
+from Utils.pipeline_cache import LRUCache
+from Utils.mean_weekly_resampling import WEEKLY_COLUMNS
+
+# Columns shown in the tables: the scalar weekly columns (internal codes and pixel arrays are never sent)
+TABLE_COLUMNS = ["Year_Week"] + WEEKLY_COLUMNS
+# Rows per table page, larger selections are paginated on the server
+DEFAULT_PAGE_SIZE = 100
+
+# Arrow tables of the displayed pages, serialized once per selection
+_serialized_tables = LRUCache(32 << 20, sizeof=lambda table: table.nbytes)
+
+
+def project_table(dataset: pd.DataFrame) -> pd.DataFrame:
+    """
+    Project a weekly dataset on its scalar display columns, with Arrow-friendly dtypes.
+
+    Object columns holding arrays are dropped, Python dates become datetimes and all-missing object
+    columns (the metadata of the area aggregation) become float NaN.
+    """
+    table = dataset[[column for column in dataset.columns if column in TABLE_COLUMNS]].copy()
+    for column in table.columns[table.dtypes == object]:
+        values = table[column]
+        if values.map(lambda value: isinstance(value, np.ndarray)).any():
+            table = table.drop(columns=column)
+        elif column == "Acquisition_Date":
+            table[column] = pd.to_datetime(values)
+        else:
+            table[column] = values.infer_objects()
+    return table
+
+
+def _serialize_page(cache_key: tuple, dataset: pd.DataFrame, columns: tuple, page: int, page_size: int) -> pa.Table:
+    def serialize():
+        rows = project_table(dataset.iloc[page * page_size:(page + 1) * page_size])
+        return pa.Table.from_pandas(rows[[column for column in columns if column in rows.columns]],
+                                    preserve_index=False)
+
+    return _serialized_tables.get_or_compute((cache_key, columns, page, page_size), serialize)
+
+
+def show_table(dataset: pd.DataFrame, name: str, cache_key: tuple, page_size: int = DEFAULT_PAGE_SIZE):
+    """
+    Display a weekly dataset as a lean table: scalar columns only, a column choice, and server-side
+    pagination when it has more than `page_size` rows.
+
+    Args:
+        dataset (pd.DataFrame): Weekly dataset to display.
+        name (str): Unique name of the table in the page (used for the widget keys).
+        cache_key (tuple): Identifies the content of `dataset` (selection and data key), the serialized
+            pages are reused while it does not change.
+        page_size (int): Maximum number of rows sent at once.
+    """
+    available_columns = [column for column in dataset.columns if column in TABLE_COLUMNS]
+    with st.expander("Table columns"):
+        columns = st.multiselect("Columns", available_columns, default=available_columns, key=f"{name}_columns")
+
+    page = 0
+    n_pages = max(int(np.ceil(len(dataset) / page_size)), 1)
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages}, {len(dataset)} rows)", min_value=1, max_value=n_pages, value=1,
+                               step=1, key=f"{name}_page") - 1
+
+    st.dataframe(_serialize_page(cache_key, dataset, tuple(columns), page, page_size), hide_index=True)
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from Utils.load_dataset import load_dataset
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sample exports shipped with the repository
+CONSTRUCTION_CSV = os.path.join(REPO_ROOT, "Satellite_NDVI_data_construction.csv")
+CONSTRUCTION_2_CSV = os.path.join(REPO_ROOT, "Satellite_NDVI_data_construction_2.csv")
+
+
+@pytest.fixture(scope="session")
+def construction_dataset():
+    # Loaded once per test session, tests must work on copies (most pipeline steps add columns in place)
+    return load_dataset(CONSTRUCTION_CSV)
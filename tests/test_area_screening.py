@@ -0,0 +1,24 @@
+import numpy as np
+
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.area_screening import get_area_screening, SCREENING_COLUMNS
+from Utils.compute_area_aggregation import compute_weighted_average_excluding
+from conftest import CONSTRUCTION_2_CSV
+
+
+def test_deviations_match_leave_one_out_area_aggregation():
+    processed = get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55)
+    screening = get_area_screening(processed)
+    assert screening.columns.tolist() == SCREENING_COLUMNS
+    assert screening["Score"].dropna().is_monotonic_decreasing
+
+    weekly = processed.weekly
+    compared = screening.dropna(subset=["Green_Deviation"])
+    assert len(compared)
+    for row in compared.itertuples():
+        block = weekly[(weekly["Primary_Key"] == row.Primary_Key) & (weekly["Year"] == row.Year)]
+        area = compute_weighted_average_excluding(processed.area_statistics, row.Supply_Area_Name, row.Year,
+                                                  row.Primary_Key)
+        merged = block.merge(area, on="Week", suffixes=("", "_Area"))
+        expected = (merged["Mean_Green_Pixels"] - merged["Mean_Green_Pixels_Area"]).astype(float).mean()
+        assert np.isclose(row.Green_Deviation, expected), (row.Primary_Key, row.Year)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_2_CSV
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.mean_weekly_resampling import NDVI_CLASSES
+from Utils.compute_area_aggregation import compute_weighted_average, compute_weighted_average_excluding, \
+    build_area_statistics, update_area_statistics
+
+COMPARED_COLUMNS = ["Year", "Week", "Year_Week"] + [f"{name}_NDVI_Pixels_Number" for name in NDVI_CLASSES] + \
+                   [f"Mean_{name}_Pixels" for name in NDVI_CLASSES]
+
+
+@pytest.fixture(scope="module")
+def processed():
+    return get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55)
+
+
+def _block_area_seasons(weekly):
+    rows = weekly.dropna(subset=["Supply_Area_Name"])[["Primary_Key", "Supply_Area_Name", "Year"]]
+    return list(rows.astype({"Primary_Key": str, "Supply_Area_Name": str}).drop_duplicates().itertuples(index=False))
+
+
+def test_leave_one_out_matches_filtering_the_weekly_dataset(processed):
+    weekly = processed.weekly
+    combinations = _block_area_seasons(weekly)
+    assert len(combinations) > 10
+    for primary_key, area, season in combinations:
+        # Baseline: the rows of the other blocks of the area and season, grouped again
+        comparison = weekly[(weekly["Supply_Area_Name"] == area) & (weekly["Primary_Key"] != primary_key) &
+                            (weekly["Year"] == season)]
+        fast = compute_weighted_average_excluding(processed.area_statistics, area, season, primary_key)
+        if comparison.empty:
+            assert fast.empty
+            continue
+        expected = compute_weighted_average(comparison)[COMPARED_COLUMNS].reset_index(drop=True)
+        actual = fast[COMPARED_COLUMNS].reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual.astype({"Year": np.int64, "Week": np.int64}),
+                                      expected.astype({"Year": np.int64, "Week": np.int64}),
+                                      check_exact=False, rtol=1e-9, atol=1e-9)
+
+
+def test_unknown_area_gives_an_empty_aggregation(processed):
+    assert compute_weighted_average_excluding(processed.area_statistics, "Nowhere", 2024, "0_0").empty
+
+
+def test_update_matches_a_full_build(processed):
+    weekly = processed.weekly
+    seasons = pd.MultiIndex.from_frame(weekly[["Primary_Key", "Year"]].astype({"Primary_Key": str})
+                                       .drop_duplicates().iloc[::3])
+    replaced = pd.MultiIndex.from_frame(weekly[["Primary_Key", "Year"]].astype({"Primary_Key": str})).isin(seasons)
+    updated = update_area_statistics(build_area_statistics(weekly[~replaced]), weekly[replaced], seasons)
+    full = build_area_statistics(weekly)
+    pd.testing.assert_frame_equal(updated.totals, full.totals, check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(updated.contributions, full.contributions, check_exact=False, rtol=1e-9)
@@ -0,0 +1,49 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+
+from Utils.figure_cache import cached_figure_png, configure_figure_cache, figure_cache_stats, _rendered_figures
+
+
+@pytest.fixture
+def figure_cache():
+    max_bytes = _rendered_figures.max_bytes
+    _rendered_figures.clear()
+    yield
+    configure_figure_cache(max_bytes)
+    _rendered_figures.clear()
+
+
+def _builder(built, label):
+    def build_figure():
+        fig, ax = plt.subplots(figsize=(2, 2))
+        ax.plot([0, 1], [0, 1], label=label)
+        built.append(fig)
+        return fig
+    return build_figure
+
+
+def test_hits_return_the_same_bytes_without_rebuilding(figure_cache):
+    built = []
+    first = cached_figure_png(("page", "a"), _builder(built, "a"))
+    second = cached_figure_png(("page", "a"), _builder(built, "a"))
+    assert first.startswith(b"\x89PNG") and second == first
+    assert len(built) == 1
+    # Encoded figures are closed, they hold no matplotlib memory
+    assert not plt.fignum_exists(built[0].number)
+    assert figure_cache_stats()["hits"] >= 1
+
+
+def test_figures_past_the_budget_are_evicted(figure_cache):
+    built = []
+    size = len(cached_figure_png(("page", "a"), _builder(built, "a")))
+    evictions = figure_cache_stats()["evictions"]
+    configure_figure_cache(size * 3 // 2)
+    cached_figure_png(("page", "b"), _builder(built, "b"))
+    assert figure_cache_stats()["evictions"] == evictions + 1
+    assert _rendered_figures.keys() == [("page", "b")]
+
+    # The evicted figure is built again
+    cached_figure_png(("page", "a"), _builder(built, "a"))
+    assert len(built) == 3
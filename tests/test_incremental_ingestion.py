@@ -0,0 +1,85 @@
+import pandas as pd
+
+from conftest import CONSTRUCTION_2_CSV
+from Utils.incremental_ingestion import DatasetWatcher
+from Utils.instrumentation import collect_stages
+from Utils.pipeline_cache import get_processed_dataset, refresh_dataset_shared
+from Utils.quality_filter import QualityFilter
+
+
+def test_appended_rows_match_a_full_load(tmp_path):
+    source = pd.read_csv(CONSTRUCTION_2_CSV, dtype=str, keep_default_na=False)
+    file_path = str(tmp_path / "dataset.csv")
+    source.iloc[:300].to_csv(file_path, index=False)
+    first = get_processed_dataset(file_path, 0.3, 0.55)
+
+    source.to_csv(file_path, index=False)
+    assert refresh_dataset_shared(file_path)
+    incremental = get_processed_dataset(file_path, 0.3, 0.55)
+    assert len(incremental.weekly) > len(first.weekly)
+
+    full_path = str(tmp_path / "full.csv")
+    source.to_csv(full_path, index=False)
+    full = get_processed_dataset(full_path, 0.3, 0.55)
+    pd.testing.assert_frame_equal(incremental.weekly, full.weekly, check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental.area_statistics.totals, full.area_statistics.totals,
+                                  check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental.area_statistics.contributions, full.area_statistics.contributions,
+                                  check_exact=False, rtol=1e-9)
+
+
+def test_rewritten_file_is_reloaded(tmp_path):
+    source = pd.read_csv(CONSTRUCTION_2_CSV, dtype=str, keep_default_na=False)
+    file_path = str(tmp_path / "dataset.csv")
+    source.to_csv(file_path, index=False)
+    get_processed_dataset(file_path, 0.3, 0.55)
+
+    # Rows removed: the processed acquisitions are no longer all in the file
+    source.iloc[100:].to_csv(file_path, index=False)
+    refresh_dataset_shared(file_path)
+    reloaded = get_processed_dataset(file_path, 0.3, 0.55)
+    full_path = str(tmp_path / "full.csv")
+    source.iloc[100:].to_csv(full_path, index=False)
+    pd.testing.assert_frame_equal(reloaded.weekly, get_processed_dataset(full_path, 0.3, 0.55).weekly)
+
+
+def test_refreshing_one_selection_keeps_the_others(tmp_path):
+    source = pd.read_csv(CONSTRUCTION_2_CSV, dtype=str, keep_default_na=False)
+    file_path = str(tmp_path / "dataset.csv")
+    source.iloc[:300].to_csv(file_path, index=False)
+    cloudless = QualityFilter(max_cloud_percentage=50)
+    get_processed_dataset(file_path, 0.3, 0.55)
+    get_processed_dataset(file_path, 0.3, 0.55, quality_filter=cloudless)
+
+    # A page load of the first selection ingests the new rows before the other selection is refreshed
+    source.to_csv(file_path, index=False)
+    get_processed_dataset(file_path, 0.3, 0.55)
+    assert refresh_dataset_shared(file_path)
+    with collect_stages() as records:
+        incremental = get_processed_dataset(file_path, 0.3, 0.55, quality_filter=cloudless)
+    # Updated with the new rows by the refresh, not computed again
+    assert not records
+
+    full_path = str(tmp_path / "full.csv")
+    source.to_csv(full_path, index=False)
+    full = get_processed_dataset(full_path, 0.3, 0.55, quality_filter=cloudless)
+    pd.testing.assert_frame_equal(incremental.weekly, full.weekly, check_exact=False, rtol=1e-9)
+
+
+def test_watcher_refreshes_only_after_a_change(tmp_path):
+    source = pd.read_csv(CONSTRUCTION_2_CSV, dtype=str, keep_default_na=False)
+    file_path = str(tmp_path / "dataset.csv")
+    source.iloc[:300].to_csv(file_path, index=False)
+    get_processed_dataset(file_path, 0.3, 0.55)
+
+    watcher = DatasetWatcher(file_path)
+    assert not watcher.poll()
+    assert not watcher.poll()
+    assert watcher.refreshes == 0
+
+    source.to_csv(file_path, index=False)
+    # Picked up once the file has settled for a poll
+    assert not watcher.poll()
+    assert watcher.poll()
+    assert not watcher.poll()
+    assert watcher.refreshes == 1
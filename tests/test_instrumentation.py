@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from Utils.instrumentation import stage, collect_stages, configure_instrumentation, stage_records_frame, \
+    _NULL_STAGE, _config
+
+
+@pytest.fixture
+def restore_configuration():
+    previous = (_config.enabled, _config.log_path, _config.trace_memory)
+    yield
+    _config.enabled, _config.log_path, _config.trace_memory = previous
+
+
+def test_stages_record_rows_and_nesting():
+    with collect_stages() as records:
+        with stage("outer", rows_in=[1, 2, 3]) as outer:
+            with stage("inner", rows_in=5) as inner:
+                inner.rows_out = 4
+                buffer = bytearray(1 << 20)
+            outer.rows_out = len(buffer)
+    assert [record.stage for record in records] == ["inner", "outer"]
+    inner, outer = records
+    assert (inner.rows_in, inner.rows_out, inner.depth) == (5, 4, 1)
+    assert (outer.rows_in, outer.rows_out, outer.depth) == (3, 1 << 20, 0)
+    assert outer.wall_seconds >= inner.wall_seconds >= 0
+    # The enclosing stage peaks at least as high as the nested allocation
+    assert outer.peak_bytes >= inner.peak_bytes >= 1 << 20
+
+    frame = stage_records_frame(records)
+    assert list(frame["stage"]) == ["outer", "  inner"]
+
+
+def test_disabled_stages_are_shared_no_ops(restore_configuration):
+    configure_instrumentation(enabled=False)
+    context = stage("noop", rows_in=[1])
+    assert context is _NULL_STAGE
+    with context as record:
+        record.rows_out = 1
+    assert not hasattr(record, "rows_out")
+
+
+def test_enabled_stages_are_logged(restore_configuration, tmp_path):
+    log_path = tmp_path / "stages.jsonl"
+    configure_instrumentation(enabled=True, log_path=str(log_path), trace_memory=False)
+    with stage("logged", rows_in=2) as record:
+        record.rows_out = 1
+    (line,) = log_path.read_text().splitlines()
+    logged = json.loads(line)
+    assert (logged["stage"], logged["rows_in"], logged["rows_out"], logged["peak_bytes"]) == ("logged", 2, 1, None)
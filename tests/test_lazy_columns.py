@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_CSV
+from Utils.load_dataset import load_dataset, PIXEL_COLUMNS, APP_COLUMNS
+from Utils.lazy_columns import LazyNDVIArray
+from Utils.ndvi_store import convert_csv_to_store
+from Utils.quality_filter import QualityFilter
+
+
+def _assert_lazy_values(lazy, eager):
+    pd.testing.assert_index_equal(lazy.index, eager.index)
+    for handle, pixels in zip(lazy, eager):
+        assert isinstance(handle, LazyNDVIArray)
+        np.testing.assert_array_equal(handle.load(), pixels)
+        np.testing.assert_array_equal(np.asarray(handle), pixels)
+
+
+@pytest.mark.parametrize("column", PIXEL_COLUMNS)
+def test_lazy_csv_column_matches_eager_parsing(construction_dataset, column):
+    lazy = load_dataset(CONSTRUCTION_CSV, lazy_columns=[column])
+    _assert_lazy_values(lazy[column], construction_dataset[column])
+    assert list(lazy.columns) == list(construction_dataset.columns)
+
+
+def test_lazy_column_of_filtered_rows(construction_dataset):
+    quality_filter = QualityFilter(max_cloud_percentage=10)
+    lazy = load_dataset(CONSTRUCTION_CSV, lazy_columns=["NDVI_Data"], quality_filter=quality_filter)
+    eager = load_dataset(CONSTRUCTION_CSV, quality_filter=quality_filter)
+    assert len(lazy) < len(construction_dataset)
+    _assert_lazy_values(lazy["NDVI_Data"], eager["NDVI_Data"])
+
+
+def test_lazy_store_column_matches_eager_parsing(construction_dataset, tmp_path):
+    store_dir = convert_csv_to_store(CONSTRUCTION_CSV, str(tmp_path / "construction.ndvi"))
+    lazy = load_dataset(store_dir, lazy_columns=PIXEL_COLUMNS)
+    for column in PIXEL_COLUMNS:
+        _assert_lazy_values(lazy[column], construction_dataset[column])
+
+
+def test_projected_columns_skip_the_matrices():
+    dataset = load_dataset(CONSTRUCTION_CSV, columns=APP_COLUMNS)
+    assert list(dataset.columns) == APP_COLUMNS
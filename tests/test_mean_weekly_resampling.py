@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Utils.threshold_dataset import threshold_ndvi_data
+from Utils.compute_statistics import compute_ndvi_statistics
+from Utils.mean_weekly_resampling import resample_and_average_weekly, weekly_sufficient_statistics, \
+    combine_weekly_statistics, finalize_weekly_statistics, static_attributes, STATIC_COLUMNS, MIN_COLUMNS, \
+    MEAN_COLUMNS, NDVI_CLASSES, WEEKLY_COLUMNS, PREDEFINED_START_WEEK, PREDEFINED_END_WEEK
+
+
+def reference_resample_and_average_weekly(dataset):
+    # Original groupby/lambda implementation of `resample_and_average_weekly`
+    weekly_means = dataset.groupby(["Primary_Key", "Year", "Week"]).agg({
+        **{column: lambda x: x.mode().iloc[0] if not x.mode().empty else np.nan for column in STATIC_COLUMNS},
+        **{column: lambda x: x.min() if not x.empty else np.nan for column in MIN_COLUMNS},
+        **{f"Mean_{name}_Pixels": lambda x, name=name: (
+            (x * dataset.loc[x.index, f"{name}_NDVI_Pixels_Number"]).sum() /
+            dataset.loc[x.index, f"{name}_NDVI_Pixels_Number"].sum()
+            if dataset.loc[x.index, f"{name}_NDVI_Pixels_Number"].sum() > 0 else np.nan
+        ) for name in NDVI_CLASSES},
+        **{column: 'mean' for column in MEAN_COLUMNS},
+    }).reset_index()[WEEKLY_COLUMNS]
+
+    weekly_means["Year_Week"] = pd.to_datetime(
+        weekly_means["Year"].astype(str) + "-" + weekly_means["Week"].astype(str) + "-1", format="%Y-%W-%w")
+
+    complete_weeks = []
+    for (primary_key, year), group in weekly_means.groupby(["Primary_Key", "Year"]):
+        start_date = pd.to_datetime(f"{year}-{PREDEFINED_START_WEEK}-1", format="%Y-%W-%w")
+        end_date = pd.to_datetime(f"{year}-{PREDEFINED_END_WEEK}-1", format="%Y-%W-%w")
+        all_weeks = pd.date_range(start=start_date, end=end_date, freq="W-MON")
+        complete_weeks.append(pd.DataFrame({"Primary_Key": primary_key, "Year_Week": all_weeks}))
+    complete_weeks_df = pd.concat(complete_weeks, ignore_index=True)
+
+    resampled_dataset = pd.merge(complete_weeks_df, weekly_means, on=["Primary_Key", "Year_Week"], how="left")
+    resampled_dataset["Year"] = resampled_dataset["Year_Week"].dt.year
+    resampled_dataset["Week"] = resampled_dataset["Year_Week"].dt.isocalendar().week
+    resampled_dataset["KPIN"] = resampled_dataset["Primary_Key"].str.split("_").str[0].astype(int)
+    resampled_dataset["Block_Name"] = resampled_dataset["Primary_Key"].str.split("_").str[1]
+
+    return resampled_dataset
+
+
+def acquisition_statistics(dataset, lower_ndvi_threshold, upper_ndvi_threshold):
+    dataset = threshold_ndvi_data(dataset.copy(), lower_ndvi_threshold, upper_ndvi_threshold)
+    return compute_ndvi_statistics(dataset)
+
+
+def assert_matches_reference(construction_dataset, lower_ndvi_threshold, upper_ndvi_threshold):
+    dataset = acquisition_statistics(construction_dataset, lower_ndvi_threshold, upper_ndvi_threshold)
+
+    weekly = resample_and_average_weekly(dataset)
+    reference = reference_resample_and_average_weekly(dataset)
+    pd.testing.assert_frame_equal(weekly[reference.columns], reference, check_exact=False, rtol=1e-12)
+
+
+# Default thresholds, then edge cases: everything Red, everything Green, an empty Yellow class
+@pytest.mark.parametrize("lower, upper", [(0.3, 0.55), (1.0, 1.0), (-1.0, -1.0), (0.5, 0.5), (-1.0, 1.0)])
+def test_matches_reference_implementation(construction_dataset, lower, upper):
+    assert_matches_reference(construction_dataset, lower, upper)
+
+
+def test_matches_reference_implementation_on_pixel_values(construction_dataset):
+    # Thresholds equal to pixel values (pixels on a threshold belong to the class below it)
+    pixels = np.sort(np.concatenate(construction_dataset["Valid_NDVI_Data"].tolist()))
+    assert_matches_reference(construction_dataset, float(pixels[len(pixels) // 3]),
+                             float(pixels[2 * len(pixels) // 3]))
+
+
+def test_combined_chunks_match_whole_dataset(construction_dataset):
+    dataset = acquisition_statistics(construction_dataset, 0.3, 0.55)
+    chunks = [weekly_sufficient_statistics(dataset.iloc[start:start + 37]) for start in range(0, len(dataset), 37)]
+
+    combined = finalize_weekly_statistics(combine_weekly_statistics(chunks), static_attributes(dataset))
+    pd.testing.assert_frame_equal(combined, resample_and_average_weekly(dataset), check_exact=False, rtol=1e-12)
+
+
+def test_robust_statistics_are_count_weighted(construction_dataset):
+    dataset = acquisition_statistics(construction_dataset, 0.3, 0.55)
+    weekly = resample_and_average_weekly(dataset)
+
+    first = dataset.iloc[0]
+    rows = dataset[(dataset["Primary_Key"] == first["Primary_Key"]) & (dataset["Year"] == first["Year"]) &
+                   (dataset["Week"] == first["Week"])]
+    expected = np.average(rows["Median_Green_Pixels"], weights=rows["Green_NDVI_Pixels_Number"])
+    week_start = pd.to_datetime(f"{first['Year']}-{first['Week']}-1", format="%Y-%W-%w")
+    actual = weekly.loc[(weekly["Primary_Key"] == first["Primary_Key"]) & (weekly["Year_Week"] == week_start),
+                        "Median_Green_Pixels"]
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Utils.ndvi_store import flatten_ragged
+from Utils.ndvi_histogram import build_histogram, build_histogram_from_dataset, concatenate_histograms, \
+    aggregate_histograms, query_histogram, snap_to_edge
+from Utils.threshold_statistics import compute_class_statistics, ROBUST_STATISTICS
+
+
+@pytest.fixture(scope="module")
+def pixels(construction_dataset):
+    return flatten_ragged(construction_dataset["Valid_NDVI_Data"], dtype=np.float64)
+
+
+@pytest.mark.parametrize("thresholds", [(0.3, 0.55), (0.305, 0.552), (-1.0, 1.0)])
+def test_matches_raw_pixels_at_snapped_thresholds(pixels, thresholds):
+    values, offsets = pixels
+    histogram = build_histogram(values, offsets)
+    approximate = query_histogram(histogram, *thresholds)
+    snapped = compute_class_statistics(values, offsets, *(histogram.edges[snap_to_edge(histogram, threshold)]
+                                                          for threshold in thresholds))
+
+    count_columns = [column for column in snapped.columns if column.endswith("_Pixels_Number")]
+    pd.testing.assert_frame_equal(approximate[count_columns], snapped[count_columns])
+    mean_columns = [column for column in snapped.columns if column.startswith("Mean_")]
+    pd.testing.assert_frame_equal(approximate[mean_columns], snapped[mean_columns], check_exact=False,
+                                  rtol=1e-6, atol=1e-7)
+    std_columns = [column for column in snapped.columns if column.startswith("Std_")]
+    pd.testing.assert_frame_equal(approximate[std_columns], snapped[std_columns], check_exact=False,
+                                  rtol=1e-6, atol=1e-5)
+    robust_columns = [column for column in snapped.columns if column.split("_")[0] in ROBUST_STATISTICS]
+    assert approximate[robust_columns].isna().equals(snapped[robust_columns].isna())
+    assert not ((approximate[robust_columns] - snapped[robust_columns]).abs() > 2 * histogram.bin_width).any().any()
+
+
+def test_stores_only_the_bins_holding_pixels(pixels):
+    values, offsets = pixels
+    histogram = build_histogram(values, offsets)
+    assert histogram.n_columns < histogram.n_bins
+    assert histogram.column_edges[0] < values.min() and values.max() <= histogram.column_edges[-1]
+    assert histogram.offset_sums.dtype == histogram.offset_squares.dtype == np.float32
+    np.testing.assert_allclose(histogram.sums().sum(axis=1), np.add.reduceat(values, offsets[:-1]), rtol=1e-7)
+
+
+def test_concatenation_widens_the_stored_bins(construction_dataset):
+    dataset = construction_dataset
+    # Split so that the two parts store different bins
+    order = np.argsort([pixels.mean() if pixels.size else 0.0 for pixels in dataset["Valid_NDVI_Data"]])
+    first, second = dataset.iloc[order[:50]], dataset.iloc[order[50:]]
+    concatenated = concatenate_histograms(build_histogram_from_dataset(first), build_histogram_from_dataset(second))
+    whole = build_histogram_from_dataset(pd.concat([first, second]))
+    assert concatenated.first_bin == whole.first_bin
+    pd.testing.assert_frame_equal(query_histogram(concatenated, 0.3, 0.55), query_histogram(whole, 0.3, 0.55))
+
+
+def test_aggregated_histograms_pool_the_pixels(construction_dataset):
+    dataset = construction_dataset
+    group_columns = ["Primary_Key", "Year", "Week"]
+    keys, weekly = aggregate_histograms(build_histogram_from_dataset(dataset), dataset[group_columns])
+    groups = dataset.groupby(group_columns, sort=True)["Valid_NDVI_Data"]
+    assert list(keys) == list(groups.groups)
+
+    pooled = build_histogram(*flatten_ragged([np.concatenate(list(pixels)) for _, pixels in groups],
+                                             dtype=np.float64))
+    pd.testing.assert_frame_equal(query_histogram(weekly, 0.3, 0.55), query_histogram(pooled, 0.3, 0.55),
+                                  check_exact=False, rtol=1e-6, atol=1e-5)
+
+
+def test_histogram_without_pixels():
+    histogram = build_histogram(np.array([]), np.array([0, 0, 0]))
+    statistics = query_histogram(histogram, 0.3, 0.55)
+    assert len(statistics) == 2
+    assert (statistics.filter(like="_Pixels_Number") == 0).all().all()
@@ -0,0 +1,28 @@
+import numpy as np
+
+from Utils.load_dataset import load_dataset
+from Utils.ndvi_store import convert_csv_to_store, load_ndvi_store, is_ndvi_store, flatten_ragged
+from conftest import CONSTRUCTION_CSV
+
+
+def test_store_round_trip(construction_dataset, tmp_path):
+    store_dir = convert_csv_to_store(CONSTRUCTION_CSV, str(tmp_path / "construction.ndvi"))
+    assert is_ndvi_store(store_dir)
+
+    stored = load_dataset(store_dir)
+    assert stored.columns.tolist() == construction_dataset.columns.tolist()
+    for column in ["Valid_NDVI_Data", "NDVI_Data"]:
+        for expected, actual in zip(construction_dataset[column], stored[column]):
+            assert actual.shape == np.shape(expected)
+            np.testing.assert_array_equal(actual, np.asarray(expected, dtype=np.float32))
+    non_pixel = [column for column in stored.columns if column not in ["Valid_NDVI_Data", "NDVI_Data"]]
+    assert stored[non_pixel].equals(construction_dataset[non_pixel])
+
+    # Pixel buffers are memory-mapped, not loaded
+    assert isinstance(load_ndvi_store(store_dir).valid_pixels, np.memmap)
+
+
+def test_flatten_ragged():
+    values, offsets = flatten_ragged([[1, 2], [], [3]])
+    np.testing.assert_array_equal(values, [1, 2, 3])
+    np.testing.assert_array_equal(offsets, [0, 2, 2, 3])
@@ -0,0 +1,48 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_CSV
+from Utils.parallel_parsing import parse_ndvi_column
+
+
+def _eval_parse(texts, matrix):
+    # Parsing before the eval-free parser: "null" read as None, matrices as object arrays
+    if matrix:
+        return [np.array(eval(text.replace("null", "None")), dtype=np.float64) for text in texts]
+    return [np.array(eval(text)) for text in texts]
+
+
+@pytest.fixture(scope="module")
+def literals():
+    return pd.read_csv(CONSTRUCTION_CSV, usecols=["NDVI_Data", "Valid_NDVI_Data"], nrows=40)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("column, matrix", [("NDVI_Data", True), ("Valid_NDVI_Data", False)])
+def test_matches_eval_parsing(literals, workers, column, matrix):
+    parsed = parse_ndvi_column(literals[column], matrix=matrix, workers=workers)
+    expected = _eval_parse(literals[column], matrix)
+    assert len(parsed) == len(expected)
+    for row, expected_row in zip(parsed, expected):
+        assert row.dtype == np.float64
+        np.testing.assert_array_equal(row, expected_row)
+    if matrix:
+        # "null" cells of the matrices are NaN
+        assert any(np.isnan(row).any() for row in parsed)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_malformed_literal_raises(workers):
+    texts = ["[0.1, 0.2]"] * 4 + ["[0.1, oops, 0.3]"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        with pytest.raises(ValueError, match="Malformed NDVI literal"):
+            parse_ndvi_column(texts, workers=workers)
+
+
+def test_empty_literals():
+    assert parse_ndvi_column([]) == []
+    assert parse_ndvi_column(["[[]]"], matrix=True)[0].shape == (0, 0)
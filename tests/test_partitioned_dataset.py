@@ -0,0 +1,130 @@
+import os
+from urllib.parse import unquote
+
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_CSV, CONSTRUCTION_2_CSV
+from Utils.incremental_ingestion import DatasetWatcher
+from Utils.instrumentation import collect_stages
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.partitioned_dataset import (ensure_partitioned_dataset, merge_exports, read_partitions_manifest,
+                                       _read_export, _partition_values, PARTITION_COLUMNS, DEDUPLICATION_KEYS)
+
+
+def _unquote_partition_path(path):
+    # Partition values of a "<column>=<value>/..." partition file path
+    values = dict(part.split("=", 1) for part in os.path.dirname(path).split(os.sep))
+    return _partition_values(tuple(unquote(values[column]) for column in PARTITION_COLUMNS))
+
+
+def _merged_rows(dataset_dir):
+    manifest = read_partitions_manifest(dataset_dir)
+    return pd.concat([_read_export(os.path.join(dataset_dir, partition["path"]))
+                      for partition in manifest["partitions"]], ignore_index=True)
+
+
+def _value_of(rows, key):
+    match = rows[(rows["Primary_Key"] == key[0]) & (rows["Acquisition_Date"] == key[1])]
+    assert len(match) == 1
+    return match["Valid_NDVI_Data"].iloc[0]
+
+
+def _write_exports(tmp_path):
+    # Two exports sharing their first rows: b.csv (later, higher precedence) marks them with its own value
+    rows = _read_export(CONSTRUCTION_CSV).head(40)
+    low, high = rows.head(30).copy(), rows.iloc[10:].copy()
+    low["Valid_NDVI_Data"], high["Valid_NDVI_Data"] = "a", "b"
+    low.to_csv(tmp_path / "a.csv", index=False)
+    high.to_csv(tmp_path / "b.csv", index=False)
+    return [str(tmp_path / "a.csv"), str(tmp_path / "b.csv")], low, high
+
+
+def test_manifest_matches_directory_layout(tmp_path):
+    dataset_dir = str(tmp_path / "dataset")
+    ensure_partitioned_dataset(dataset_dir, [CONSTRUCTION_CSV, CONSTRUCTION_2_CSV])
+    manifest = read_partitions_manifest(dataset_dir)
+    for partition in manifest["partitions"]:
+        assert _unquote_partition_path(partition["path"]) == {column: partition[column]
+                                                              for column in PARTITION_COLUMNS}
+    merged = _merged_rows(dataset_dir)
+    assert not merged.duplicated(DEDUPLICATION_KEYS).any()
+    assert sum(partition["rows"] for partition in manifest["partitions"]) == len(merged)
+
+
+def test_precedence_survives_remerge_of_lower_export(tmp_path):
+    source_paths, low, high = _write_exports(tmp_path)
+    dataset_dir = str(tmp_path / "dataset")
+    merge_exports(dataset_dir, source_paths)
+    shared = tuple(high[DEDUPLICATION_KEYS].iloc[0])
+    assert _value_of(_merged_rows(dataset_dir), shared) == "b"
+
+    # a.csv changes (new value on every row) and is merged again on its own: b.csv still wins
+    low["Valid_NDVI_Data"] = "a2"
+    low.to_csv(source_paths[0], index=False)
+    merge_exports(dataset_dir, source_paths, changed_paths=source_paths[:1])
+    merged = _merged_rows(dataset_dir)
+    assert _value_of(merged, shared) == "b"
+    assert _value_of(merged, tuple(low[DEDUPLICATION_KEYS].iloc[0])) == "a2"
+    assert len(merged) == 40
+
+
+def test_rows_deleted_from_an_export_disappear(tmp_path):
+    source_paths, low, high = _write_exports(tmp_path)
+    dataset_dir = str(tmp_path / "dataset")
+    ensure_partitioned_dataset(dataset_dir, source_paths)
+
+    # The first rows only exist in a.csv
+    low.iloc[5:].to_csv(source_paths[0], index=False)
+    os.utime(source_paths[0], ns=(0, 0))
+    ensure_partitioned_dataset(dataset_dir, source_paths)
+    merged = _merged_rows(dataset_dir)
+    assert len(merged) == 35
+    assert not merged.set_index(DEDUPLICATION_KEYS).index.isin(
+        low.head(5).set_index(DEDUPLICATION_KEYS).index).any()
+
+    # Dropping an export removes its rows
+    ensure_partitioned_dataset(dataset_dir, source_paths[1:])
+    assert len(_merged_rows(dataset_dir)) == len(high)
+    assert list(read_partitions_manifest(dataset_dir)["sources"]) == [os.path.abspath(source_paths[1])]
+
+
+def test_watcher_merges_exports_and_ingests_appended_rows(tmp_path):
+    rows = _read_export(CONSTRUCTION_2_CSV)
+    exports = {"a.csv": (rows.iloc[:150], rows.iloc[250:300]), "b.csv": (rows.iloc[100:200], rows.iloc[200:250])}
+    source_paths = [str(tmp_path / name) for name in exports]
+    for source_path, (first, _) in zip(source_paths, exports.values()):
+        first.to_csv(source_path, index=False)
+    dataset_dir = str(tmp_path / "dataset")
+    ensure_partitioned_dataset(dataset_dir, source_paths)
+    get_processed_dataset(dataset_dir, 0.3, 0.55)
+    watcher = DatasetWatcher(dataset_dir, source_paths=source_paths)
+
+    # Rows appended to both exports, the lower-precedence one included
+    for source_path, (first, appended) in zip(source_paths, exports.values()):
+        pd.concat([first, appended]).to_csv(source_path, index=False)
+    with collect_stages() as records:
+        assert not watcher.poll()
+        assert watcher.poll()
+    # Only the appended rows are read
+    assert "load_dataset" not in {record.stage for record in records}
+    assert [record.rows_out for record in records if record.stage == "read_new_acquisitions"] == [100]
+    assert any(partition.get("appended_to") for partition in read_partitions_manifest(dataset_dir)["partitions"])
+    incremental = get_processed_dataset(dataset_dir, 0.3, 0.55)
+
+    full_dir = str(tmp_path / "full")
+    ensure_partitioned_dataset(full_dir, source_paths)
+    full = get_processed_dataset(full_dir, 0.3, 0.55)
+    assert len(incremental.weekly) == len(full.weekly)
+    pd.testing.assert_frame_equal(incremental.weekly, full.weekly, check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental.area_statistics.totals, full.area_statistics.totals,
+                                  check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("column, value", [("Year", ""), ("Year", "2024.0"), ("Supply_Area_Name", "")])
+def test_rows_without_partition_values_are_rejected(tmp_path, column, value):
+    rows = _read_export(CONSTRUCTION_CSV).head(10)
+    rows.loc[rows.index[3], column] = value
+    rows.to_csv(tmp_path / "a.csv", index=False)
+    with pytest.raises(ValueError, match=f"invalid {column}"):
+        merge_exports(str(tmp_path / "dataset"), [str(tmp_path / "a.csv")])
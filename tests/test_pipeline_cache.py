@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Utils.quality_filter import QualityFilter
+from Utils.partitioned_dataset import PartitionSelection
+from Utils.pipeline_cache import load_dataset_shared, get_processed_dataset, dataset_fingerprint, estimate_size, \
+    LRUCache, _loading_lock
+from conftest import CONSTRUCTION_2_CSV
+
+
+def test_selections_do_not_evict_each_other():
+    everything = load_dataset_shared(CONSTRUCTION_2_CSV)
+    filtered = load_dataset_shared(CONSTRUCTION_2_CSV, QualityFilter(max_cloud_percentage=20))
+    histogram = load_dataset_shared(CONSTRUCTION_2_CSV, histogram_bins=100)
+    assert len(filtered.dataset) < len(everything.dataset)
+
+    # Alternating sessions get the datasets already loaded back
+    assert load_dataset_shared(CONSTRUCTION_2_CSV) is everything
+    assert load_dataset_shared(CONSTRUCTION_2_CSV, QualityFilter(max_cloud_percentage=20)) is filtered
+    assert load_dataset_shared(CONSTRUCTION_2_CSV, histogram_bins=100) is histogram
+
+
+def test_processed_datasets_are_shared():
+    first = get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55)
+    get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55, QualityFilter(max_cloud_percentage=20))
+    assert get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55) is first
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(30, sizeof=lambda value: 10)
+    for key in "abc":
+        cache.put(key, key)
+    cache.get("a")
+    cache.put("d", "d")
+    assert cache.keys() == ["c", "a", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_views_are_measured_by_their_buffer():
+    values = np.arange(1000, dtype=np.float32)
+    views = pd.Series([values[:400], values[400:].reshape(20, 30)], dtype=object)
+    assert estimate_size(views) == views.memory_usage(index=True) + values.nbytes
+    # A buffer shared by several values is counted once
+    assert estimate_size((views, values[10:20])) == estimate_size(views)
+
+    shared = load_dataset_shared(CONSTRUCTION_2_CSV)
+    pixels = shared.dataset["Valid_NDVI_Data"]
+    assert estimate_size(pixels) >= sum(array.nbytes for array in pixels)
+
+
+def test_loads_of_other_selections_are_not_blocked():
+    key = (dataset_fingerprint(CONSTRUCTION_2_CSV)[0], QualityFilter(), PartitionSelection(), 0)
+    loaded = []
+    # Another session is loading the unfiltered dataset of the same file
+    with _loading_lock(key):
+        thread = threading.Thread(target=lambda: loaded.append(
+            load_dataset_shared(CONSTRUCTION_2_CSV, QualityFilter(max_cloud_percentage=50))))
+        thread.start()
+        thread.join(timeout=60)
+    assert loaded
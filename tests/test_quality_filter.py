@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_2_CSV
+from Utils.load_dataset import load_dataset, PIXEL_COLUMNS
+from Utils.quality_filter import QualityFilter, quality_mask
+
+FILTERS = [QualityFilter(max_cloud_percentage=20), QualityFilter(allowed_return_codes=[17]),
+           QualityFilter(allowed_return_codes=[18, 19]), QualityFilter(min_valid_pixels=150),
+           QualityFilter(max_cloud_percentage=50, allowed_return_codes=[17], min_valid_pixels=100)]
+
+
+@pytest.fixture(scope="module")
+def full_dataset():
+    return load_dataset(CONSTRUCTION_2_CSV)
+
+
+def _assert_same_rows(actual, expected):
+    scalar_columns = [column for column in expected.columns if column not in PIXEL_COLUMNS]
+    pd.testing.assert_frame_equal(actual[scalar_columns], expected[scalar_columns])
+    for column in PIXEL_COLUMNS:
+        assert len(actual[column]) == len(expected[column])
+        for actual_pixels, expected_pixels in zip(actual[column], expected[column]):
+            np.testing.assert_array_equal(np.asarray(actual_pixels), expected_pixels)
+
+
+@pytest.mark.parametrize("quality_filter", FILTERS)
+def test_filtered_load_matches_masking_a_full_load(full_dataset, quality_filter):
+    keep = quality_mask(full_dataset, quality_filter)
+    # Each filter drops some of the sample acquisitions, so the skipped lines are exercised
+    assert 0 < keep.sum() < len(full_dataset)
+    expected = full_dataset[keep].reset_index(drop=True)
+    _assert_same_rows(load_dataset(CONSTRUCTION_2_CSV, quality_filter=quality_filter), expected)
+
+
+@pytest.mark.parametrize("quality_filter", FILTERS[:2])
+def test_filtered_lazy_columns_map_the_kept_rows(full_dataset, quality_filter):
+    expected = full_dataset[quality_mask(full_dataset, quality_filter)].reset_index(drop=True)
+    lazy = load_dataset(CONSTRUCTION_2_CSV, lazy_columns=PIXEL_COLUMNS, quality_filter=quality_filter)
+    _assert_same_rows(lazy, expected)
+
+
+def test_missing_quality_values_fail_the_filtered_criteria():
+    dataset = pd.DataFrame({"Number_Of_Valid_Pixels": [10, None, 30],
+                            "Cloud_Or_Shadow_Percentage": [5.0, 5.0, None],
+                            "Cloud_Or_Shadow_Return_Code": [17, 17, 17]})
+    assert quality_mask(dataset, QualityFilter(min_valid_pixels=1)).tolist() == [True, False, True]
+    assert quality_mask(dataset, QualityFilter(max_cloud_percentage=50)).tolist() == [True, True, False]
+    assert quality_mask(dataset, QualityFilter()).all()
+
+
+def test_invalid_criteria_are_rejected():
+    with pytest.raises(ValueError):
+        QualityFilter(max_cloud_percentage=120)
+    with pytest.raises(ValueError):
+        QualityFilter(min_valid_pixels=-1)
+    assert QualityFilter(allowed_return_codes=[19, 17, 17]) == QualityFilter(allowed_return_codes=(17, 19))
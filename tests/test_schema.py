@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_CSV, CONSTRUCTION_2_CSV
+from Utils.load_dataset import load_dataset
+from Utils.schema import normalize_schema, append_normalized, primary_key_mask, primary_key_code, \
+    CATEGORICAL_COLUMNS, PIXEL_COLUMNS, PIXEL_DTYPE
+
+
+@pytest.mark.parametrize("file_path", [CONSTRUCTION_CSV, CONSTRUCTION_2_CSV])
+def test_sample_pixels_survive_the_float32_round_trip(file_path):
+    dataset = load_dataset(file_path)
+    normalized = normalize_schema(dataset)
+    for column in PIXEL_COLUMNS:
+        for pixels, stored in zip(dataset[column], normalized[column]):
+            assert stored.dtype == PIXEL_DTYPE and stored.shape == pixels.shape
+            np.testing.assert_array_equal(stored.astype(np.float64), pixels)
+
+
+def test_append_keeps_categories_and_dtypes(construction_dataset):
+    dataset = construction_dataset
+    # The two parts hold different blocks, so the appended rows bring new categories
+    keys = dataset["Primary_Key"].drop_duplicates().tolist()
+    first, second = dataset[dataset["Primary_Key"].isin(keys[::2])], dataset[dataset["Primary_Key"].isin(keys[1::2])]
+    combined = append_normalized(normalize_schema(first), second)
+    whole = normalize_schema(pd.concat([first, second], ignore_index=True))
+
+    assert combined.dtypes.equals(whole.dtypes)
+    for column in CATEGORICAL_COLUMNS:
+        assert combined[column].cat.categories.equals(whole[column].cat.categories)
+    pd.testing.assert_frame_equal(combined.drop(columns=PIXEL_COLUMNS), whole.drop(columns=PIXEL_COLUMNS))
+    for column in PIXEL_COLUMNS:
+        for appended, normalized in zip(combined[column], whole[column]):
+            np.testing.assert_array_equal(appended, normalized)
+
+
+def test_primary_key_mask_matches_comparing_the_keys(construction_dataset):
+    normalized = normalize_schema(construction_dataset)
+    for primary_key in construction_dataset["Primary_Key"].unique():
+        np.testing.assert_array_equal(primary_key_mask(normalized, primary_key),
+                                      (construction_dataset["Primary_Key"] == primary_key).to_numpy())
+    assert primary_key_code(normalized, "unknown") == -1
+    assert not primary_key_mask(normalized, "unknown").any()
+
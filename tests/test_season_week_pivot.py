@@ -0,0 +1,18 @@
+import numpy as np
+
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.season_week_pivot import pivot_season_weeks
+from conftest import CONSTRUCTION_2_CSV
+
+
+def test_pivot_matches_weekly_rows():
+    weekly = get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55).weekly
+    pivot = pivot_season_weeks(weekly)
+
+    for b, primary_key in enumerate(pivot.primary_keys):
+        for s, season in enumerate(pivot.seasons):
+            rows = weekly[(weekly["Primary_Key"] == primary_key) & (weekly["Year"] == season)]
+            assert pivot.present[b, s] == (len(rows) > 0)
+            if len(rows):
+                np.testing.assert_array_equal(pivot["Mean_Yellow_Pixels"][b, s], rows["Mean_Yellow_Pixels"])
+                np.testing.assert_array_equal(pivot.weeks[b, s], rows["Week"].astype(float))
@@ -0,0 +1,18 @@
+import pandas as pd
+
+from Utils.pipeline_cache import get_processed_dataset
+from Utils.selection_index import build_selection_index
+from conftest import CONSTRUCTION_2_CSV
+
+
+def test_block_slices_match_dataset_masks():
+    weekly = get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55).weekly
+    index = build_selection_index(weekly)
+
+    for (primary_key, season), (start, stop) in index.block_season_ranges.items():
+        mask = (weekly["Primary_Key"] == primary_key) & (weekly["Year"] == season)
+        pd.testing.assert_frame_equal(index.block_rows(primary_key, season), weekly[mask])
+    for primary_key in index.block_ranges:
+        pd.testing.assert_frame_equal(index.block_rows(primary_key), weekly[weekly["Primary_Key"] == primary_key])
+    assert index.block_rows("unknown_block").empty
+    assert index.areas == sorted(weekly["Supply_Area_Name"].dropna().unique())
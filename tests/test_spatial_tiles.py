@@ -0,0 +1,70 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from conftest import CONSTRUCTION_CSV
+from Utils.load_dataset import load_dataset
+from Utils.quality_filter import QualityFilter
+from Utils.threshold_statistics import NDVI_CLASS_INDEX
+from Utils.spatial_tiles import classify_matrix, get_spatial_source, get_block_tile, block_weeks, downsample, \
+    build_tile, spatial_source_cache_stats
+
+
+@pytest.fixture
+def csv_copy(tmp_path):
+    # The NDVI stores are converted next to the CSV file
+    path = tmp_path / "dataset.csv"
+    shutil.copy(CONSTRUCTION_CSV, path)
+    return str(path)
+
+
+def test_classified_pixels_match_the_threshold_statistics():
+    dataset = load_dataset(CONSTRUCTION_CSV, columns=["Primary_Key", "Acquisition_Date", "NDVI_Data",
+                                                      "Valid_NDVI_Data"])
+    for matrix, valid in zip(dataset["NDVI_Data"][:20], dataset["Valid_NDVI_Data"][:20]):
+        classes = classify_matrix(matrix, 0.3, 0.55)
+        assert (classes >= 0).sum() == len(valid)
+        assert (classes == NDVI_CLASS_INDEX["Green"]).sum() == (valid > 0.55).sum()
+        assert (classes == NDVI_CLASS_INDEX["Red"]).sum() == (valid <= 0.3).sum()
+
+
+def test_downsample_ignores_missing_cells():
+    matrix = np.array([[1.0, np.nan, np.nan, np.nan], [3.0, np.nan, np.nan, np.nan]])
+    np.testing.assert_array_equal(downsample(matrix, tile_size=2), [[2.0, np.nan]])
+
+
+def test_sources_of_different_selections_coexist(csv_copy):
+    everything = get_spatial_source(csv_copy)
+    filtered = get_spatial_source(csv_copy, QualityFilter(max_cloud_percentage=20))
+    assert len(filtered.acquisitions) < len(everything.acquisitions)
+    assert get_spatial_source(csv_copy) is everything
+    assert get_spatial_source(csv_copy, QualityFilter(max_cloud_percentage=20)) is filtered
+
+
+def test_changed_dataset_drops_stale_sources(csv_copy):
+    source = get_spatial_source(csv_copy)
+    entries = spatial_source_cache_stats()["entries"]
+    with open(csv_copy, "a") as f:
+        f.write("\n")
+    reopened = get_spatial_source(csv_copy)
+    assert reopened is not source and reopened.fingerprint != source.fingerprint
+    assert spatial_source_cache_stats()["entries"] == entries
+
+
+def test_tiles_are_cached(csv_copy):
+    source = get_spatial_source(csv_copy)
+    primary_key, season = source.acquisitions.iloc[0][["Primary_Key", "Year"]]
+    week = block_weeks(source, primary_key, season)[0]
+    tile = get_block_tile(source, primary_key, week, 0.3, 0.55)
+    assert get_block_tile(source, primary_key, week, 0.3, 0.55) is tile
+    assert np.isclose(np.nansum(tile.class_shares), 1.0)
+    assert get_block_tile(source, "missing", week, 0.3, 0.55) is None
+
+
+def test_tiles_report_the_acquisitions_averaged():
+    # The first acquisition is cropped differently, it is left out of the weekly mean
+    matrices = [np.full((3, 4), 0.2), np.full((4, 4), 0.4), np.full((4, 4), 0.6)]
+    tile = build_tile(matrices, 0.3, 0.55)
+    assert tile.acquisitions == 2
+    np.testing.assert_allclose(tile.ndvi, 0.5)
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from Utils.load_dataset import load_dataset
+from Utils.threshold_statistics import threshold_and_compute_statistics
+from Utils.mean_weekly_resampling import resample_and_average_weekly
+from Utils.streaming_ingestion import stream_weekly_dataset
+from conftest import CONSTRUCTION_2_CSV
+
+
+def test_streamed_weekly_dataset_matches_in_memory():
+    # Small chunks, so that weeks and blocks span several chunks
+    streamed = stream_weekly_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55, chunk_size=50)
+    in_memory = resample_and_average_weekly(threshold_and_compute_statistics(load_dataset(CONSTRUCTION_2_CSV),
+                                                                             0.3, 0.55))
+    pd.testing.assert_frame_equal(streamed, in_memory, check_exact=False, rtol=1e-12)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_2_CSV
+from Utils.pipeline_cache import get_processed_dataset
+from table_display import project_table, _serialize_page, _serialized_tables, TABLE_COLUMNS
+
+
+@pytest.fixture(scope="module")
+def weekly():
+    return get_processed_dataset(CONSTRUCTION_2_CSV, 0.3, 0.55).weekly
+
+
+def test_projection_keeps_the_scalar_display_columns(weekly):
+    dataset = weekly.copy()
+    # A display column holding arrays (as the pixel columns of the acquisitions) is never sent
+    dataset["Cloud_Or_Shadow_Percentage"] = pd.Series([np.zeros(3)] * len(dataset), index=dataset.index,
+                                                      dtype=object)
+    table = project_table(dataset)
+    assert set(table.columns) <= set(TABLE_COLUMNS)
+    assert "Cloud_Or_Shadow_Percentage" not in table.columns and "Primary_Key_Code" not in table.columns
+    assert not any(isinstance(value, np.ndarray) for column in table.columns for value in table[column])
+    assert len(table) == len(dataset)
+
+
+def test_pages_are_sliced_and_keyed_on_the_selection(weekly):
+    _serialized_tables.clear()
+    columns = ("Year_Week", "Primary_Key", "Mean_Green_Pixels")
+    page = _serialize_page(("block", "all"), weekly, columns, 1, 100)
+    assert page.column_names == list(columns)
+    assert page.num_rows == 100
+    np.testing.assert_array_equal(page.column("Mean_Green_Pixels").to_numpy(),
+                                  weekly["Mean_Green_Pixels"].iloc[100:200].to_numpy())
+    last = _serialize_page(("block", "all"), weekly, columns, len(weekly) // 100, 100)
+    assert last.num_rows == len(weekly) % 100
+
+    # Same selection: the serialized page is reused, another selection is serialized on its own
+    assert _serialize_page(("block", "all"), weekly, columns, 1, 100) is page
+    other = _serialize_page(("block", "other"), weekly.iloc[::-1], columns, 1, 100)
+    assert other is not page and not other.equals(page)
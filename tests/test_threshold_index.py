@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Utils.threshold_statistics import threshold_and_compute_statistics, compute_class_statistics
+from Utils.threshold_index import build_threshold_index, build_threshold_index_from_dataset, \
+    concatenate_threshold_indexes, query_threshold_index, threshold_statistics_from_index
+
+
+@pytest.fixture(scope="module")
+def index(construction_dataset):
+    return build_threshold_index_from_dataset(construction_dataset)
+
+
+@pytest.mark.parametrize("lower, upper", [(0.3, 0.55), (0.4, 0.6), (0.5, 0.5), (-1.0, 1.0), (1.0, 1.0)])
+def test_index_matches_fused_kernel(construction_dataset, index, lower, upper):
+    expected = threshold_and_compute_statistics(construction_dataset, lower, upper)
+    actual = threshold_statistics_from_index(construction_dataset, index, lower, upper)
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9, atol=1e-12)
+
+
+def test_concatenated_indexes_match_a_single_index(construction_dataset, index):
+    half = len(construction_dataset) // 2
+    concatenated = concatenate_threshold_indexes(build_threshold_index_from_dataset(construction_dataset.iloc[:half]),
+                                                 build_threshold_index_from_dataset(construction_dataset.iloc[half:]))
+    pd.testing.assert_frame_equal(query_threshold_index(concatenated, 0.3, 0.55),
+                                  query_threshold_index(index, 0.3, 0.55), check_exact=False, rtol=1e-9, atol=1e-12)
+
+
+def test_empty_acquisitions():
+    offsets = np.array([0, 0, 2, 2])
+    values = np.array([0.2, 0.7])
+    pd.testing.assert_frame_equal(query_threshold_index(build_threshold_index(values, offsets), 0.3, 0.55),
+                                  compute_class_statistics(values, offsets, 0.3, 0.55), check_dtype=False)
+    statistics = query_threshold_index(build_threshold_index(np.empty(0), np.zeros(3, dtype=np.int64)), 0.3, 0.55)
+    assert (statistics["Green_NDVI_Pixels_Number"] == 0).all() and statistics["Mean_Green_Pixels"].isna().all()
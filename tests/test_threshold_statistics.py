@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Utils.threshold_dataset import threshold_ndvi_data
+from Utils.compute_statistics import compute_ndvi_statistics
+from Utils.threshold_statistics import threshold_and_compute_statistics, compute_class_statistics, sort_segments
+
+STATISTICS_COLUMNS = [f"{statistic}_{name}_Pixels" for statistic in ["Mean", "Std", "Median", "P10", "P90", "IQR"]
+                      for name in ["Green", "Yellow", "Red"]]
+COUNT_COLUMNS = [f"{name}_NDVI_Pixels_Number" for name in ["Green", "Yellow", "Red"]]
+
+
+@pytest.mark.parametrize("lower, upper", [(0.3, 0.55), (0.5, 0.5), (-1.0, 1.0), (1.0, 1.0)])
+def test_fused_kernel_matches_threshold_and_statistics(construction_dataset, lower, upper):
+    expected = compute_ndvi_statistics(threshold_ndvi_data(construction_dataset.copy(), lower, upper))
+    actual = threshold_and_compute_statistics(construction_dataset, lower, upper)
+
+    pd.testing.assert_frame_equal(actual[COUNT_COLUMNS], expected[COUNT_COLUMNS], check_dtype=False)
+    pd.testing.assert_frame_equal(actual[STATISTICS_COLUMNS], expected[STATISTICS_COLUMNS], rtol=1e-9)
+
+
+def test_robust_statistics_match_numpy_percentiles():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-0.2, 1.0, size=1000)
+    offsets = np.array([0, 0, 1, 2, 500, 1000])
+    statistics = compute_class_statistics(values, offsets, 0.3, 0.55)
+
+    for row in range(len(offsets) - 1):
+        pixels = values[offsets[row]:offsets[row + 1]]
+        green = pixels[pixels > 0.55]
+        if not green.size:
+            assert np.isnan(statistics.loc[row, "Median_Green_Pixels"])
+            continue
+        p10, p25, p50, p75, p90 = np.percentile(green, [10, 25, 50, 75, 90])
+        np.testing.assert_allclose(statistics.loc[row, ["Median_Green_Pixels", "P10_Green_Pixels", "P90_Green_Pixels",
+                                                        "IQR_Green_Pixels"]].to_numpy(float),
+                                   [p50, p10, p90, p75 - p25], rtol=1e-12)
+
+
+def test_rejects_inverted_thresholds():
+    with pytest.raises(ValueError):
+        compute_class_statistics(np.zeros(3), np.array([0, 3]), 0.6, 0.5)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_sorted_segments_match_sorting_each_segment(dtype):
+    rng = np.random.default_rng(1)
+    # Negative values, signed zeros and repeated values
+    values = np.concatenate([rng.uniform(-1.0, 1.0, size=500), [0.0, -0.0, 0.25, 0.25, -1e-30]]).astype(dtype)
+    offsets = np.array([0, 0, 3, 250, 250, 505])
+    sorted_values = sort_segments(values, offsets)
+    assert sorted_values.dtype == values.dtype
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        np.testing.assert_array_equal(sorted_values[start:end], np.sort(values[start:end]))
+
+
+def test_statistics_without_robust_columns(construction_dataset):
+    full = threshold_and_compute_statistics(construction_dataset, 0.3, 0.55)
+    lean = threshold_and_compute_statistics(construction_dataset, 0.3, 0.55, robust=False)
+    assert not lean.columns.str.startswith(("Median_", "P10_", "P90_", "IQR_")).any()
+    pd.testing.assert_frame_equal(lean, full[lean.columns])
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CONSTRUCTION_2_CSV
+from Utils.pipeline_cache import load_dataset_shared, get_processed_dataset
+from Utils.mean_weekly_resampling import NDVI_CLASSES
+from Utils.threshold_sweep import sweep_thresholds, threshold_grid, DEFAULT_GRID_STEPS
+
+GRID = np.round(np.linspace(0.0, 1.0, DEFAULT_GRID_STEPS), 2)
+
+
+@pytest.fixture(scope="module")
+def sweep():
+    shared = load_dataset_shared(CONSTRUCTION_2_CSV, histogram_bins=0)
+    return sweep_thresholds(shared.dataset, shared.threshold_index, threshold_grid(GRID, GRID))
+
+
+def test_grid_keeps_ordered_pairs():
+    pairs = threshold_grid([0.2, 0.5], [0.1, 0.5, 0.6])
+    np.testing.assert_array_equal(pairs, [[0.2, 0.5], [0.2, 0.6], [0.5, 0.5], [0.5, 0.6]])
+
+
+@pytest.mark.parametrize("position", [0, 0.5, 1])
+def test_sweep_matches_the_weekly_dataset(sweep, position):
+    p = int(position * (len(sweep.pairs) - 1))
+    weekly = get_processed_dataset(CONSTRUCTION_2_CSV, *sweep.pairs[p], histogram_bins=0).weekly
+    weekly = weekly.dropna(subset=["Supply_Area_Name"])
+    b = sweep.blocks.get_indexer(weekly["Primary_Key"].astype(str))
+    w = pd.Index(sweep.year_weeks).get_indexer(weekly["Year_Week"])
+    for name in NDVI_CLASSES:
+        np.testing.assert_allclose(sweep.class_values(name)[p, b, w], weekly[f"{name}_NDVI_Pixels_Number"])
+        np.testing.assert_allclose(sweep.class_values(name, "means")[p, b, w], weekly[f"Mean_{name}_Pixels"],
+                                   rtol=1e-6)
+
+
+def test_histogram_sweep_matches_on_bin_edges(sweep):
+    # The grid thresholds are multiples of 0.01, edges of the 200-bin histograms
+    shared = load_dataset_shared(CONSTRUCTION_2_CSV, histogram_bins=200)
+    histogram_sweep = sweep_thresholds(shared.dataset, shared.threshold_index, threshold_grid(GRID, GRID))
+    np.testing.assert_array_equal(histogram_sweep.counts, sweep.counts)
+    np.testing.assert_allclose(histogram_sweep.means, sweep.means, rtol=1e-6)
+
+
+def test_inverted_pairs_raise():
+    shared = load_dataset_shared(CONSTRUCTION_2_CSV, histogram_bins=0)
+    with pytest.raises(ValueError):
+        sweep_thresholds(shared.dataset, shared.threshold_index, np.array([[0.6, 0.3]]))